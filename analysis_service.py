@@ -0,0 +1,438 @@
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from exchange_info import resolve_symbol
+from grid_strategy import analyze_grid
+from kline_downloader import RateLimiter, SUPPORT_INTERVAL, download_full_klines, resolve_date_range
+from kline_store import KlineStore
+from multi_interval import DEFAULT_INTERVALS, analyze_intervals, common_base, comparison_table
+from shared_klines import SharedKlineCache
+
+# 与 analyze_grid_strategy.py 的命令行默认值一致
+DEFAULT_PARAMS = {
+    'threshold_factor': 1.0,
+    'grid_step_percentage': 1.0,
+    'max_grids': 99,
+    'atr_period': 14,
+    'atr_std_multiplier': 1.0,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+}
+PARAM_TYPES = {name: type(value) for name, value in DEFAULT_PARAMS.items()}
+# 结束日期为今天的数据会不断有新K线，缓存的数据和结果在该秒数后失效；历史区间的结果不会过期
+DEFAULT_TTL = 60
+DEFAULT_MAX_DATASETS = 16
+DEFAULT_MAX_RESULTS = 1024
+DEFAULT_TIMEOUT = 120
+# 延迟统计只保留最近的请求
+LATENCY_WINDOW = 10000
+THROUGHPUT_WINDOW = 60
+
+
+def _jsonable(value):
+    """把 NumPy 标量/数组和非有限浮点数转换为可以标准 JSON 序列化的值"""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class LRUCache:
+    """带过期时间的 LRU 缓存，expires_at 为 None 的条目只会因容量不足被淘汰"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ServiceMetrics:
+    """服务的请求数、状态码、端到端延迟分位数、吞吐量以及缓存命中和请求合并的统计"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}
+        self.status_counts = {}
+        self.counters = {'computations': 0, 'result_cache_hits': 0, 'coalesced': 0, 'data_loads': 0,
+                         'data_cache_hits': 0, 'shared_attaches': 0, 'errors': 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.compute_seconds = deque(maxlen=LATENCY_WINDOW)
+        self._finished = deque()
+        self._lock = threading.Lock()
+
+    def incr(self, name, count=1):
+        with self._lock:
+            self.counters[name] += count
+
+    def record_request(self, endpoint, status, latency):
+        now = time.time()
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.latencies.append(latency)
+            self._finished.append(now)
+            while self._finished and self._finished[0] < now - THROUGHPUT_WINDOW:
+                self._finished.popleft()
+
+    def record_compute(self, seconds):
+        with self._lock:
+            self.compute_seconds.append(seconds)
+
+    @staticmethod
+    def _percentiles(values):
+        values = np.asarray(values) * 1000
+        if not len(values):
+            return {}
+        result = {f'p{p}': float(np.percentile(values, p)) for p in (50, 90, 99)}
+        result['max'] = float(values.max())
+        return result
+
+    def summary(self, **extra):
+        with self._lock:
+            uptime = time.time() - self.started_at
+            total = sum(self.requests.values())
+            window = min(uptime, THROUGHPUT_WINDOW)
+            return {
+                'uptime_seconds': uptime,
+                'requests': dict(self.requests),
+                'status_counts': {str(k): v for k, v in sorted(self.status_counts.items())},
+                'latency_ms': self._percentiles(self.latencies),
+                'compute_ms': self._percentiles(self.compute_seconds),
+                'throughput_rps': {'overall': total / uptime if uptime > 0 else 0.0,
+                                   f'last_{THROUGHPUT_WINDOW}s': len(self._finished) / window if window > 0 else 0.0},
+                **self.counters,
+                **extra,
+            }
+
+
+class AnalysisService:
+    """
+    常驻的网格策略分析服务：K线数据和分析结果缓存在内存中（数据同时落在本地K线存储），
+    分析在线程池中执行。相同的请求（交易对/周期/日期范围/参数都相同）在计算完成前只计算一次，
+    之后到达的请求等待同一个结果；同一份数据也只下载一次。
+    use_shared=True 时下载的数据发布到共享数据层，内存中只保存挂载的句柄；
+    其他服务进程或 Streamlit 会话已经发布的数据直接挂载，不再下载。
+    """
+
+    def __init__(self, workers=4, concurrency=4, use_store=True, store=None, base_url=None, ttl=DEFAULT_TTL,
+                 max_datasets=DEFAULT_MAX_DATASETS, max_results=DEFAULT_MAX_RESULTS, use_shared=True, shared=None):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.use_store = use_store
+        self.store = store or (KlineStore() if use_store else None)
+        self.shared = shared or (SharedKlineCache() if use_shared else None)
+        self.base_url = base_url
+        self.ttl = ttl
+        # 所有下载共享一个限速器，按交易所的全局权重调整节奏
+        self.limiter = RateLimiter()
+        self.metrics = ServiceMetrics()
+        self._datasets = LRUCache(max_datasets)
+        self._results = LRUCache(max_results)
+        self._inflight = {}
+        self._data_locks = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _ttl_for(self, end):
+        # 结束日期早于今天的区间不会再变化
+        return self.ttl if end >= datetime.now().strftime("%Y-%m-%d") else None
+
+    def load(self, symbol, interval, start, end):
+        """返回缓存的K线；同一份数据同时只下载一次，其他请求等待下载完成后直接读取缓存"""
+        key = (symbol, interval, start, end)
+        entry = self._datasets.get(key)
+        if entry is not None:
+            self.metrics.incr('data_cache_hits')
+            return entry[1]
+        with self._lock:
+            lock = self._data_locks.setdefault(key, threading.Lock())
+        with lock:
+            entry = self._datasets.get(key)
+            if entry is not None:
+                self.metrics.incr('data_cache_hits')
+                return entry[1]
+            try:
+                handle = self.shared.attach(key) if self.shared is not None else None
+                if handle is not None:
+                    self.metrics.incr('shared_attaches')
+                else:
+                    df = download_full_klines(symbol, interval, start, end, return_df=True,
+                                              concurrency=self.concurrency, base_url=self.base_url,
+                                              use_store=self.use_store, store=self.store, limiter=self.limiter,
+                                              progress=False)
+                    self.metrics.incr('data_loads')
+                    if self.shared is not None:
+                        handle = self.shared.publish(key, df)
+                # 缓存中保存句柄和挂载的只读 DataFrame，条目被淘汰或过期后句柄被回收，租约随之释放
+                if handle is not None:
+                    df = handle.frame()
+                self._datasets.put(key, (handle, df), self._ttl_for(end))
+            finally:
+                with self._lock:
+                    self._data_locks.pop(key, None)
+        return df
+
+    def submit(self, key, func, ttl=None):
+        """
+        返回 (Future, 来源)。结果已缓存时来源为 "cache"，与正在计算的请求相同时合并为同一个 Future（"coalesced"），
+        否则提交到线程池（"computed"）。
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self.metrics.incr('result_cache_hits')
+                future = Future()
+                future.set_result(cached)
+                return future, "cache"
+            future = self._inflight.get(key)
+            if future is not None:
+                self.metrics.incr('coalesced')
+                return future, "coalesced"
+            future = self._pool.submit(self._compute, key, func, ttl)
+            self._inflight[key] = future
+            return future, "computed"
+
+    def _compute(self, key, func, ttl):
+        begin = time.perf_counter()
+        try:
+            result = func()
+            with self._lock:
+                self._results.put(key, result, ttl)
+            self.metrics.incr('computations')
+            return result
+        finally:
+            self.metrics.record_compute(time.perf_counter() - begin)
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _resolve_request(self, params):
+        symbol = params.get('symbol')
+        if not symbol:
+            raise ValueError("缺少参数 symbol")
+        symbol = resolve_symbol(symbol, base_url=self.base_url)
+        days = params.get('days')
+        start, end = resolve_date_range(params.get('start'), params.get('end'), int(days) if days else None)
+        analysis = {}
+        for name, default in DEFAULT_PARAMS.items():
+            value = params.get(name, default)
+            try:
+                analysis[name] = PARAM_TYPES[name](value)
+            except (TypeError, ValueError):
+                raise ValueError("参数 {} 的值无效: {}".format(name, value))
+        return symbol, start, end, analysis
+
+    def analyze(self, params):
+        """分析一个交易对/周期，返回 (结果字典的 Future, 来源)"""
+        symbol, start, end, analysis = self._resolve_request(params)
+        interval = params.get('interval', '15m')
+        if interval not in SUPPORT_INTERVAL:
+            raise ValueError("不支持的K线周期: {}".format(interval))
+        key = ('analyze', symbol, interval, start, end, tuple(sorted(analysis.items())))
+
+        def run():
+            df = self.load(symbol, interval, start, end)
+            result = analyze_grid(df, **analysis)
+            data = result.to_dict()
+            data['grid_prices'] = result.grid_prices
+            return _jsonable({
+                'symbol': symbol, 'interval': interval, 'start': start, 'end': end, 'rows': len(df),
+                'first_open_time': str(df['open_time'].iloc[0]), 'last_open_time': str(df['open_time'].iloc[-1]),
+                'params': result.params, 'result': data,
+            })
+
+        return self.submit(key, run, self._ttl_for(end))
+
+    def compare(self, params):
+        """多周期对比，只加载一次最细的公共周期，返回 (对比结果的 Future, 来源)"""
+        symbol, start, end, analysis = self._resolve_request(params)
+        intervals = params.get('intervals') or DEFAULT_INTERVALS
+        if isinstance(intervals, str):
+            intervals = [i for i in intervals.split(',') if i]
+        base = common_base(intervals)
+        key = ('compare', symbol, tuple(intervals), start, end, tuple(sorted(analysis.items())))
+
+        def run():
+            df = self.load(symbol, base, start, end)
+            table = comparison_table(analyze_intervals(df, base, intervals, **analysis))
+            return _jsonable({
+                'symbol': symbol, 'base_interval': base, 'start': start, 'end': end, 'params': analysis,
+                'intervals': table.reset_index().to_dict(orient='records'),
+            })
+
+        return self.submit(key, run, self._ttl_for(end))
+
+    def summary(self):
+        return self.metrics.summary(workers=self.workers, in_flight=len(self._inflight),
+                                    cached_datasets=len(self._datasets), cached_results=len(self._results))
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # 默认的监听队列只有 5，并发客户端较多时新连接会被丢弃并在 1 秒后重试
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class ServiceServer:
+    """
+    AnalysisService 的 HTTP/JSON 接口：
+    GET/POST /analyze、/compare（参数可以放在查询字符串或 JSON 请求体中），GET /metrics、/health。
+    """
+
+    def __init__(self, service, host="127.0.0.1", port=0, timeout=DEFAULT_TIMEOUT):
+        self.service = service
+        self.timeout = timeout
+        self.server = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # 保持连接，客户端可以复用连接连续发送请求；响应头和响应体分两次写出，关闭 Nagle 算法避免 40ms 的延迟确认
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _params(self, parsed):
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                    if not isinstance(body, dict):
+                        raise ValueError("请求体必须是 JSON 对象")
+                    params.update(body)
+                return params
+
+            def _handle(self):
+                begin = time.perf_counter()
+                parsed = urlparse(self.path)
+                endpoint = parsed.path.rstrip("/") or "/"
+                service = server.service
+                try:
+                    if endpoint == "/health":
+                        status, payload = 200, {'status': 'ok'}
+                    elif endpoint == "/metrics":
+                        status, payload = 200, service.summary()
+                    elif endpoint in ("/analyze", "/compare"):
+                        params = self._params(parsed)
+                        handler = service.analyze if endpoint == "/analyze" else service.compare
+                        future, source = handler(params)
+                        status, payload = 200, dict(future.result(timeout=server.timeout), source=source)
+                    else:
+                        status, payload = 404, {'error': "未知的接口 {}".format(parsed.path)}
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                except FutureTimeoutError:
+                    status, payload = 504, {'error': "分析超时（{} 秒）".format(server.timeout)}
+                except Exception as e:
+                    service.metrics.incr('errors')
+                    status, payload = 500, {'error': str(e)}
+                body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                service.metrics.record_request(endpoint, status, time.perf_counter() - begin)
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动网格策略分析 HTTP/JSON 服务')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=8800, help='监听端口')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='分析线程数')
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help='每次下载的并发请求数')
+    parser.add_argument('--ttl', type=int, default=DEFAULT_TTL,
+                        help=f'结束日期为今天的数据和结果的缓存秒数。默认值为{DEFAULT_TTL}')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT, help='单个请求等待分析结果的最长秒数')
+    parser.add_argument('--no_store', action='store_true', help='不使用本地K线存储，数据只缓存在内存中')
+    parser.add_argument('--no_shared', action='store_true', help='不使用跨进程共享的K线数据层')
+    parser.add_argument('--base_url', type=str, default=None, help='交易所接口地址，例如本地模拟交易所的地址')
+    args = parser.parse_args()
+
+    service = AnalysisService(workers=args.workers, concurrency=args.concurrency, use_store=not args.no_store,
+                              base_url=args.base_url, ttl=args.ttl, use_shared=not args.no_shared)
+    server = ServiceServer(service, host=args.host, port=args.port, timeout=args.timeout)
+    print(f"分析服务已启动: {server.url}（/analyze、/compare、/metrics、/health）")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 import argparse
 import os
 import pandas as pd
-from kline_downloader import run_download
-from grid_strategy import analyze_grid_strategy
+import numpy as np
+import profiling
+from kline_downloader import run_download, resolve_date_range
+from kline_archive import DEFAULT_ARCHIVE_URL
+from grid_strategy import (analyze_grid_strategy, render_cli, GridAnalysisResult, analyze_grid_timeline,
+                           suitable_regimes, format_timeline_message)
+from prefetch_scheduler import fresh_metrics
+from streaming_analysis import analyze_grid_streaming, DEFAULT_MEMORY_BUDGET_MB
+from multi_interval import compare_intervals
 
 def main():
     parser = argparse.ArgumentParser(description='分析K线数据是否适合使用网格策略')
@@ -17,8 +24,156 @@ def main():
     parser.add_argument('--grid_step_percentage', '-g', type=float, default=1.0, help='推荐的网格步长百分比。默认值为1.0%')
     parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
     parser.add_argument('--atr_std_multiplier', '-a', type=float, default=1.0, help='ATR 阈值设定的标准差倍数。默认值为1.0')
+    parser.add_argument('--concurrency', '-c', type=int, default=None, help='并发请求数，不指定时逐个顺序下载')
+    parser.add_argument('--no_store', action='store_true', help='不使用本地K线存储，直接从交易所下载全部数据')
+    parser.add_argument('--journal', action='store_true',
+                        help='记录下载日志，中断或失败后重新运行只下载缺失的部分，并校验缺口和重复的K线')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_URL, default=None,
+                        help='先从 Binance 公开归档文件（或指定的本地目录/镜像 URL）批量导入历史K线，只用 REST 接口补齐最近的部分')
+    parser.add_argument('--no_verify', action='store_true', help='导入归档文件时不校验 CHECKSUM')
+    parser.add_argument('--stream', action='store_true',
+                        help='按块流式下载和分析，峰值内存受 --memory_budget 限制，适合多年的 1m 数据（不保存 CSV）')
+    parser.add_argument('--memory_budget', type=float, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help=f'流式分析的内存预算 (MB)。默认值为{DEFAULT_MEMORY_BUDGET_MB}')
+    parser.add_argument('--cached', action='store_true',
+                        help='如果后台预取（prefetch_scheduler.py）已用相同的 --days 和参数算好最新结果，直接输出而不下载')
+    parser.add_argument('--intervals', type=str, nargs='+', default=None,
+                        help='同时分析多个周期并输出对比表，例如 --intervals 15m 1h 4h；只下载一次最细的公共周期，其余周期由它聚合得到')
+    parser.add_argument('--timeline', type=int, default=None,
+                        help='按滚动窗口（K线根数）计算每根K线的适用性，并输出适合网格策略的时间区间')
+    parser.add_argument('--timeline_save', type=str, default=None, help='把逐根K线的适用性时间线保存为 CSV 文件')
+    parser.add_argument('--profile', action='store_true', help='输出各阶段耗时、请求数、延迟分位数等性能统计')
+    parser.add_argument('--profile_json', type=str, default=None, help='把性能统计保存为 JSON 文件（隐含 --profile）')
     args = parser.parse_args()
 
+    if not (args.profile or args.profile_json):
+        run(args)
+        return
+
+    with profiling.profiling() as profile:
+        run(args)
+    print("\n性能统计:")
+    for line in profile.report_lines():
+        print(line)
+    if args.profile_json:
+        profile.save(args.profile_json)
+        print(f"性能统计已保存至 {args.profile_json}")
+
+def run_cached(args):
+    # 读取后台预取的指标，不新鲜或参数不一致时返回 None
+    params = {
+        'threshold_factor': args.threshold_factor,
+        'grid_step_percentage': args.grid_step_percentage,
+        'max_grids': args.max_grids,
+        'atr_std_multiplier': args.atr_std_multiplier,
+    }
+    entry = fresh_metrics(args.symbol, args.interval, days=args.days, params=params)
+    if entry is None:
+        return None
+    print(f"使用后台预取的结果（{entry['rows']} 根K线，最后一根开盘于 {pd.to_datetime(entry['last_open_time'], unit='ms')}）")
+    result = GridAnalysisResult(grid_prices=np.array(entry['grid_prices']), params=entry['params'], **entry['metrics'])
+    render_cli(result)
+    return result.suitable
+
+def run_stream(args):
+    try:
+        start, end = resolve_date_range(args.start, args.end, args.days)
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+    try:
+        result = analyze_grid_streaming(
+            args.symbol, args.interval, start, end,
+            memory_budget_mb=args.memory_budget,
+            use_store=not args.no_store,
+            concurrency=args.concurrency,
+            threshold_factor=args.threshold_factor,
+            grid_step_percentage=args.grid_step_percentage,
+            max_grids=args.max_grids,
+            atr_period=14,  # 使用默认ATR周期
+            atr_std_multiplier=args.atr_std_multiplier
+        )
+    except Exception as e:
+        print(f"流式分析时发生错误: {e}")
+        return
+    render_cli(result)
+    print("可以考虑使用网格策略进行交易。" if result.suitable else "不建议使用网格策略。")
+
+def run_intervals(args):
+    # 多周期对比：只下载一次最细的公共周期，聚合出其余周期后逐个分析
+    try:
+        base, table = compare_intervals(
+            args.symbol,
+            args.intervals,
+            start=args.start,
+            end=args.end,
+            days=args.days,
+            concurrency=args.concurrency,
+            use_store=not args.no_store,
+            journal=args.journal,
+            archive=args.archive,
+            archive_verify=not args.no_verify,
+            threshold_factor=args.threshold_factor,
+            grid_step_percentage=args.grid_step_percentage,
+            max_grids=args.max_grids,
+            atr_period=14,  # 使用默认ATR周期
+            atr_std_multiplier=args.atr_std_multiplier
+        )
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+    except Exception as e:
+        print(f"下载数据时发生错误: {e}")
+        return
+    print(f"\n多周期对比（由 {base} K线聚合）:")
+    print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.save_to:
+        table.to_csv(args.save_to)
+        print(f"对比结果已保存至 {args.save_to}")
+    suitable = table.index[table['suitable'].fillna(False).astype(bool)].tolist()
+    if suitable:
+        print(f"适合使用网格策略的周期: {'、'.join(suitable)}")
+    else:
+        print("所有周期都不建议使用网格策略。")
+
+def run_timeline(df, args):
+    # 滚动适用性时间线：打印汇总和最近的适用区间，可选保存为 CSV
+    with profiling.stage("timeline", rows=len(df)):
+        timeline = analyze_grid_timeline(
+            df,
+            window=args.timeline,
+            threshold_factor=args.threshold_factor,
+            grid_step_percentage=args.grid_step_percentage,
+            max_grids=args.max_grids,
+            atr_period=14,  # 使用默认ATR周期
+            atr_std_multiplier=args.atr_std_multiplier
+        )
+    regimes = suitable_regimes(timeline)
+    print(f"\n滚动适用性时间线（窗口 {args.timeline} 根K线）:")
+    print(format_timeline_message(timeline, regimes)[1])
+    if len(regimes):
+        print("最近的适用区间:")
+        for row in regimes.tail(10).itertuples():
+            print(f"{pd.to_datetime(row.start)} - {pd.to_datetime(row.end)}（{row.bars} 根K线）")
+    if args.timeline_save:
+        timeline.to_csv(args.timeline_save, index=False)
+        print(f"适用性时间线已保存至 {args.timeline_save}")
+
+def run(args):
+    if args.cached and args.days:
+        is_suitable = run_cached(args)
+        if is_suitable is not None:
+            print("可以考虑使用网格策略进行交易。" if is_suitable else "不建议使用网格策略。")
+            return
+
+    if args.stream:
+        run_stream(args)
+        return
+
+    if args.intervals:
+        run_intervals(args)
+        return
+
     # 下载数据
     try:
         if args.in_memory:
@@ -29,7 +184,12 @@ def main():
                 end=args.end,
                 days=args.days,
                 save_to=args.save_to,
-                return_df=True
+                return_df=True,
+                concurrency=args.concurrency,
+                use_store=not args.no_store,
+                journal=args.journal,
+                archive=args.archive,
+                archive_verify=not args.no_verify
             )
             csv_path = None  # 不保存文件
         else:
@@ -40,7 +200,12 @@ def main():
                 end=args.end,
                 days=args.days,
                 save_to=args.save_to,
-                return_df=False
+                return_df=False,
+                concurrency=args.concurrency,
+                use_store=not args.no_store,
+                journal=args.journal,
+                archive=args.archive,
+                archive_verify=not args.no_verify
             )
     except ValueError as ve:
         print(f"参数错误: {ve}")
@@ -68,7 +233,9 @@ def main():
     else:
         if csv_path and os.path.exists(csv_path):
             try:
-                df = pd.read_csv(csv_path)
+                with profiling.stage("csv_read"):
+                    df = pd.read_csv(csv_path)
+                profiling.set_rows("csv_read", len(df))
                 is_suitable = analyze_grid_strategy(
                     df=df,
                     visualize=False,  # 关闭可视化
@@ -86,6 +253,12 @@ def main():
             print(f"CSV文件不存在: {csv_path}")
             return
 
+    if args.timeline:
+        try:
+            run_timeline(df, args)
+        except ValueError as ve:
+            print(f"参数错误: {ve}")
+
     if is_suitable:
         print("可以考虑使用网格策略进行交易。")
     else:
@@ -1,10 +1,198 @@
 import streamlit as st
 import pandas as pd
 from grid_strategy import analyze_grid_strategy
-from kline_downloader import run_download
+from kline_downloader import resolve_date_range
+from download_job import DownloadJob
 from datetime import datetime, timedelta
-import os
+import json
 import altair as alt  # 引入Altair用于高级图表
+import profiling
+from prefetch_scheduler import fresh_metrics
+from exchange_info import get_exchange_info, resolve_symbol
+from chart_downsample import downsample, slice_window, DEFAULT_MAX_POINTS, DOWNSAMPLE_METHODS
+from kline_resample import can_resample
+from multi_interval import analyze_intervals, comparison_table
+from shared_klines import SharedKlineCache
+
+def render_plot(plot_details, max_points=DEFAULT_MAX_POINTS, method='lttb', window=None):
+    title = plot_details['title']
+    x = plot_details['x']
+    y = plot_details['y']
+    xlabel = plot_details['xlabel']
+    ylabel = plot_details['ylabel']
+    labels = plot_details['labels']
+
+    # 先截取可视窗口内的全分辨率数据，再按点数预算降采样，避免向浏览器发送上百万个点
+    if window is not None:
+        x, y = slice_window(x, y, *window)
+    x, y = downsample(x, y, max_points=max_points, method=method)
+
+    if isinstance(y, pd.DataFrame):
+        # 多指标图表，使用 Altair
+        chart_data = y.copy()
+        chart_data['时间'] = x.values
+        chart_data = chart_data.melt('时间', var_name='指标', value_name='值')
+
+        chart = alt.Chart(chart_data).mark_line().encode(
+            x='时间:T',
+            y='值:Q',
+            color='指标:N'
+        ).properties(
+            title=title
+        )
+
+        st.altair_chart(chart, use_container_width=True)
+    elif isinstance(y, pd.Series) and 'regimes' in plot_details:
+        # 价格线叠加适用区间阴影，阴影区间用全分辨率的时间边界，只保留与可视窗口重叠的部分
+        regimes = plot_details['regimes']
+        if len(x):
+            regimes = regimes[(regimes['end'] >= x.iloc[0]) & (regimes['start'] <= x.iloc[-1])]
+        line = alt.Chart(pd.DataFrame({'时间': x.values, labels[0]: y.values})).mark_line().encode(
+            x=alt.X('时间:T', title=xlabel),
+            y=alt.Y(f'{labels[0]}:Q', title=ylabel, scale=alt.Scale(zero=False))
+        )
+        shade = alt.Chart(regimes.rename(columns={'start': '开始', 'end': '结束', 'bars': 'K线数'})).mark_rect(
+            opacity=0.2, color='green'
+        ).encode(x='开始:T', x2='结束:T', tooltip=['开始:T', '结束:T', 'K线数:Q'])
+        st.altair_chart((shade + line).properties(title=title), use_container_width=True)
+    elif isinstance(y, pd.Series):
+        # 单一指标，使用 st.line_chart
+        y_df = pd.DataFrame({labels[0]: y.values}, index=x)
+        st.line_chart(y_df)
+    else:
+        # 其他类型，使用 st.line_chart
+        st.line_chart(pd.DataFrame({'值': y}, index=x))
+
+def render_analysis_output(analysis_output, max_points=DEFAULT_MAX_POINTS, method='lttb', window=None):
+    # 处理分析输出
+    for item in analysis_output:
+        if item[0] == 'error':
+            st.error(item[1])
+        elif item[0] == 'info':
+            st.info(item[1])
+        elif item[0] == 'warning':
+            st.warning(item[1])
+        elif item[0] == 'success':
+            st.success(item[1])
+        elif item[0] == 'plot':
+            render_plot(item[1], max_points=max_points, method=method, window=window)
+        elif item[0] == 'table':
+            st.table(item[1])
+
+def render_profile(profile):
+    # 可折叠的性能分析面板，profile 为 RunProfile.summary() 的结果
+    with st.expander("性能分析"):
+        st.text("\n".join(profile['lines']))
+        stages = profile['summary']['stages']
+        if stages:
+            st.dataframe(pd.DataFrame.from_dict(stages, orient='index'))
+        st.download_button("下载性能统计 (JSON)", data=json.dumps(profile['summary'], indent=2, ensure_ascii=False),
+                           file_name="profile.json", mime="application/json")
+
+def symbol_input(default="ETH/USDT"):
+    # 交易对输入框：用缓存的交易所信息提供可搜索的候选列表，获取失败时退回到普通文本框
+    try:
+        options = sorted(get_exchange_info().symbols())
+    except Exception:
+        options = []
+    if not options:
+        return st.sidebar.text_input("交易对符号 (例如 ETH 或 ETH/USDT)", value=default)
+    return st.sidebar.selectbox("交易对符号 (可输入搜索，例如 ETH 或 ETH/USDT)", options=options,
+                                index=options.index(default) if default in options else 0, accept_new_options=True)
+
+MAX_CACHED_DATASETS = 4
+
+@st.cache_resource
+def shared_cache():
+    # 所有会话共用的内存映射数据层，同一份K线只保存一份
+    return SharedKlineCache()
+
+def cache_dataset(datasets, key, handle):
+    # 会话中只保存共享数据集的句柄，超出数量时释放最早的句柄，使其可以被淘汰
+    datasets[key] = handle
+    while len(datasets) > MAX_CACHED_DATASETS:
+        datasets.pop(next(iter(datasets))).release()
+
+
+# 可由已下载的K线聚合出来对比的周期
+COMPARE_INTERVAL_OPTIONS = ["5m", "15m", "30m", "1h", "2h", "4h", "6h", "12h", "1d", "1w"]
+
+@st.fragment(run_every=0.5)
+def render_job_progress(job, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    # 后台下载进行中：定时刷新进度条和已下载部分的价格图，完成后触发整页重跑以进行分析
+    if not job.running:
+        st.rerun()
+    symbol, interval = job.key[:2]
+    st.progress(job.progress, text=f"正在下载 {symbol} {interval}: 已获取 {job.rows:,} 根K线，"
+                                   f"{job.progress:.0%}，用时 {job.elapsed:.1f} 秒")
+    if st.button("取消下载"):
+        job.cancel()
+        st.rerun()
+    df = job.frame()
+    if len(df):
+        render_plot({'title': '收盘价走势图（下载中）', 'x': df['open_time'], 'y': df['close'], 'xlabel': '时间',
+                     'ylabel': '价格 (USDT)', 'labels': ['收盘价']}, max_points=max_points, method=method)
+
+def collect_job(job, datasets):
+    # 处理已结束的后台下载：成功时放入会话缓存并按需保存文件，取消或失败时给出提示
+    st.session_state.pop('job')
+    if job.status == "cancelled":
+        st.warning(f"已取消下载，已获取的 {job.rows:,} 根K线未用于分析。")
+        return
+    if job.status == "error":
+        st.error(f"发生错误: {job.error}")
+        return
+    # 发布到共享数据层，其他会话和进程可以直接挂载而不必重新下载
+    handle = shared_cache().publish(job.key[:4], job.frame())
+    cache_dataset(datasets, job.key, handle)
+    # 下载阶段的统计在分析时继续累积，一起展示
+    st.session_state['download_profile'] = job.profile
+    save_dataset(job.key, handle.frame())
+
+def save_dataset(key, df):
+    # 按侧边栏的设置把数据保存为 CSV 文件
+    save = st.session_state.get('save')
+    if save is not None:
+        save_to, in_memory = save
+        symbol, interval, start, end = key[:4]
+        save_to = save_to or f'{symbol.replace("/", "_")}_{interval}_{start}_{end}.csv'
+        df.to_csv(save_to, index=False)
+        if not in_memory:
+            st.success(f"数据已保存至: {save_to}")
+
+def interval_comparison_output(df, interval, compare_intervals, analysis_params):
+    # 多周期对比：由已下载的K线聚合出较粗的周期，不需要再次下载
+    params = {name: analysis_params[name] for name in ('threshold_factor', 'grid_step_percentage', 'max_grids',
+                                                       'atr_period', 'atr_std_multiplier')}
+    table = comparison_table(analyze_intervals(df, interval, [interval] + list(compare_intervals), **params))
+    table['suitable'] = table['suitable'].map({True: '适合', False: '不适合'})
+    return [('info', f"多周期对比（由已下载的 {interval} K线聚合，无需重新下载）"), ('table', table)]
+
+def run_cached_analysis(key, df, analysis_params, compare_intervals=()):
+    # 分析参数、对比周期或数据变化时重新分析，否则沿用会话中的结果
+    analysis_key = (key, tuple(sorted(analysis_params.items())), tuple(compare_intervals))
+    if st.session_state.get('analysis_key') == analysis_key and 'analysis' in st.session_state:
+        return
+    profile = st.session_state.pop('download_profile', None)
+    with profiling.profiling(profile) as profile:
+        try:
+            is_suitable, analysis_output = analyze_grid_strategy(df=df, streamlit_mode=True, **analysis_params)
+            if compare_intervals:
+                analysis_output = interval_comparison_output(df, key[1], compare_intervals,
+                                                             analysis_params) + analysis_output
+        except Exception as e:
+            st.error(f"发生错误: {e}")
+            return
+    # 保存分析结果，调整图表窗口等控件触发重跑时无需重新分析
+    st.session_state['analysis_key'] = analysis_key
+    st.session_state['analysis'] = {
+        'suitable': is_suitable,
+        'output': analysis_output,
+        'time_range': (df['open_time'].iloc[0], df['open_time'].iloc[-1]),
+    }
+    st.session_state['profile'] = {'summary': profile.summary(), 'lines': profile.report_lines()}
+    if is_suitable:
+        st.balloons()
 
 def main():
     st.title("网格策略分析工具")
@@ -12,8 +200,10 @@ def main():
     st.sidebar.header("输入参数")
 
     # 输入参数
-    symbol = st.sidebar.text_input("交易对符号 (例如 ETH 或 ETH/USDT)", value="ETH/USDT")
+    symbol = symbol_input()
     interval = st.sidebar.selectbox("K线时间间隔", options=["1m", "5m", "15m", "30m", "1h", "4h", "1d"], index=2)
+    compare_intervals = st.sidebar.multiselect("同时对比的周期（由所选周期的K线聚合）",
+                                               options=[i for i in COMPARE_INTERVAL_OPTIONS if can_resample(interval, i)])
 
     date_option = st.sidebar.radio("选择日期范围", ("最近多少天", "指定开始和结束日期"))
 
@@ -34,99 +224,83 @@ def main():
     visualize = st.sidebar.checkbox("是否生成图表", value=True)
     threshold_factor = st.sidebar.slider("阈值因子 (threshold_factor)", min_value=0.1, max_value=3.0, value=1.0, step=0.1)
     in_memory = st.sidebar.checkbox("是否在内存中分析数据而不保存文件", value=True)
+    use_store = st.sidebar.checkbox("使用本地K线存储（只下载缺失的时间段）", value=True)
     grid_step_percentage = st.sidebar.slider("推荐的网格步长百分比", min_value=0.1, max_value=5.0, value=1.0, step=0.1)
     max_grids = st.sidebar.number_input("推荐的最大网格数量", min_value=1, max_value=100, value=99, step=1)
     atr_std_multiplier = st.sidebar.slider("ATR 阈值设定的标准差倍数", min_value=0.1, max_value=3.0, value=1.0, step=0.1)
+    show_timeline = st.sidebar.checkbox("在价格图上标出滚动适用区间", value=False)
+    timeline_window = st.sidebar.number_input("滚动窗口（K线根数）", min_value=50, max_value=100000, value=500, step=50,
+                                              disabled=not show_timeline)
+    max_points = st.sidebar.number_input("图表最大点数", min_value=500, max_value=20000, value=DEFAULT_MAX_POINTS, step=500)
+    downsample_method = st.sidebar.selectbox("降采样方法", options=list(DOWNSAMPLE_METHODS),
+                                             format_func=lambda m: {'lttb': 'LTTB（保留形状）', 'minmax': '最小/最大值分桶'}[m])
+
+    warm = fresh_metrics(symbol, interval, days=days) if days else None
+    if warm is not None:
+        verdict = "适合" if warm['metrics']['suitable'] else "不适合"
+        st.sidebar.caption(f"后台预取: {warm['rows']} 根K线已是最新，按预取参数计算网格策略{verdict}，本地数据无需重新下载。")
+
+    analysis_params = {
+        'visualize': visualize,
+        'threshold_factor': threshold_factor,
+        'grid_step_percentage': grid_step_percentage,
+        'max_grids': max_grids,
+        'atr_period': 14,  # 使用默认ATR周期
+        'atr_std_multiplier': atr_std_multiplier,
+        'timeline_window': int(timeline_window) if show_timeline else None,
+    }
+    datasets = st.session_state.setdefault('datasets', {})
 
     if st.sidebar.button("运行分析"):
-        with st.spinner("下载和分析数据..."):
-            try:
-                df = run_download(
-                    symbol=symbol,
-                    interval=interval,
-                    start=start.strftime("%Y-%m-%d") if start else None,
-                    end=end.strftime("%Y-%m-%d") if end else None,
-                    days=days,
-                    save_to=save_to,
-                    return_df=True if in_memory else False
-                )
-
-                if not in_memory and save_to:
-                    if os.path.exists(save_to):
-                        st.success(f"数据已保存至: {save_to}")
-                    else:
-                        st.error("数据下载失败或文件未保存。")
-
-                if df is not None:
-                    is_suitable, analysis_output = analyze_grid_strategy(
-                        df=df,
-                        visualize=visualize,
-                        threshold_factor=threshold_factor,
-                        grid_step_percentage=grid_step_percentage,
-                        max_grids=max_grids,
-                        atr_period=14,  # 使用默认ATR周期
-                        atr_std_multiplier=atr_std_multiplier,
-                        streamlit_mode=True
-                    )
-
-                    # 处理分析输出
-                    for item in analysis_output:
-                        if item[0] == 'error':
-                            st.error(item[1])
-                        elif item[0] == 'info':
-                            st.info(item[1])
-                        elif item[0] == 'warning':
-                            st.warning(item[1])
-                        elif item[0] == 'success':
-                            st.success(item[1])
-                        elif item[0] == 'plot':
-                            plot_details = item[1]
-                            title = plot_details['title']
-                            x = plot_details['x']
-                            y = plot_details['y']
-                            xlabel = plot_details['xlabel']
-                            ylabel = plot_details['ylabel']
-                            labels = plot_details['labels']
-
-                            # 移除调试信息
-                            # st.write(f"绘图标题: {title}")
-                            # st.write("X 数据:", x)
-                            # st.write("Y 数据:", y)
-
-                            if isinstance(y, pd.DataFrame):
-                                # 多指标图表，使用 Altair
-                                chart_data = y.copy()
-                                chart_data['时间'] = x
-                                chart_data = chart_data.melt('时间', var_name='指标', value_name='值')
-
-                                chart = alt.Chart(chart_data).mark_line().encode(
-                                    x='时间:T',
-                                    y='值:Q',
-                                    color='指标:N'
-                                ).properties(
-                                    title=title
-                                )
-
-                                st.altair_chart(chart, use_container_width=True)
-                            elif isinstance(y, pd.Series):
-                                # 单一指标，使用 st.line_chart
-                                y_df = pd.DataFrame({labels[0]: y.values}, index=x)
-                                st.line_chart(y_df)
-                            else:
-                                # 其他类型，使用 st.line_chart
-                                st.line_chart(pd.DataFrame({'值': y}, index=x))
-
-                        elif item[0] == 'table':
-                            st.table(item[1])
-
-                    if is_suitable:
-                        st.balloons()
-                else:
-                    st.error("未能获取数据进行分析。")
-            except ValueError as ve:
-                st.error(f"参数错误: {ve}")
-            except Exception as e:
-                st.error(f"发生错误: {e}")
+        try:
+            start_str, end_str = resolve_date_range(start.strftime("%Y-%m-%d") if start else None,
+                                                    end.strftime("%Y-%m-%d") if end else None, days)
+            key = (resolve_symbol(symbol), interval, start_str, end_str, use_store)
+        except ValueError as ve:
+            st.error(f"参数错误: {ve}")
+            key = None
+        if key is not None:
+            st.session_state['save'] = None if in_memory and not save_to else (save_to, in_memory)
+            st.session_state['active_key'] = key
+            st.session_state.pop('analysis', None)
+            handle = shared_cache().attach(key[:4]) if key not in datasets else None
+            if handle is not None:
+                # 其他会话已经下载过同样的数据，直接挂载共享的只读数组
+                cache_dataset(datasets, key, handle)
+                save_dataset(key, handle.frame())
+                st.info(f"使用其他会话已下载的共享数据（{handle.rows:,} 根K线），无需重新下载。")
+            elif key not in datasets:
+                # 只有下载参数变化时才重新下载；只修改分析参数时直接用会话缓存的数据重新分析
+                job = st.session_state.get('job')
+                if job is None or not job.running or job.key != key:
+                    if job is not None:
+                        job.cancel()
+                    st.session_state['job'] = DownloadJob(*key).start_thread()
+
+    job = st.session_state.get('job')
+    if job is not None and job.running:
+        render_job_progress(job, max_points=max_points, method=downsample_method)
+    elif job is not None:
+        collect_job(job, datasets)
+
+    active_key = st.session_state.get('active_key')
+    if active_key in datasets:
+        run_cached_analysis(active_key, datasets[active_key].frame(), analysis_params,
+                            compare_intervals if active_key[1] == interval else ())
+
+    if 'analysis' in st.session_state:
+        analysis = st.session_state['analysis']
+        window = None
+        has_plot = any(item[0] == 'plot' for item in analysis['output'])
+        if has_plot:
+            t_min, t_max = (t.to_pydatetime() for t in analysis['time_range'])
+            if t_min < t_max:
+                window = st.slider("图表时间窗口（缩小窗口可查看全分辨率细节）", min_value=t_min, max_value=t_max,
+                                   value=(t_min, t_max), format="YYYY-MM-DD HH:mm")
+        render_analysis_output(analysis['output'], max_points=max_points, method=downsample_method, window=window)
+
+    if 'profile' in st.session_state:
+        render_profile(st.session_state['profile'])
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from kline_downloader import (klines_to_frame, download_full_klines, get_start_end_pairs, interval_to_seconds,
+                              REQ_LIMIT)
+from grid_strategy import analyze_grid_strategy
+from stub_exchange import StubExchange, synthetic_kline_columns
+
+DEFAULT_ROWS = [10000, 100000, 1000000, 5000000]
+DEFAULT_STAGES = ["pairs", "decode", "csv_write", "csv_read", "analyze_cli", "analyze_streamlit", "download"]
+BENCH_START = "2015-01-01"
+
+# 与 /api/v3/klines 响应中单行的格式一致，价格类字段为字符串
+ROW_TEMPLATE = '[%d,"%.8f","%.8f","%.8f","%.8f","%.8f",%d,"%.8f",%d,"%.8f","%.8f","0"]'
+ROW_FIELDS = ["open_time", "open", "high", "low", "close", "volume", "close_time", "value", "trade_cnt",
+              "active_buy_volume", "active_buy_value"]
+
+
+def synthetic_payloads(rows, interval="1m", start_ms=1704067200000):
+    """生成 rows 根合成K线，按每批 REQ_LIMIT 根切分为与 /api/v3/klines 相同格式的响应体"""
+    interval_ms = interval_to_seconds(interval) * 1000
+    cols = synthetic_kline_columns(start_ms, rows, interval_ms)
+    records = list(zip(*(cols[name].tolist() for name in ROW_FIELDS)))
+    payloads = []
+    for offset in range(0, rows, REQ_LIMIT):
+        batch = records[offset:offset + REQ_LIMIT]
+        payloads.append(("[" + ",".join([ROW_TEMPLATE % row for row in batch]) + "]").encode())
+    return payloads
+
+
+def legacy_klines_to_frame(payloads):
+    """优化前 download_full_klines 的解析方式：json 解析后拼成 object 数组再逐行复制"""
+    klines = [json.loads(p) for p in payloads]
+    klines = np.concatenate(klines)
+    data = []
+    cols = ["open_time", "open", "high", "low", "close", "volume",
+            "close_time", "value", "trade_cnt",
+            "active_buy_volume", "active_buy_value"]
+
+    for i in range(len(klines)):
+        tmp_kline = klines[i]
+        data.append(tmp_kline[:-1])
+
+    df = pd.DataFrame(np.array(data), columns=cols, dtype=float)
+    df.drop("close_time", axis=1, inplace=True)
+    for col in cols:
+        if col in ["open_time", "trade_cnt"]:
+            df[col] = df[col].astype(int)
+    return df
+
+
+def measure(func, *args, **kwargs):
+    """返回 (结果, 耗时秒数, 峰值内存MB)"""
+    tracemalloc.start()
+    begin = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def compare_decode(rows):
+    payloads = synthetic_payloads(rows)
+    legacy_df, legacy_time, legacy_peak = measure(legacy_klines_to_frame, payloads)
+    new_df, new_time, new_peak = measure(klines_to_frame, payloads)
+    pd.testing.assert_frame_equal(legacy_df, new_df, check_dtype=False)
+    print(f"解析 {rows} 行K线:")
+    print(f"  原方案: {legacy_time:.3f} 秒, {rows / legacy_time:,.0f} 行/秒, 峰值内存 {legacy_peak:.1f} MB")
+    print(f"  新方案: {new_time:.3f} 秒, {rows / new_time:,.0f} 行/秒, 峰值内存 {new_peak:.1f} MB")
+    print(f"  加速 {legacy_time / new_time:.1f} 倍, 峰值内存降低 {legacy_peak / new_peak:.1f} 倍")
+
+
+def run_stage(func, repeat=3):
+    """
+    耗时取 repeat 次中的最小值（不开启 tracemalloc，避免其开销计入耗时），
+    峰值内存另外单独运行一次、用 tracemalloc 统计。
+    """
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - begin)
+    _, _, peak_mb = measure(func)
+    return min(times), peak_mb
+
+
+def _quiet(func, *args, **kwargs):
+    # 屏蔽 CLI 模式的打印和下载进度条，避免输出本身影响耗时
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _bench_end_date(rows, interval):
+    """返回从 BENCH_START 起覆盖 rows 根K线的结束日期"""
+    days = -(-rows * interval_to_seconds(interval) // 86400)
+    return (datetime.strptime(BENCH_START, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def bench_download(rows, interval="1m", latency=0.05, concurrency=8):
+    """
+    对本地模拟交易所下载约 rows 根K线（不使用本地存储）。每次运行启动新的模拟交易所，
+    使每分钟权重从零开始统计，结果只反映下载和解析本身。
+    """
+    end = _bench_end_date(rows, interval)
+
+    def run():
+        with StubExchange(latency=latency, weight_limit=10 ** 9) as exchange:
+            _quiet(download_full_klines, "BENCH/USDT", interval, BENCH_START, end, dimension="all", return_df=True,
+                   concurrency=concurrency, base_url=exchange.base_url, use_store=False)
+
+    return run
+
+
+def run_benchmarks(rows_list, stages=None, interval="1m", repeat=3, latency=0.05, concurrency=8,
+                   max_download_rows=100000):
+    """依次对每个数据规模运行各阶段，返回结果列表，每项包含 stage、rows、seconds、peak_mb 和 rows_per_sec"""
+    stages = stages or DEFAULT_STAGES
+    results = []
+
+    def record(stage, rows, func, stage_repeat=repeat):
+        seconds, peak_mb = run_stage(func, stage_repeat)
+        results.append({
+            "stage": stage,
+            "rows": rows,
+            "seconds": seconds,
+            "peak_mb": peak_mb,
+            "rows_per_sec": rows / seconds if seconds > 0 else None,
+        })
+        print(f"{stage:<18} {rows:>9,} 行 {seconds:>9.4f} 秒 峰值内存 {peak_mb:>9.1f} MB")
+
+    for rows in rows_list:
+        if "pairs" in stages:
+            end = _bench_end_date(rows, interval)
+            record("pairs", rows, lambda: get_start_end_pairs(BENCH_START, end, interval))
+
+        need_payloads = "decode" in stages or "decode_legacy" in stages
+        need_frame = any(s in stages for s in ("csv_write", "csv_read", "analyze_cli", "analyze_streamlit"))
+        payloads = synthetic_payloads(rows, interval) if need_payloads or need_frame else None
+        if "decode" in stages:
+            record("decode", rows, lambda: klines_to_frame(payloads))
+        if "decode_legacy" in stages:
+            record("decode_legacy", rows, lambda: legacy_klines_to_frame(payloads), 1)
+
+        if need_frame:
+            # 与 download_full_klines 返回的 DataFrame 一致：open_time 为 datetime
+            df = klines_to_frame(payloads)
+            df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
+            payloads = None
+            with tempfile.TemporaryDirectory() as tmp:
+                csv_path = os.path.join(tmp, "klines.csv")
+                if "csv_write" in stages or "csv_read" in stages:
+                    record("csv_write", rows, lambda: df.to_csv(csv_path, index=False), 1)
+                if "csv_read" in stages:
+                    record("csv_read", rows, lambda: pd.read_csv(csv_path))
+            if "analyze_cli" in stages:
+                record("analyze_cli", rows, lambda: _quiet(analyze_grid_strategy, df))
+            if "analyze_streamlit" in stages:
+                record("analyze_streamlit", rows, lambda: analyze_grid_strategy(df, streamlit_mode=True))
+            del df
+
+        if "download" in stages:
+            if rows > max_download_rows:
+                print(f"{'download':<18} {rows:>9,} 行 超过 --max_download_rows，跳过")
+            else:
+                record("download", rows, bench_download(rows, interval, latency, concurrency), 1)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, path, **settings):
+    """把结果连同提交号和运行环境写入 JSON 文件，便于不同提交之间比对"""
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+def compare_results(baseline_path, results, tolerance=0.2):
+    """
+    与之前保存的结果逐项比对（按 stage 和 rows 匹配），耗时或峰值内存超过基线 (1 + tolerance) 倍的记为回归。
+    返回回归项的列表。
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    base = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    print(f"\n与基线 {baseline_path}（提交 {baseline.get('commit')}）比对:")
+    regressions = []
+    for r in results:
+        old = base.get((r["stage"], r["rows"]))
+        if old is None:
+            continue
+        time_ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        mem_ratio = r["peak_mb"] / old["peak_mb"] if old["peak_mb"] else float("inf")
+        regressed = time_ratio > 1 + tolerance or mem_ratio > 1 + tolerance
+        if regressed:
+            regressions.append(r)
+        flag = "  <-- 回归" if regressed else ""
+        print(f"{r['stage']:<18} {r['rows']:>9,} 行 耗时 {old['seconds']:.4f} -> {r['seconds']:.4f} 秒 "
+              f"({time_ratio:.2f}x) 峰值内存 {old['peak_mb']:.1f} -> {r['peak_mb']:.1f} MB ({mem_ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对下载、解析、存储和分析各阶段做性能基准测试')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='合成K线的行数，默认 10k/100k/1M/5M')
+    parser.add_argument('--stages', type=str, nargs='+', default=DEFAULT_STAGES,
+                        choices=DEFAULT_STAGES + ["decode_legacy"], help='要运行的阶段')
+    parser.add_argument('--interval', '-i', type=str, default='1m', help='K线时间间隔，例如 "1m"')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段重复次数，耗时取最小值')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟交易所每个请求的延迟（秒）')
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='下载阶段的并发请求数')
+    parser.add_argument('--max_download_rows', type=int, default=100000, help='下载阶段的最大行数，更大的规模跳过')
+    parser.add_argument('--save_to', '-o', type=str, default=None, help='把结果保存为 JSON 文件')
+    parser.add_argument('--compare', type=str, default=None, help='与之前保存的 JSON 结果比对')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='比对时允许的相对变慢/变大比例。默认值为0.2')
+    parser.add_argument('--legacy', action='store_true', help='只对比新旧两种K线解析方式')
+    args = parser.parse_args()
+
+    if args.legacy:
+        for rows in args.rows:
+            compare_decode(rows)
+        return
+
+    results = run_benchmarks(args.rows, stages=args.stages, interval=args.interval, repeat=args.repeat,
+                             latency=args.latency, concurrency=args.concurrency,
+                             max_download_rows=args.max_download_rows)
+    if args.save_to:
+        save_results(results, args.save_to, interval=args.interval, repeat=args.repeat, latency=args.latency,
+                     concurrency=args.concurrency)
+        print(f"结果已保存至 {args.save_to}")
+    if args.compare:
+        regressions = compare_results(args.compare, results, args.tolerance)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} 项超过基线 {1 + args.tolerance:.2f} 倍")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_MAX_POINTS = 2000
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def minmax_indices(y, n_out):
+    """把序列均分为 n_out / 2 个桶，每个桶保留最小值和最大值所在的点，完全向量化"""
+    y = _as_float(y)
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+    buckets = n_out // 2
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lo = np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1) + offsets
+    hi = np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1) + offsets
+    idx = np.concatenate([[0, n - 1], lo, hi])
+    return np.unique(idx[idx < n])
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标，首尾两点总会保留"""
+    x = _as_float(x)
+    y = _as_float(y)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # 中间 n - 2 个点均分为 n_out - 2 个桶，每个桶选出与上一选中点、下一桶均值构成三角形面积最大的点
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = np.nanmean(y[next_lo:next_hi]) if not np.isnan(y[next_lo:next_hi]).all() else y[a]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        idx[i + 1] = a
+    return np.unique(idx)
+
+
+def downsample(x, y, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """
+    对图表数据做保形降采样，x 为时间序列，y 为 Series 或多列 DataFrame。
+    多列时每列分到 max_points / 列数 的预算，保留各列选中点的并集，保证所有列共用同一组时间点。
+    返回与输入类型一致的 (x, y)。
+    """
+    n = len(x)
+    if max_points is None or n <= max_points:
+        return x, y
+    columns = [y[col] for col in y.columns] if isinstance(y, pd.DataFrame) else [y]
+    budget = max(max_points // len(columns), 4)
+    x_values = np.asarray(x)
+    parts = []
+    for col in columns:
+        values = np.asarray(col)
+        if method == 'minmax':
+            parts.append(minmax_indices(values, budget))
+        else:
+            parts.append(lttb_indices(x_values, values, budget))
+    idx = np.unique(np.concatenate(parts))
+    return x.iloc[idx] if isinstance(x, pd.Series) else x_values[idx], y.iloc[idx]
+
+
+def slice_window(x, y, start=None, end=None):
+    """截取 [start, end] 时间窗口内的全分辨率数据，用于放大查看局部"""
+    x_series = pd.Series(pd.to_datetime(np.asarray(x)))
+    mask = np.ones(len(x_series), dtype=bool)
+    if start is not None:
+        mask &= (x_series >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        mask &= (x_series <= pd.Timestamp(end)).to_numpy()
+    return (x.iloc[mask] if isinstance(x, pd.Series) else np.asarray(x)[mask]), y.iloc[mask]
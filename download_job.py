@@ -0,0 +1,128 @@
+import contextvars
+import threading
+import time
+
+import pandas as pd
+
+import profiling
+from kline_downloader import REQ_LIMIT, get_start_end_ts
+from streaming_analysis import iter_kline_chunks
+
+OHLCV_COLUMNS = ["open_time", "open", "high", "low", "close", "volume"]
+# 每块的请求数，块越小图表和进度更新越频繁，取消也越及时
+DEFAULT_CHUNK_REQUESTS = 5
+
+
+class DownloadJob:
+    """
+    在后台线程中按时间顺序分块下载（或从本地存储读取）K线。每完成一块就追加到 chunks，
+    调用方可以随时读取已完成的部分和进度来渐进地显示图表；cancel() 后在当前块完成时停止。
+    结果与 download_full_klines(..., return_df=True) 相同：open_time 为 datetime 的 OHLCV DataFrame。
+    """
+
+    def __init__(self, symbol, interval, start, end, use_store=True, concurrency=None, base_url=None, store=None,
+                 chunk_rows=None):
+        self.symbol = symbol
+        self.interval = interval
+        self.start = start
+        self.end = end
+        self.use_store = use_store
+        self.concurrency = concurrency
+        self.base_url = base_url
+        self.store = store
+        self.chunk_rows = chunk_rows or DEFAULT_CHUNK_REQUESTS * REQ_LIMIT * max(concurrency or 1, 1)
+        start_ts, end_ts = get_start_end_ts(start, end)
+        self._start_ms, self._end_ms = start_ts * 1000, end_ts * 1000
+        self.chunks = []
+        self.rows = 0
+        self.covered_until_ms = self._start_ms
+        self.status = "pending"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.profile = profiling.RunProfile()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._frame = None
+
+    @property
+    def key(self):
+        return (self.symbol, self.interval, self.start, self.end, self.use_store)
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    @property
+    def progress(self):
+        """按已完成的时间跨度估算的进度，范围 0 到 1"""
+        if self.status == "done":
+            return 1.0
+        span = self._end_ms - self._start_ms
+        if span <= 0:
+            return 0.0
+        return min(max((self.covered_until_ms - self._start_ms) / span, 0.0), 1.0)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def start_thread(self):
+        # 后台线程在调用方上下文的副本中运行，它启用的 RunProfile 只对该线程生效
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run,), daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def _run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            # 后台线程在自己的上下文中单独记录下载阶段的性能统计，分析完成后与之合并展示
+            with profiling.profiling(self.profile):
+                chunks = iter_kline_chunks(self.symbol, self.interval, self.start, self.end,
+                                           chunk_rows=self.chunk_rows, use_store=self.use_store, store=self.store,
+                                           concurrency=self.concurrency, base_url=self.base_url, progress=False)
+                for chunk in chunks:
+                    if self._cancel.is_set():
+                        break
+                    last_open_ms = int(chunk["open_time"].iloc[-1])
+                    chunk = chunk[OHLCV_COLUMNS].copy()
+                    chunk["open_time"] = pd.to_datetime(chunk["open_time"], unit="ms")
+                    # 先追加块再更新行数，读取方按行数判断是否有新数据
+                    self.chunks.append(chunk)
+                    self.rows += len(chunk)
+                    self.covered_until_ms = last_open_ms
+            if self._cancel.is_set():
+                self.status = "cancelled"
+            elif self.rows == 0:
+                raise Exception("{} {} 在 {} - {} 期间没有K线数据".format(self.symbol, self.interval, self.start,
+                                                                      self.end))
+            else:
+                self.status = "done"
+        except Exception as e:
+            self.error = e
+            self.status = "error"
+        finally:
+            self.finished_at = time.time()
+
+    def frame(self):
+        """返回目前已下载的全部K线，线程完成后结果会被缓存"""
+        chunks = list(self.chunks)
+        if not chunks:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        if self._frame is not None and self._frame[0] == len(chunks):
+            return self._frame[1]
+        df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+        if not self.running:
+            self._frame = (len(chunks), df)
+        return df
@@ -0,0 +1,161 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import kline_downloader
+import profiling
+from kline_resample import next_open_time, interval_ms
+from kline_store import DEFAULT_STORE_DIR
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(DEFAULT_STORE_DIR) or ".", "journal")
+CHUNK_FILE_RE = re.compile(r"^(\d+)_(\d+)\.json$")
+
+
+class ChunkJournal:
+    """
+    下载日志：每个 交易对/周期 一个目录，每个成功下载的请求区间 (start_ts, end_ts) 保存为一个文件，
+    内容为交易所的原始响应体。写入时先写临时文件再替换，进程在任意时刻中断都不会留下不完整的文件。
+    重新运行时已在日志中的区间直接读取，只下载缺失的区间。
+    """
+
+    def __init__(self, symbol, interval, root=DEFAULT_JOURNAL_DIR):
+        self.symbol = symbol.replace("/", "")
+        self.interval = interval
+        self.path = os.path.join(root, self.symbol, interval)
+        # 本次运行读写过的区间，数据持久化后由 discard() 删除
+        self.used = set()
+
+    def _chunk_path(self, start_ts, end_ts):
+        return os.path.join(self.path, "{}_{}.json".format(start_ts, end_ts))
+
+    def completed(self):
+        """日志中已完成的区间"""
+        if not os.path.isdir(self.path):
+            return set()
+        done = set()
+        for name in os.listdir(self.path):
+            match = CHUNK_FILE_RE.match(name)
+            if match:
+                done.add((int(match.group(1)), int(match.group(2))))
+        return done
+
+    def read(self, start_ts, end_ts):
+        with open(self._chunk_path(start_ts, end_ts), "rb") as f:
+            return f.read()
+
+    def write(self, start_ts, end_ts, payload):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._chunk_path(start_ts, end_ts)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def discard(self, pairs=None):
+        """数据已经写入本地存储或 CSV 后删除对应的日志文件，默认删除本次运行用到的区间"""
+        if pairs is None:
+            pairs, self.used = self.used, set()
+        for start_ts, end_ts in pairs:
+            try:
+                os.remove(self._chunk_path(start_ts, end_ts))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+
+
+class ChunkDownloadError(Exception):
+    """部分请求区间在重试后仍然失败；已成功的区间保留在日志中，重新运行时只下载失败的区间"""
+
+    def __init__(self, failed):
+        self.failed = failed
+        start_ts, end_ts = failed[0][0]
+        super().__init__("{} 个请求区间下载失败（例如 {} - {}: {}），已完成的区间已保存，重新运行即可从断点继续".format(
+            len(failed), start_ts, end_ts, failed[0][1]))
+
+
+def fetch_journaled(symbol, interval, start_end_pairs, journal, concurrency=None, base_url=None, limiter=None,
+                    max_retries=None, progress=True):
+    """
+    与 fetch_kline_batches 相同，按顺序返回各区间的原始响应体；每个区间下载成功后立即写入日志，
+    日志中已有的区间不再请求。所有区间都尝试完后，如果仍有失败的区间，抛出 ChunkDownloadError。
+    最后一根K线还没有收盘的区间（包括结束时间还没到，以及结束时间落在周线、月线等未收盘K线中间的区间）
+    只包含部分数据，不写入日志，下次重新下载。
+    """
+    symbol = symbol.replace("/", "")
+    max_retries = kline_downloader.MAX_RETRIES if max_retries is None else max_retries
+    done = journal.completed()
+    missing = [pair for pair in start_end_pairs if pair not in done]
+    pending = {}
+    if missing:
+        workers = concurrency or 1
+        limiter = limiter or kline_downloader.RateLimiter()
+        session = kline_downloader.create_session(pool_size=workers)
+        failed = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    profiling.submit(executor, kline_downloader.fetch_chunk, symbol, interval, start_ts, end_ts, session,
+                                     limiter, base_url, max_retries): (start_ts, end_ts)
+                    for start_ts, end_ts in missing
+                }
+                for future in tqdm(as_completed(futures), total=len(futures), disable=not progress):
+                    pair = futures[future]
+                    try:
+                        payload = future.result()
+                    except Exception as e:
+                        failed.append((pair, e))
+                        continue
+                    if kline_downloader.closed_end_ms(pair[1], interval) > pair[1] * 1000:
+                        journal.write(*pair, payload)
+                    else:
+                        pending[pair] = payload
+        finally:
+            session.close()
+        if failed:
+            raise ChunkDownloadError(sorted(failed, key=lambda item: item[0]))
+    journal.used.update(start_end_pairs)
+    return [pending[pair] if pair in pending else journal.read(*pair) for pair in start_end_pairs]
+
+
+def verify_klines(df, interval):
+    """
+    校验K线的完整性：返回重复的 open_time 数量和缺口列表 [(缺口前最后一根的开盘时间, 缺口后第一根的开盘时间, 缺少的根数)]。
+    open_time 可以是毫秒时间戳或 datetime。交易所维护期间本来就没有K线，缺口不一定是下载错误。
+    """
+    open_time = df["open_time"]
+    if pd.api.types.is_datetime64_any_dtype(open_time):
+        open_time = open_time.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    else:
+        open_time = open_time.to_numpy(dtype=np.int64)
+    open_time = np.sort(open_time)
+    duplicates = int(np.count_nonzero(open_time[1:] == open_time[:-1]))
+    unique = np.unique(open_time)
+    expected = next_open_time(unique[:-1], interval)
+    idx = np.flatnonzero(unique[1:] > expected)
+    step = interval_ms(interval)
+    gaps = []
+    for i in idx:
+        if step:
+            missing = int((unique[i + 1] - unique[i]) // step) - 1
+        else:
+            missing = len(pd.date_range(pd.to_datetime(unique[i], unit="ms"), pd.to_datetime(unique[i + 1], unit="ms"),
+                                        freq="MS")) - 2
+        gaps.append((int(unique[i]), int(unique[i + 1]), missing))
+    return {"rows": len(df), "duplicates": duplicates, "gaps": gaps}
+
+
+def format_verify_report(report, limit=5):
+    lines = ["校验: {} 根K线，重复 {} 根，缺口 {} 处".format(report["rows"], report["duplicates"], len(report["gaps"]))]
+    for start, end, missing in report["gaps"][:limit]:
+        lines.append("  缺口: {} 之后到 {} 之前缺少 {} 根".format(pd.to_datetime(start, unit="ms"),
+                                                          pd.to_datetime(end, unit="ms"), missing))
+    if len(report["gaps"]) > limit:
+        lines.append("  ……另有 {} 处缺口".format(len(report["gaps"]) - limit))
+    return lines
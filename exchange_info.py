@@ -0,0 +1,207 @@
+import difflib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+import requests
+
+import kline_downloader
+from kline_store import DEFAULT_STORE_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(DEFAULT_STORE_DIR) or ".", "exchange_info.json")
+# 交易对列表和过滤器很少变化，缓存 6 小时
+DEFAULT_TTL = 6 * 60 * 60
+EXCHANGE_INFO_ENDPOINT = "/api/v3/exchangeInfo"
+DEFAULT_QUOTE = "USDT"
+
+
+@dataclass
+class SymbolInfo:
+    """单个交易对的元数据，只保留分析和下单需要的字段"""
+    symbol: str
+    base: str
+    quote: str
+    status: str
+    tick_size: Optional[float] = None
+    step_size: Optional[float] = None
+    min_qty: Optional[float] = None
+    min_notional: Optional[float] = None
+
+    @property
+    def pair(self):
+        return "{}/{}".format(self.base, self.quote)
+
+    @property
+    def trading(self):
+        return self.status == "TRADING"
+
+
+def parse_symbol_info(item):
+    """把 exchangeInfo 中的一个交易对转换为 SymbolInfo，价格精度、数量精度和最小成交额取自各个过滤器"""
+    filters = {f["filterType"]: f for f in item.get("filters", [])}
+    price_filter = filters.get("PRICE_FILTER", {})
+    lot_size = filters.get("LOT_SIZE", {})
+    notional = filters.get("NOTIONAL") or filters.get("MIN_NOTIONAL") or {}
+
+    def number(values, key):
+        return float(values[key]) if key in values else None
+
+    return SymbolInfo(
+        symbol=item["symbol"].upper(),
+        base=item["baseAsset"].upper(),
+        quote=item["quoteAsset"].upper(),
+        status=item["status"],
+        tick_size=number(price_filter, "tickSize"),
+        step_size=number(lot_size, "stepSize"),
+        min_qty=number(lot_size, "minQty"),
+        min_notional=number(notional, "minNotional"),
+    )
+
+
+class ExchangeInfo:
+    """
+    交易所元数据的内存索引：按交易对、基础币种和计价币种查找，并附带价格/数量精度和交易状态。
+    完整的 exchangeInfo 有几 MB，只在缓存过期后下载一次，精简后的索引保存在磁盘上，
+    进程重启或多个工作进程都直接读取磁盘缓存。
+    """
+
+    def __init__(self, symbols, fetched_at=None, source=None):
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        # 数据来源的接口地址，避免把模拟交易所的缓存当作真实交易所的使用
+        self.source = source
+        self.by_symbol = {}
+        self.by_base = {}
+        self.by_quote = {}
+        for info in symbols:
+            self.by_symbol[info.symbol] = info
+            self.by_base.setdefault(info.base, []).append(info)
+            self.by_quote.setdefault(info.quote, []).append(info)
+
+    @classmethod
+    def from_payload(cls, payload, fetched_at=None, source=None):
+        """由 /api/v3/exchangeInfo 的原始响应构建"""
+        return cls([parse_symbol_info(item) for item in payload["symbols"]], fetched_at=fetched_at, source=source)
+
+    @classmethod
+    def from_file(cls, path):
+        """读取保存的原始 exchangeInfo 响应（测试数据）或 save() 写出的精简缓存"""
+        with open(path) as f:
+            data = json.load(f)
+        if "index" in data:
+            return cls([SymbolInfo(**item) for item in data["index"]], fetched_at=data["fetched_at"],
+                       source=data.get("source"))
+        return cls.from_payload(data, fetched_at=os.path.getmtime(path))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump({"fetched_at": self.fetched_at, "source": self.source,
+                       "index": [asdict(info) for info in self.by_symbol.values()]}, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def age(self, now=None):
+        return (now or time.time()) - self.fetched_at
+
+    def __len__(self):
+        return len(self.by_symbol)
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def get(self, symbol, default_quote=DEFAULT_QUOTE):
+        """按 "ETH"、"ETH/USDT"、"ethusdt" 等形式查找交易对，不存在时返回 None"""
+        symbol = symbol.strip().upper()
+        if "/" in symbol:
+            base, _, quote = symbol.partition("/")
+            return self.by_symbol.get(base + quote)
+        return self.by_symbol.get(symbol) or self.by_symbol.get(symbol + default_quote)
+
+    def resolve(self, symbol, default_quote=DEFAULT_QUOTE):
+        """返回交易对的 SymbolInfo，不存在时抛出 ValueError 并给出相近的交易对"""
+        info = self.get(symbol, default_quote)
+        if info is not None:
+            return info
+        query = symbol.strip().upper().replace("/", "")
+        names = list(self.by_symbol)
+        # 只给出基础币种时也和补上默认计价币种后的名称比较
+        candidates = difflib.get_close_matches(query + default_quote, names, n=5) if "/" not in symbol else []
+        candidates += [c for c in difflib.get_close_matches(query, names, n=5) if c not in candidates]
+        hint = "，您是否要找: {}".format("、".join(self.by_symbol[c].pair for c in candidates)) if candidates else ""
+        raise ValueError("交易所不存在交易对 {}{}".format(symbol, hint))
+
+    def symbols(self, quote=None, base=None, trading_only=True):
+        """返回 BASE/QUOTE 形式的交易对列表，可按计价币种或基础币种过滤"""
+        if quote is not None:
+            infos = self.by_quote.get(quote.upper(), [])
+        elif base is not None:
+            infos = self.by_base.get(base.upper(), [])
+        else:
+            infos = self.by_symbol.values()
+        if base is not None:
+            infos = [info for info in infos if info.base == base.upper()]
+        return [info.pair for info in infos if info.trading or not trading_only]
+
+
+def fetch_exchange_info(base_url=None, session=None):
+    http = session if session is not None else requests
+    base_url = base_url or kline_downloader.BASE_URL
+    resp = http.get(base_url + EXCHANGE_INFO_ENDPOINT)
+    resp.raise_for_status()
+    return ExchangeInfo.from_payload(resp.json(), source=base_url)
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_exchange_info(ttl=DEFAULT_TTL, path=DEFAULT_CACHE_PATH, base_url=None, force_refresh=False):
+    """
+    返回缓存的 ExchangeInfo：依次使用进程内缓存、磁盘缓存，都过期时才重新下载。
+    下载失败时如果有过期的缓存则继续使用，否则抛出异常。
+    """
+    base_url = base_url or kline_downloader.BASE_URL
+    key = (base_url, path)
+    with _cache_lock:
+        info = _cache.get(key)
+        if info is None and path and os.path.exists(path):
+            try:
+                info = ExchangeInfo.from_file(path)
+            except (ValueError, KeyError, TypeError):
+                info = None
+            if info is not None and info.source not in (None, base_url):
+                info = None
+        if info is not None and not force_refresh and info.age() < ttl:
+            _cache[key] = info
+            return info
+        try:
+            fresh = fetch_exchange_info(base_url)
+        except Exception as e:
+            if info is None:
+                raise
+            print(f"更新交易所信息失败，继续使用 {info.age() / 3600:.1f} 小时前的缓存: {e}")
+            _cache[key] = info
+            return info
+        if path:
+            fresh.save(path)
+        _cache[key] = fresh
+        return fresh
+
+
+def resolve_symbol(symbol, default_quote=DEFAULT_QUOTE, base_url=None):
+    """
+    校验交易对并转换为 BASE/QUOTE 形式；交易对不存在时抛出 ValueError。
+    交易所信息无法获取时退回到 normalize_symbol 的规则，不影响离线使用。
+    """
+    try:
+        index = get_exchange_info(base_url=base_url)
+    except Exception as e:
+        print(f"无法获取交易所信息，跳过交易对校验: {e}")
+        return kline_downloader.normalize_symbol(symbol)
+    info = index.resolve(symbol, default_quote)
+    if not info.trading:
+        print(f"注意: 交易对 {info.pair} 当前状态为 {info.status}，可能没有最新的K线")
+    return info.pair
@@ -0,0 +1,213 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from kline_downloader import run_download
+from grid_strategy import compute_grid_metrics
+
+DEFAULT_FEE_RATE = 0.001
+DEFAULT_INVESTMENT = 10000.0
+
+
+def build_price_path(df):
+    """
+    把K线转换为价格路径：阳线按 开→低→高→收，阴线按 开→高→低→收 的顺序经过四个价格点。
+    返回长度为 4 * len(df) 的数组。
+    """
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    up = close >= open_
+    path = np.empty((len(df), 4))
+    path[:, 0] = open_
+    path[:, 1] = np.where(up, low, high)
+    path[:, 2] = np.where(up, high, low)
+    path[:, 3] = close
+    return path.ravel()
+
+
+def make_grid_prices(min_price, max_price, grids, mode='arithmetic'):
+    """生成 grids + 1 个网格价格，mode 为 'arithmetic'（等差）或 'geometric'（等比）"""
+    if mode == 'geometric':
+        return np.geomspace(min_price, max_price, grids + 1)
+    return np.linspace(min_price, max_price, grids + 1)
+
+
+def _simulate(path, close, levels, fee_rate, investment, return_equity):
+    """
+    在价格路径上模拟网格成交。相邻两个网格价格之间为一“格”，每格要么空仓（在下沿挂买单），
+    要么持有一份（在上沿挂卖单）。任意时刻持仓的格子恰好是 [T, N) 这一段，
+    价格走到 p 后 T 被夹到 [#{L <= p} - 1, #{L < p}] 区间内，因此整条路径的状态只需一次前向填充即可求出。
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    n_cells = len(levels) - 1
+    prefix = np.concatenate([[0.0], np.cumsum(levels)])
+
+    below = np.clip(np.searchsorted(levels, path, side='left'), 0, n_cells)         # #{L < p}
+    upper = np.clip(np.searchsorted(levels, path, side='right') - 1, 0, n_cells)    # #{L <= p} - 1
+
+    # 初始价格所在格空仓，其上的格子按初始价格买入持仓
+    start_price = path[0]
+    t0 = int(below[0])
+
+    changed = np.empty(len(path), dtype=bool)
+    changed[0] = True
+    changed[1:] = (below[1:] != below[:-1]) | (upper[1:] != upper[:-1])
+    determined = changed | (below == upper)
+    moved_up = np.empty(len(path), dtype=bool)
+    moved_up[0] = False
+    moved_up[1:] = below[1:] > below[:-1]
+    value = np.where(moved_up & (below != upper), upper, below)
+    value[0] = t0
+    last = np.maximum.accumulate(np.where(determined, np.arange(len(path)), 0))
+    threshold = value[last]
+
+    # 只有阈值发生变化的路径点才有成交，后续计算只在这些点上进行
+    steps = np.flatnonzero(threshold[1:] != threshold[:-1]) + 1
+    if threshold[0] != t0:
+        steps = np.concatenate([[0], steps])
+    new_t = threshold[steps]
+    old_t = np.empty_like(new_t)
+    old_t[1:] = new_t[:-1]
+    if len(steps):
+        old_t[0] = t0 if steps[0] == 0 else threshold[steps[0] - 1]
+
+    # 买入: 格子 [T_j, T_{j-1}) 在各自下沿 L_k 成交；卖出: 格子 [T_{j-1}, T_j) 在上沿 L_{k+1} 成交
+    buying = new_t < old_t
+    buy_count = np.where(buying, old_t - new_t, 0)
+    buy_notional = np.where(buying, prefix[old_t] - prefix[new_t], 0.0)
+    sell_count = np.where(buying, 0, new_t - old_t)
+    sell_notional = np.where(buying, 0.0, prefix[new_t + 1] - prefix[old_t + 1])
+
+    # 从未卖出过的初始持仓格子 [R, N) 以初始价格为成本，R 为阈值的历史最大值
+    reached = np.maximum.accumulate(np.maximum(new_t, t0))
+    reached_prev = np.empty_like(reached)
+    reached_prev[1:] = reached[:-1]
+    reached_prev[:1] = t0
+    grid_basis_hi = np.maximum(np.minimum(new_t, reached_prev), old_t)
+    sell_grid_basis = np.where(buying, 0.0, prefix[grid_basis_hi] - prefix[old_t])
+    sell_initial_cells = reached - reached_prev
+
+    # 每格的数量：初始持仓加上下方挂买单所需资金恰好等于 investment
+    capital_per_unit = prefix[t0] + (n_cells - t0) * start_price
+    quantity = investment / capital_per_unit if capital_per_unit > 0 else 0.0
+
+    initial_cost = quantity * (n_cells - t0) * start_price * (1 + fee_rate)
+    buys_cost = quantity * buy_notional * (1 + fee_rate)
+    sells_proceeds = quantity * sell_notional * (1 - fee_rate)
+    sells_basis = quantity * (1 + fee_rate) * (sell_grid_basis + sell_initial_cells * start_price)
+
+    final_t = int(threshold[-1])
+    final_reached = int(reached[-1]) if len(reached) else t0
+    inventory_cells = n_cells - final_t
+    held_basis = quantity * (1 + fee_rate) * (
+        prefix[max(final_t, final_reached)] - prefix[final_t]
+        + (n_cells - max(final_t, final_reached)) * start_price
+    )
+    last_price = close[-1]
+    realized = sells_proceeds.sum() - sells_basis.sum()
+    unrealized = quantity * inventory_cells * last_price - held_basis
+    fees = fee_rate * quantity * ((n_cells - t0) * start_price + buy_notional.sum() + sell_notional.sum())
+
+    # 按K线汇总后计算每根K线收盘时的权益，用于最大回撤
+    cash_flow = np.bincount(steps // 4, weights=sells_proceeds - buys_cost, minlength=len(close))
+    cash = investment - initial_cost + np.cumsum(cash_flow)
+    inventory = quantity * (n_cells - threshold[3::4])
+    equity = cash + inventory * close
+    peak = np.maximum.accumulate(np.maximum(equity, investment))
+    max_drawdown = float(((peak - equity) / peak).max())
+
+    result = {
+        'grid_lower': levels[0],
+        'grid_upper': levels[-1],
+        'grids': n_cells,
+        'quantity_per_grid': quantity,
+        'buy_fills': int(buy_count.sum()),
+        'sell_fills': int(sell_count.sum()),
+        'realized_pnl': realized,
+        'unrealized_pnl': unrealized,
+        'total_pnl': realized + unrealized,
+        'return_pct': (realized + unrealized) / investment * 100,
+        'fees': fees,
+        'final_inventory': quantity * inventory_cells,
+        'max_inventory': float(inventory.max()),
+        'max_drawdown_pct': max_drawdown * 100,
+    }
+    if return_equity:
+        result['equity'] = equity
+    return result
+
+
+def backtest_grid(df, grid_prices, fee_rate=DEFAULT_FEE_RATE, investment=DEFAULT_INVESTMENT, return_equity=False):
+    """
+    在K线历史上回测一组网格价格（例如 analyze_grid_strategy 推荐的 grid_prices），
+    按最高/最低价穿越网格判断成交，计入手续费、持仓以及已实现/未实现盈亏。
+    return_equity 为 True 时结果中附带每根K线收盘时的权益序列。
+    """
+    path = build_price_path(df)
+    close = df['close'].to_numpy(dtype=np.float64)
+    result = _simulate(path, close, np.sort(np.asarray(grid_prices, dtype=np.float64)), fee_rate, investment,
+                       return_equity)
+    if return_equity:
+        result['equity'] = pd.Series(result['equity'], index=df['open_time'] if 'open_time' in df else None)
+    return result
+
+
+def backtest_grids(df, configs, fee_rate=DEFAULT_FEE_RATE, investment=DEFAULT_INVESTMENT):
+    """
+    批量回测多组网格配置，价格路径只构建一次。每个配置为包含 grid_prices，
+    或包含 min_price、max_price、grids（可选 mode、fee_rate、investment）的字典。返回每个配置一行的结果表。
+    """
+    path = build_price_path(df)
+    close = df['close'].to_numpy(dtype=np.float64)
+    rows = []
+    for config in configs:
+        if 'grid_prices' in config:
+            levels = np.sort(np.asarray(config['grid_prices'], dtype=np.float64))
+        else:
+            levels = make_grid_prices(config['min_price'], config['max_price'], config['grids'],
+                                      config.get('mode', 'arithmetic'))
+        row = {k: v for k, v in config.items() if k != 'grid_prices'}
+        row.update(_simulate(path, close, levels, config.get('fee_rate', fee_rate),
+                             config.get('investment', investment), False))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='在历史K线上回测推荐的网格')
+    parser.add_argument('--symbol', '-s', type=str, required=True, help='交易对符号，例如 "ETH" 或 "ETH/USDT"')
+    parser.add_argument('--interval', '-i', type=str, default='15m', help='K线时间间隔，例如 "15m"')
+    parser.add_argument('--start', '-st', type=str, help='开始日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--end', '-ed', type=str, help='结束日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--days', '-d', type=int, help='爬取最近多少天的数据')
+    parser.add_argument('--grid_step_percentage', '-g', type=float, default=1.0, help='推荐的网格步长百分比。默认值为1.0%')
+    parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
+    parser.add_argument('--grids', type=int, nargs='+', default=None, help='在推荐价格范围内额外回测的网格数量')
+    parser.add_argument('--mode', type=str, default='arithmetic', choices=['arithmetic', 'geometric'], help='网格间隔方式')
+    parser.add_argument('--fee_rate', type=float, default=DEFAULT_FEE_RATE, help='手续费率。默认值为0.001')
+    parser.add_argument('--investment', type=float, default=DEFAULT_INVESTMENT, help='投入资金 (USDT)。默认值为10000')
+    args = parser.parse_args()
+
+    try:
+        df = run_download(symbol=args.symbol, interval=args.interval, start=args.start, end=args.end,
+                          days=args.days, return_df=True)
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+
+    metrics = compute_grid_metrics(df, grid_step_percentage=args.grid_step_percentage, max_grids=args.max_grids)
+    print(f"推荐的网格价格范围: {metrics['min_price']:.2f} USDT - {metrics['max_price']:.2f} USDT，"
+          f"网格数量: {metrics['recommended_grids']}")
+    grid_counts = [metrics['recommended_grids']] + (args.grids or [])
+    configs = [{'min_price': metrics['min_price'], 'max_price': metrics['max_price'], 'grids': n, 'mode': args.mode}
+               for n in grid_counts]
+    result = backtest_grids(df, configs, fee_rate=args.fee_rate, investment=args.investment)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(result.to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == '__main__':
+    main()
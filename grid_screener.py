@@ -0,0 +1,156 @@
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from kline_downloader import (RateLimiter, download_full_klines, get_support_symbols, normalize_symbol,
+                              resolve_date_range)
+from exchange_info import resolve_symbol
+from grid_strategy import compute_grid_metrics
+from shared_klines import SharedKlineCache
+
+SCREEN_COLUMNS = ['symbol', 'suitable', 'relative_std', 'latest_atr', 'min_atr', 'max_atr', 'atr_in_range',
+                  'trend', 'current_price', 'min_price', 'max_price', 'recommended_grids', 'grid_interval', 'error']
+# 下载在主进程的线程池中进行，所有线程共用一个限速器，在途请求的权重由同一个限速器统计；
+# 进程池只做计算，进程数不受交易所请求权重的限制
+DEFAULT_DOWNLOAD_THREADS = 4
+
+# 工作进程内的共享数据层，由 _init_worker 创建；数据集由主进程发布，工作进程只按键挂载，不传递 DataFrame
+_shared = None
+
+
+def _init_worker(root):
+    global _shared
+    # 主进程在计算完成前一直持有租约，由主进程决定数据是否新鲜，这里不按发布时间过滤
+    _shared = SharedKlineCache(root, fresh_seconds=math.inf)
+
+
+def get_usdt_symbols():
+    return get_support_symbols(quote='USDT')
+
+
+def fetch_symbol(symbol, interval, start, end, limiter):
+    """在主进程的下载线程中下载（或从本地存储读取）单个交易对，交易对已在主进程中校验"""
+    # concurrency=1 走 fetch_chunk 的限速器路径，遇到 429/418 时按 Retry-After 退避重试
+    return download_full_klines(normalize_symbol(symbol), interval, start, end, return_df=True, concurrency=1,
+                                limiter=limiter, progress=False)
+
+
+def analyze_symbol(symbol, key, analysis_params):
+    """在工作进程中挂载主进程发布的数据集并计算单个交易对的适用性指标"""
+    row = {'symbol': symbol}
+    handle = None
+    try:
+        handle = _shared.attach(key)
+        if handle is None:
+            raise RuntimeError("共享数据集 {} 不存在".format(key))
+        metrics = compute_grid_metrics(handle.frame(), **analysis_params)
+        row.update(metrics)
+        row['atr_in_range'] = bool(metrics['min_atr'] <= metrics['latest_atr'] <= metrics['max_atr'])
+    except Exception as e:
+        row['error'] = str(e)
+    finally:
+        if handle is not None:
+            handle.release()
+    return row
+
+
+def screen_symbols(symbols, interval='15m', start=None, end=None, days=None, workers=None,
+                   download_threads=DEFAULT_DOWNLOAD_THREADS, shared=None, **analysis_params):
+    """
+    并行筛选多个交易对，返回按适用性排序的结果表：
+    适合网格策略的排在前面，同组内按相对标准差从小到大排列。
+    主进程用 download_threads 个线程共用一个限速器下载，每下载完一个交易对就发布到共享数据层（shared），
+    进程池中的工作进程按键挂载后计算，进程池默认按 CPU 核数创建工作进程。
+    """
+    start, end = resolve_date_range(start, end, days)
+    limiter = RateLimiter()
+    shared = shared or SharedKlineCache()
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=download_threads) as downloader, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                initargs=(shared.root,)) as executor:
+        downloads = {downloader.submit(fetch_symbol, symbol, interval, start, end, limiter): symbol
+                     for symbol in symbols}
+        handles = {}
+        for download in as_completed(downloads):
+            symbol = downloads[download]
+            key = (symbol, interval, start, end)
+            try:
+                handle = shared.publish(key, download.result())
+            except Exception as e:
+                rows.append({'symbol': symbol, 'error': str(e)})
+                continue
+            handles[executor.submit(analyze_symbol, symbol, key, analysis_params)] = handle
+        for future in as_completed(handles):
+            rows.append(future.result())
+            # 计算完成后释放主进程的租约，数据集之后按共享数据层的 LRU 规则淘汰
+            handles[future].release()
+
+    result = pd.DataFrame(rows).reindex(columns=SCREEN_COLUMNS)
+    result['suitable'] = result['suitable'].fillna(False).astype(bool)
+    result = result.sort_values(['suitable', 'relative_std'], ascending=[False, True], na_position='last')
+    return result.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量筛选适合网格策略的交易对')
+    parser.add_argument('--symbols', '-s', type=str, nargs='+', help='交易对列表，例如 "ETH/USDT" "BTC"')
+    parser.add_argument('--all_usdt', action='store_true', help='筛选所有 USDT 交易对')
+    parser.add_argument('--interval', '-i', type=str, default='15m', help='K线时间间隔，例如 "15m"')
+    parser.add_argument('--start', '-st', type=str, help='开始日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--end', '-ed', type=str, help='结束日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--days', '-d', type=int, help='爬取最近多少天的数据')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='计算指标的工作进程数，默认等于 CPU 核数')
+    parser.add_argument('--download_threads', type=int, default=DEFAULT_DOWNLOAD_THREADS, help='主进程中同时下载的交易对数量。默认值为{}'.format(DEFAULT_DOWNLOAD_THREADS))
+    parser.add_argument('--threshold_factor', '-t', type=float, default=1.0, help='判断网格策略适用性的阈值因子（相对标准差比例）。默认值为1.0')
+    parser.add_argument('--grid_step_percentage', '-g', type=float, default=1.0, help='推荐的网格步长百分比。默认值为1.0%')
+    parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
+    parser.add_argument('--atr_std_multiplier', '-a', type=float, default=1.0, help='ATR 阈值设定的标准差倍数。默认值为1.0')
+    parser.add_argument('--save_to', '-o', type=str, default=None, help='把筛选结果保存为 CSV 文件')
+    args = parser.parse_args()
+
+    if args.all_usdt:
+        symbols = get_usdt_symbols()
+    elif args.symbols:
+        symbols = []
+        for s in args.symbols:
+            try:
+                symbols.append(resolve_symbol(s))
+            except ValueError as ve:
+                print(f"跳过: {ve}")
+        if not symbols:
+            return
+    else:
+        parser.error("必须提供 --symbols 或 --all_usdt")
+
+    try:
+        result = screen_symbols(
+            symbols,
+            interval=args.interval,
+            start=args.start,
+            end=args.end,
+            days=args.days,
+            workers=args.workers,
+            download_threads=args.download_threads,
+            threshold_factor=args.threshold_factor,
+            grid_step_percentage=args.grid_step_percentage,
+            max_grids=args.max_grids,
+            atr_std_multiplier=args.atr_std_multiplier
+        )
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(result.to_string(float_format=lambda v: f"{v:.4f}"))
+    if args.save_to:
+        result.to_csv(args.save_to, index=False)
+        print(f"筛选结果已保存至: {args.save_to}")
+
+
+if __name__ == '__main__':
+    main()
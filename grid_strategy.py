@@ -1,176 +1,395 @@
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
-def analyze_grid_strategy(df, visualize=True, threshold_factor=1.0, grid_step_percentage=1.0,
-                         max_grids=10, atr_period=14, atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9,
-                         streamlit_mode=False):
+import profiling
+
+REQUIRED_COLUMNS = {"open_time", "high", "low", "close"}
+
+
+@dataclass
+class GridAnalysisResult:
+    """analyze_grid 的结构化结果：统计指标、ATR 阈值、MACD 趋势和推荐网格"""
+    suitable: bool
+    # 价格波动统计
+    average_change: float
+    std_dev_change: float
+    relative_std: float
+    # ATR 及自动阈值
+    latest_atr: float
+    min_atr: float
+    max_atr: float
+    # MACD 趋势
+    latest_macd: float
+    latest_macd_signal: float
+    latest_macd_hist: float
+    trend: str
+    # 推荐网格
+    current_price: float
+    min_price: float
+    max_price: float
+    recommended_grids: int
+    grid_interval: float
+    grid_prices: np.ndarray
+    params: dict = field(default_factory=dict)
+    # 仅在 keep_series=True 时保留，供图表使用
+    indicators: Optional[dict] = None
+
+    def to_dict(self):
+        """返回标量指标组成的字典（不含网格价格、参数和指标序列），便于汇总成表格"""
+        data = asdict(self)
+        for key in ('grid_prices', 'params', 'indicators'):
+            data.pop(key)
+        return data
+
+
+def recommend_grid(current_price, uptrend, grid_step_percentage=1.0, max_grids=10):
+    """根据 MACD 趋势方向推荐网格价格范围、网格数量和网格间隔"""
+    if uptrend:
+        trend = 'up'
+        max_price = current_price * 1.3
+        min_price = current_price * 0.85
+    else:
+        trend = 'down'
+        max_price = current_price * 1.15
+        min_price = current_price * 0.7
+    grid_step = current_price * grid_step_percentage / 100
+    recommended_grids = min(int((max_price - min_price) / grid_step), max_grids)
+    recommended_grids = recommended_grids if recommended_grids > 0 else 1
+    return {
+        'trend': trend,
+        'current_price': current_price,
+        'min_price': min_price,
+        'max_price': max_price,
+        'recommended_grids': recommended_grids,
+        'grid_interval': (max_price - min_price) / recommended_grids,
+    }
+
+
+def _ewm(values, span):
+    # pd.Series 包装 NumPy 数组不会复制数据，ewm(adjust=False) 与原实现完全一致
+    return pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy(dtype=values.dtype)
+
+
+def _true_range(high, low, close):
+    """TR = max(H-L, |H-PC|, |L-PC|)，第一根K线没有前收盘价，只取 H-L"""
+    tr = high - low
+    np.maximum(tr[1:], np.abs(high[1:] - close[:-1]), out=tr[1:])
+    np.maximum(tr[1:], np.abs(low[1:] - close[:-1]), out=tr[1:])
+    return tr
+
+
+def _rolling_atr(tr, atr_period):
+    """ATR 为 TR 的滚动均值，前 atr_period - 1 根为 NaN，与 rolling(window).mean() 一致"""
+    atr = np.full(len(tr), np.nan, dtype=tr.dtype)
+    if len(tr) >= atr_period:
+        atr[atr_period - 1:] = sliding_window_view(tr, atr_period).mean(axis=1)
+    return atr
+
+
+def analyze_grid(df, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10, atr_period=14,
+                 atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9, dtype=np.float64,
+                 keep_series=False):
     """
-    分析K线数据是否适合使用网格策略，并推荐网格价格范围和网格数量。
-    集成MACD指标以预测未来价格范围。
+    精简版分析：只读取 high/low/close 三列的 NumPy 视图，不修改传入的 DataFrame，
+    不生成任何文字或图表，返回 GridAnalysisResult。
+    dtype=np.float32 时以单精度计算，内存占用减半；keep_series=True 时在结果中保留 ATR 和 MACD 序列。
     """
-    output = []
+    missing = {"high", "low", "close"} - set(df.columns)
+    if missing:
+        raise ValueError(f"DataFrame缺少必要的列: {missing}")
+    if len(df) == 0:
+        raise ValueError("DataFrame为空")
+
+    high = df['high'].to_numpy(dtype=dtype, copy=False)
+    low = df['low'].to_numpy(dtype=dtype, copy=False)
+    close = df['close'].to_numpy(dtype=dtype, copy=False)
+
+    # 价格波动范围
+    price_change = high - low
+    average_change = float(price_change.mean())
+    std_dev_change = float(price_change.std(ddof=1)) if len(price_change) > 1 else float('nan')
+
+    del price_change
+    atr = _rolling_atr(_true_range(high, low, close), atr_period)
+    latest_atr = float(atr[-1])
+    valid_atr = atr[atr_period - 1:]
+    atr_mean = float(valid_atr.mean()) if len(valid_atr) else float('nan')
+    atr_std = float(valid_atr.std(ddof=1)) if len(valid_atr) > 1 else float('nan')
+    min_atr = max(0, atr_mean - atr_std_multiplier * atr_std)
+    max_atr = atr_mean + atr_std_multiplier * atr_std
+
+    # MACD
+    macd = _ewm(close, macd_fast) - _ewm(close, macd_slow)
+    macd_signal_line = _ewm(macd, macd_signal)
+    latest_macd = float(macd[-1])
+    latest_macd_signal = float(macd_signal_line[-1])
+
+    relative_std = std_dev_change / average_change if average_change != 0 else float('inf')
+    suitable = bool((relative_std <= threshold_factor) and (latest_atr >= min_atr) and (latest_atr <= max_atr))
+
+    grid = recommend_grid(float(close[-1]), latest_macd > latest_macd_signal, grid_step_percentage, max_grids)
+    grid_prices = grid['min_price'] + np.arange(grid['recommended_grids'] + 1) * grid['grid_interval']
+
+    indicators = None
+    if keep_series:
+        indicators = {'ATR': atr, 'MACD': macd, 'MACD_signal': macd_signal_line, 'MACD_hist': macd - macd_signal_line}
+
+    return GridAnalysisResult(
+        suitable=suitable,
+        average_change=average_change,
+        std_dev_change=std_dev_change,
+        relative_std=relative_std,
+        latest_atr=latest_atr,
+        min_atr=min_atr,
+        max_atr=max_atr,
+        latest_macd=latest_macd,
+        latest_macd_signal=latest_macd_signal,
+        latest_macd_hist=latest_macd - latest_macd_signal,
+        grid_prices=grid_prices,
+        params={
+            'threshold_factor': threshold_factor,
+            'grid_step_percentage': grid_step_percentage,
+            'max_grids': max_grids,
+            'atr_period': atr_period,
+            'atr_std_multiplier': atr_std_multiplier,
+            'macd_fast': macd_fast,
+            'macd_slow': macd_slow,
+            'macd_signal': macd_signal,
+        },
+        indicators=indicators,
+        **grid
+    )
+
+
+def analyze_grid_timeline(df, window=500, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10,
+                          atr_period=14, atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9):
+    """
+    滚动版分析：对每根K线，只用截至该K线的最近 window 根K线计算相对标准差和 ATR 阈值，
+    得到逐根K线的适用性、趋势方向和推荐网格范围。滚动均值/标准差一次遍历完成，复杂度 O(n)，
+    无需对每个窗口重复调用 analyze_grid。
+    ATR 和 MACD 在完整历史上计算（EMA 不会在每个窗口起点重新初始化），因此与对窗口切片调用
+    analyze_grid 相比，只在窗口第一根K线的 TR 和 EMA 的起始值上有细微差别。
+    返回与 df 同索引的 DataFrame，前 window - 1 根K线的统计量为 NaN，suitable 为 False。
+    """
+    missing = REQUIRED_COLUMNS - set(df.columns)
+    if missing:
+        raise ValueError(f"DataFrame缺少必要的列: {missing}")
+    if window < atr_period + 1:
+        raise ValueError(f"滚动窗口至少需要 {atr_period + 1} 根K线")
+
+    high = df['high'].to_numpy(dtype=np.float64, copy=False)
+    low = df['low'].to_numpy(dtype=np.float64, copy=False)
+    close = df['close'].to_numpy(dtype=np.float64, copy=False)
+
+    price_change = pd.Series(high - low, copy=False)
+    atr = pd.Series(_true_range(high, low, close), copy=False).rolling(atr_period).mean()
+
+    # 价格波动范围的滚动统计
+    change_roll = price_change.rolling(window)
+    average_change = change_roll.mean().to_numpy()
+    std_dev_change = change_roll.std(ddof=1).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_std = np.where(average_change != 0, std_dev_change / average_change, np.inf)
+
+    # 长度为 window 的切片中有 window - atr_period + 1 个有效 ATR，阈值只用这些值
+    atr_window = window - atr_period + 1
+    atr_roll = atr.rolling(atr_window)
+    atr_mean = atr_roll.mean().to_numpy()
+    atr_std = atr_roll.std(ddof=1).to_numpy()
+    min_atr = np.maximum(0, atr_mean - atr_std_multiplier * atr_std)
+    max_atr = atr_mean + atr_std_multiplier * atr_std
+    atr = atr.to_numpy()
+
+    macd = _ewm(close, macd_fast) - _ewm(close, macd_slow)
+    macd_signal_line = _ewm(macd, macd_signal)
+
+    # NaN 参与比较的结果为 False，窗口未满的K线自然判为不适合
+    suitable = (relative_std <= threshold_factor) & (atr >= min_atr) & (atr <= max_atr)
+
+    # 与 recommend_grid 相同的规则，按趋势方向逐根计算
+    uptrend = macd > macd_signal_line
+    max_price = close * np.where(uptrend, 1.3, 1.15)
+    min_price = close * np.where(uptrend, 0.85, 0.7)
+    grid_step = close * grid_step_percentage / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grids = np.floor((max_price - min_price) / grid_step)
+    grids = np.nan_to_num(grids, nan=0, posinf=max_grids, neginf=0)
+    recommended_grids = np.minimum(grids, max_grids).astype(np.int64)
+    recommended_grids[recommended_grids <= 0] = 1
+
+    return pd.DataFrame({
+        'open_time': df['open_time'].to_numpy(),
+        'close': close,
+        'suitable': suitable,
+        'relative_std': relative_std,
+        'atr': atr,
+        'min_atr': min_atr,
+        'max_atr': max_atr,
+        'macd': macd,
+        'macd_signal': macd_signal_line,
+        'trend': np.where(uptrend, 'up', 'down'),
+        'min_price': min_price,
+        'max_price': max_price,
+        'recommended_grids': recommended_grids,
+        'grid_interval': (max_price - min_price) / recommended_grids,
+    }, index=df.index)
+
+
+def suitable_regimes(timeline):
+    """
+    把逐根K线的适用性合并为连续的适用区间，返回包含 start、end（区间首尾K线的开盘时间）和 bars 列的 DataFrame，
+    供图表阴影和汇总使用。
+    """
+    flags = timeline['suitable'].to_numpy(dtype=bool)
+    edges = np.diff(np.concatenate([[False], flags, [False]]).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    open_time = timeline['open_time'].to_numpy()
+    return pd.DataFrame({'start': open_time[starts], 'end': open_time[ends], 'bars': ends - starts + 1})
 
-    # 检查必要的列是否存在
-    required_columns = {"open_time", "high", "low", "close"}
-    if not required_columns.issubset(df.columns):
-        message = f"DataFrame缺少必要的列: {required_columns}"
-        if streamlit_mode:
-            output.append(('error', message))
-        else:
-            print(message)
-        return False
 
-    # 转换时间格式
-    df['open_time'] = pd.to_datetime(df['open_time'])
+def compute_grid_metrics(df, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10, atr_period=14,
+                         atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9):
+    """
+    计算与 analyze_grid_strategy 相同的适用性指标和推荐网格，但不打印、不生成图表，也不修改传入的 DataFrame。
+    返回一个字典，便于批量筛选时汇总成表格。
+    """
+    return analyze_grid(df, threshold_factor=threshold_factor, grid_step_percentage=grid_step_percentage,
+                        max_grids=max_grids, atr_period=atr_period, atr_std_multiplier=atr_std_multiplier,
+                        macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal).to_dict()
+
+
+def format_analysis_messages(result):
+    """把分析结果转换为 (级别, 文本) 列表，供 CLI 和 Streamlit 共用"""
+    params = result.params
+    atr_std_multiplier = params['atr_std_multiplier']
+    messages = [
+        ('info', f'平均价格波动范围: {result.average_change:.2f} USDT\n价格波动标准差: {result.std_dev_change:.2f} USDT'),
+        ('info', f'最新ATR（{params["atr_period"]}期）: {result.latest_atr:.2f} USDT'),
+        ('info', f'最新MACD: {result.latest_macd:.2f}\n最新信号线: {result.latest_macd_signal:.2f}\n'
+                 f'最新柱状图: {result.latest_macd_hist:.2f}'),
+        ('info', f'自动设定最低ATR阈值 (mean - {atr_std_multiplier}*std): {result.min_atr:.2f} USDT\n'
+                 f'自动设定最高ATR阈值 (mean + {atr_std_multiplier}*std): {result.max_atr:.2f} USDT'),
+        ('info', f'相对标准差: {result.relative_std:.2f}\n最新ATR: {result.latest_atr:.2f} USDT\n'
+                 f'阈值因子 (threshold_factor): {params["threshold_factor"]}\n'
+                 f'最低ATR阈值 (min_atr): {result.min_atr:.2f} USDT\n最高ATR阈值 (max_atr): {result.max_atr:.2f} USDT'),
+    ]
+    if not result.suitable:
+        messages.append(('warning', "数据不适合使用网格策略。"))
+        return messages
+
+    messages.append(('success', "数据适合使用网格策略。"))
+    if result.trend == 'up':
+        # MACD在上升趋势，设置最大价格增加30%，最小价格减少15%
+        messages.append(('info', "MACD显示上升趋势，适合做多。"))
+    else:
+        # MACD在下降趋势，设置最大价格增加15%，最小价格减少30%
+        messages.append(('info', "MACD显示下降趋势，适合做空。"))
+    messages.append(('info', f"推荐的网格价格范围: {result.min_price:.2f} USDT - {result.max_price:.2f} USDT"))
+    messages.append(('info', f"推荐的网格数量: {result.recommended_grids}"))
+    messages.append(('info', f"推荐的网格间隔: {result.grid_interval:.2f} USDT"))
+    return messages
+
 
-    if streamlit_mode and visualize:
-        plot_close_price = {
+def render_cli(result):
+    """在命令行中打印分析结果"""
+    for _, message in format_analysis_messages(result):
+        print(message)
+    if result.suitable:
+        print("推荐的网格价格级别:")
+        for idx, price in enumerate(result.grid_prices):
+            print(f"格 {idx}: {price:.2f} USDT")
+
+
+def format_timeline_message(timeline, regimes):
+    """滚动适用性的汇总文字"""
+    valid = timeline['relative_std'].notna()
+    if not valid.any():
+        return ('warning', "K线数量不足一个滚动窗口，无法计算适用性时间线。")
+    share = timeline.loc[valid, 'suitable'].mean()
+    return ('info', f"滚动窗口内适合网格策略的K线占比: {share:.1%}\n适用区间数量: {len(regimes)}")
+
+
+def build_streamlit_output(result, df, visualize=True, timeline=None):
+    """
+    把分析结果转换为 Streamlit 应用使用的输出列表（信息、图表和表格）。
+    传入 analyze_grid_timeline 的结果时，在收盘价图上标出适用区间。
+    """
+    messages = format_analysis_messages(result)
+    output = []
+    open_time = None
+    regimes = suitable_regimes(timeline) if timeline is not None else None
+    if visualize:
+        # 只为图表转换时间列，不修改传入的 DataFrame
+        open_time = pd.to_datetime(df['open_time'])
+        price_plot = {
             'title': '收盘价走势图',
-            'x': df['open_time'],
+            'x': open_time,
             'y': df['close'],
             'xlabel': '时间',
             'ylabel': '价格 (USDT)',
             'labels': ['收盘价']
         }
-        output.append(('plot', plot_close_price))
-
-    # 计算价格波动范围
-    df['price_change'] = df['high'] - df['low']
-    average_change = df['price_change'].mean()
-    std_dev_change = df['price_change'].std()
-    message = f'平均价格波动范围: {average_change:.2f} USDT\n价格波动标准差: {std_dev_change:.2f} USDT'
-    if streamlit_mode:
-        output.append(('info', message))
-    else:
-        print(message)
-
-    # 计算ATR（平均真实波动幅度）
-    df['H-L'] = df['high'] - df['low']
-    df['H-PC'] = abs(df['high'] - df['close'].shift(1))
-    df['L-PC'] = abs(df['low'] - df['close'].shift(1))
-    df['TR'] = df[['H-L', 'H-PC', 'L-PC']].max(axis=1)
-    df['ATR'] = df['TR'].rolling(window=atr_period).mean()
-    latest_atr = df['ATR'].iloc[-1]
-    message = f'最新ATR（{atr_period}期）: {latest_atr:.2f} USDT'
-    if streamlit_mode:
-        output.append(('info', message))
-    else:
-        print(message)
-
-    # 计算MACD指标
-    df['EMA_fast'] = df['close'].ewm(span=macd_fast, adjust=False).mean()
-    df['EMA_slow'] = df['close'].ewm(span=macd_slow, adjust=False).mean()
-    df['MACD'] = df['EMA_fast'] - df['EMA_slow']
-    df['MACD_signal'] = df['MACD'].ewm(span=macd_signal, adjust=False).mean()
-    df['MACD_hist'] = df['MACD'] - df['MACD_signal']
-    latest_macd = df['MACD'].iloc[-1]
-    latest_macd_signal = df['MACD_signal'].iloc[-1]
-    latest_macd_hist = df['MACD_hist'].iloc[-1]
-
-    message = f'最新MACD: {latest_macd:.2f}\n最新信号线: {latest_macd_signal:.2f}\n最新柱状图: {latest_macd_hist:.2f}'
-    if streamlit_mode:
-        output.append(('info', message))
-    else:
-        print(message)
-
-    if streamlit_mode and visualize:
-        plot_macd = {
+        if regimes is not None:
+            price_plot['title'] = '收盘价走势图（阴影为滚动窗口内适合网格策略的区间）'
+            price_plot['regimes'] = regimes.assign(start=pd.to_datetime(regimes['start']),
+                                                   end=pd.to_datetime(regimes['end']))
+        output.append(('plot', price_plot))
+    if regimes is not None:
+        output.append(format_timeline_message(timeline, regimes))
+    output.extend(messages[:3])
+    if visualize and result.indicators is not None:
+        output.append(('plot', {
             'title': 'MACD指标',
-            'x': df['open_time'],
-            'y': df[['MACD', 'MACD_signal', 'MACD_hist']],
+            'x': open_time,
+            'y': pd.DataFrame({name: result.indicators[name] for name in ('MACD', 'MACD_signal', 'MACD_hist')},
+                              index=df.index),
             'xlabel': '时间',
             'ylabel': '值',
             'labels': ['MACD', '信号线', '柱状图']
-        }
-        output.append(('plot', plot_macd))
+        }))
+    output.extend(messages[3:])
+    if result.suitable:
+        grid_levels = {f"格 {idx}": f"{price:.2f} USDT" for idx, price in enumerate(result.grid_prices)}
+        output.append(('table', pd.DataFrame.from_dict(grid_levels, orient='index', columns=['价格'])))
+    return output
 
-    # 自动计算 min_atr 和 max_atr 基于均值和标准差
-    atr_mean = df['ATR'].mean()
-    atr_std = df['ATR'].std()
-    min_atr = max(0, atr_mean - atr_std_multiplier * atr_std)  # 确保 min_atr 不小于零
-    max_atr = atr_mean + atr_std_multiplier * atr_std
-    message = f'自动设定最低ATR阈值 (mean - {atr_std_multiplier}*std): {min_atr:.2f} USDT\n' \
-              f'自动设定最高ATR阈值 (mean + {atr_std_multiplier}*std): {max_atr:.2f} USDT'
-    if streamlit_mode:
-        output.append(('info', message))
-    else:
-        print(message)
 
-    # 使用相对标准差和 ATR 作为阈值
-    relative_std = std_dev_change / average_change if average_change != 0 else float('inf')
-    message = f'相对标准差: {relative_std:.2f}\n最新ATR: {latest_atr:.2f} USDT\n阈值因子 (threshold_factor): {threshold_factor}\n' \
-              f'最低ATR阈值 (min_atr): {min_atr:.2f} USDT\n最高ATR阈值 (max_atr): {max_atr:.2f} USDT'
-    if streamlit_mode:
-        output.append(('info', message))
-    else:
-        print(message)
-
-    # 判断是否适合网格策略
-    suitable = (relative_std <= threshold_factor) and (latest_atr >= min_atr) and (latest_atr <= max_atr)
-    if suitable:
-        if streamlit_mode:
-            output.append(('success', "数据适合使用网格策略。"))
-        else:
-            print("数据适合使用网格策略。")
-
-        # 推荐网格价格范围基于MACD趋势
-        current_price = df['close'].iloc[-1]
-        if latest_macd > latest_macd_signal:
-            # MACD在上升趋势，设置最大价格增加50%，最小价格减少20%
-            max_price = current_price * 1.3
-            min_price = current_price * 0.85
-            message = "MACD显示上升趋势，适合做多。"
-        else:
-            # MACD在下降趋势，设置最大价格减少20%，最小价格增加50%
-            max_price = current_price * 1.15
-            min_price = current_price * 0.7
-            message = "MACD显示下降趋势，适合做空。"
-
-        if streamlit_mode:
-            output.append(('info', message))
-        else:
-            print(message)
-
-        message = f"推荐的网格价格范围: {min_price:.2f} USDT - {max_price:.2f} USDT"
-        if streamlit_mode:
-            output.append(('info', message))
-        else:
-            print(message)
-
-        # 推荐网格数量
-        grid_step = current_price * grid_step_percentage / 100
-        recommended_grids = min(int((max_price - min_price) / grid_step), max_grids)
-        recommended_grids = recommended_grids if recommended_grids > 0 else 1
-        message = f"推荐的网格数量: {recommended_grids}"
+def analyze_grid_strategy(df, visualize=True, threshold_factor=1.0, grid_step_percentage=1.0,
+                         max_grids=10, atr_period=14, atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9,
+                         streamlit_mode=False, timeline_window=None):
+    """
+    分析K线数据是否适合使用网格策略，并推荐网格价格范围和网格数量。
+    集成MACD指标以预测未来价格范围。
+    计算由 analyze_grid 完成（不修改传入的 DataFrame），这里只负责按 CLI 或 Streamlit 的方式输出。
+    Streamlit 模式下指定 timeline_window 时，额外计算滚动适用性时间线并在价格图上标出适用区间。
+    """
+    # 检查必要的列是否存在
+    if not REQUIRED_COLUMNS.issubset(df.columns):
+        message = f"DataFrame缺少必要的列: {REQUIRED_COLUMNS}"
         if streamlit_mode:
-            output.append(('info', message))
-        else:
-            print(message)
+            return False, [('error', message)]
+        print(message)
+        return False
 
-        # 计算网格间隔
-        grid_interval = (max_price - min_price) / recommended_grids
-        message = f"推荐的网格间隔: {grid_interval:.2f} USDT"
-        if streamlit_mode:
-            output.append(('info', message))
-        else:
-            print(message)
+    with profiling.stage("analysis", rows=len(df)):
+        result = analyze_grid(df, threshold_factor=threshold_factor, grid_step_percentage=grid_step_percentage,
+                              max_grids=max_grids, atr_period=atr_period, atr_std_multiplier=atr_std_multiplier,
+                              macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal,
+                              keep_series=streamlit_mode and visualize)
+        timeline = None
+        if streamlit_mode and timeline_window:
+            timeline = analyze_grid_timeline(df, window=timeline_window, threshold_factor=threshold_factor,
+                                             grid_step_percentage=grid_step_percentage, max_grids=max_grids,
+                                             atr_period=atr_period, atr_std_multiplier=atr_std_multiplier,
+                                             macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal)
 
-        # 输出网格价格级别
-        grid_prices = [min_price + i * grid_interval for i in range(recommended_grids + 1)]
-        message = "推荐的网格价格级别:"
-        if streamlit_mode:
-            grid_levels = {f"格 {idx}": f"{price:.2f} USDT" for idx, price in enumerate(grid_prices)}
-            output.append(('table', pd.DataFrame.from_dict(grid_levels, orient='index', columns=['价格'])))
-        else:
-            print(message)
-            for idx, price in enumerate(grid_prices):
-                print(f"格 {idx}: {price:.2f} USDT")
-    else:
+    with profiling.stage("output"):
         if streamlit_mode:
-            output.append(('warning', "数据不适合使用网格策略。"))
-        else:
-            print("数据不适合使用网格策略。")
-
-    if streamlit_mode:
-        return suitable, output
-    else:
-        return suitable
\ No newline at end of file
+            return result.suitable, build_streamlit_output(result, df, visualize=visualize, timeline=timeline)
+        render_cli(result)
+        return result.suitable
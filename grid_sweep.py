@@ -0,0 +1,152 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from grid_strategy import _ewm, _rolling_atr, _true_range
+from kline_downloader import run_download
+
+SWEEP_PARAMS = ['threshold_factor', 'atr_std_multiplier', 'grid_step_percentage', 'atr_period',
+                'macd_fast', 'macd_slow', 'macd_signal']
+
+
+def sweep_grid_strategy(df, threshold_factor=1.0, atr_std_multiplier=2.0, grid_step_percentage=1.0, atr_period=14,
+                        macd_fast=12, macd_slow=26, macd_signal=9, max_grids=10):
+    """
+    对 analyze_grid_strategy 的参数做网格扫描，每个参数既可以是单个值也可以是列表。
+
+    与参数无关的中间量（价格波动统计、TR）只计算一次，ATR 按每个不同的 atr_period 计算一次，
+    EMA 按每个不同的 span 计算一次，之后所有参数组合在 NumPy 中批量求值。
+    返回每个参数组合一行的结果表。
+    """
+    grids = {
+        'threshold_factor': np.atleast_1d(np.asarray(threshold_factor, dtype=float)),
+        'atr_std_multiplier': np.atleast_1d(np.asarray(atr_std_multiplier, dtype=float)),
+        'grid_step_percentage': np.atleast_1d(np.asarray(grid_step_percentage, dtype=float)),
+        'atr_period': np.atleast_1d(np.asarray(atr_period, dtype=int)),
+        'macd_fast': np.atleast_1d(np.asarray(macd_fast, dtype=int)),
+        'macd_slow': np.atleast_1d(np.asarray(macd_slow, dtype=int)),
+        'macd_signal': np.atleast_1d(np.asarray(macd_signal, dtype=int)),
+    }
+
+    high = df['high'].to_numpy(dtype=np.float64, copy=False)
+    low = df['low'].to_numpy(dtype=np.float64, copy=False)
+    close = df['close'].to_numpy(dtype=np.float64, copy=False)
+
+    # 与参数无关：价格波动范围和相对标准差
+    price_change = high - low
+    average_change = float(price_change.mean())
+    std_dev_change = float(price_change.std(ddof=1)) if len(price_change) > 1 else float('nan')
+    relative_std = std_dev_change / average_change if average_change != 0 else float('inf')
+
+    # TR 只计算一次，每个 atr_period 只需要最新值、均值和标准差；TR 和 ATR 与 analyze_grid 共用同一实现
+    tr = _true_range(high, low, close)
+    atr_stats = np.full((len(grids['atr_period']), 3), np.nan)
+    for i, period in enumerate(grids['atr_period']):
+        atr = _rolling_atr(tr, int(period))
+        valid_atr = atr[int(period) - 1:]
+        atr_stats[i, 0] = atr[-1]
+        if len(valid_atr):
+            atr_stats[i, 1] = valid_atr.mean()
+        if len(valid_atr) > 1:
+            atr_stats[i, 2] = valid_atr.std(ddof=1)
+
+    # EMA(adjust=False) 是线性滤波器，signal(EMA_fast - EMA_slow) = signal(EMA_fast) - signal(EMA_slow)，
+    # 因此只需对每个不同的 span 计算一次 EMA，再对每个 (span, signal) 计算一次信号线
+    spans = np.unique(np.concatenate([grids['macd_fast'], grids['macd_slow']]))
+    span_index = {int(span): i for i, span in enumerate(spans)}
+    ema_last = np.empty(len(spans))
+    signal_last = np.empty((len(spans), len(grids['macd_signal'])))
+    for i, span in enumerate(spans):
+        ema = _ewm(close, int(span))
+        ema_last[i] = ema[-1]
+        for j, signal in enumerate(grids['macd_signal']):
+            signal_last[i, j] = _ewm(ema, int(signal))[-1]
+
+    # 所有参数组合的下标，批量求值
+    index = np.meshgrid(*[np.arange(len(grids[name])) for name in SWEEP_PARAMS], indexing='ij')
+    index = {name: idx.ravel() for name, idx in zip(SWEEP_PARAMS, index)}
+    values = {name: grids[name][index[name]] for name in SWEEP_PARAMS}
+
+    latest_atr = atr_stats[index['atr_period'], 0]
+    atr_mean = atr_stats[index['atr_period'], 1]
+    atr_std = atr_stats[index['atr_period'], 2]
+    min_atr = np.maximum(0, atr_mean - values['atr_std_multiplier'] * atr_std)
+    max_atr = atr_mean + values['atr_std_multiplier'] * atr_std
+    suitable = (relative_std <= values['threshold_factor']) & (latest_atr >= min_atr) & (latest_atr <= max_atr)
+
+    fast_idx = np.array([span_index[int(s)] for s in grids['macd_fast']])[index['macd_fast']]
+    slow_idx = np.array([span_index[int(s)] for s in grids['macd_slow']])[index['macd_slow']]
+    latest_macd = ema_last[fast_idx] - ema_last[slow_idx]
+    latest_macd_signal = signal_last[fast_idx, index['macd_signal']] - signal_last[slow_idx, index['macd_signal']]
+    uptrend = latest_macd > latest_macd_signal
+
+    current_price = float(close[-1])
+    max_price = np.where(uptrend, current_price * 1.3, current_price * 1.15)
+    min_price = np.where(uptrend, current_price * 0.85, current_price * 0.7)
+    grid_step = current_price * values['grid_step_percentage'] / 100
+    recommended_grids = np.minimum(((max_price - min_price) / grid_step).astype(int), max_grids)
+    recommended_grids = np.where(recommended_grids > 0, recommended_grids, 1)
+
+    result = pd.DataFrame(values)
+    result['suitable'] = suitable
+    result['relative_std'] = relative_std
+    result['latest_atr'] = latest_atr
+    result['min_atr'] = min_atr
+    result['max_atr'] = max_atr
+    result['latest_macd'] = latest_macd
+    result['latest_macd_signal'] = latest_macd_signal
+    result['trend'] = np.where(uptrend, 'up', 'down')
+    result['min_price'] = min_price
+    result['max_price'] = max_price
+    result['recommended_grids'] = recommended_grids
+    result['grid_interval'] = (max_price - min_price) / recommended_grids
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对网格策略分析参数做批量扫描')
+    parser.add_argument('--symbol', '-s', type=str, required=True, help='交易对符号，例如 "ETH" 或 "ETH/USDT"')
+    parser.add_argument('--interval', '-i', type=str, default='15m', help='K线时间间隔，例如 "15m"')
+    parser.add_argument('--start', '-st', type=str, help='开始日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--end', '-ed', type=str, help='结束日期，格式 "YYYY-MM-DD"')
+    parser.add_argument('--days', '-d', type=int, help='爬取最近多少天的数据')
+    parser.add_argument('--threshold_factor', '-t', type=float, nargs='+', default=[1.0], help='阈值因子的候选值')
+    parser.add_argument('--atr_std_multiplier', '-a', type=float, nargs='+', default=[1.0], help='ATR 标准差倍数的候选值')
+    parser.add_argument('--grid_step_percentage', '-g', type=float, nargs='+', default=[1.0], help='网格步长百分比的候选值')
+    parser.add_argument('--atr_period', type=int, nargs='+', default=[14], help='ATR 周期的候选值')
+    parser.add_argument('--macd_fast', type=int, nargs='+', default=[12], help='MACD 快线周期的候选值')
+    parser.add_argument('--macd_slow', type=int, nargs='+', default=[26], help='MACD 慢线周期的候选值')
+    parser.add_argument('--macd_signal', type=int, nargs='+', default=[9], help='MACD 信号线周期的候选值')
+    parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
+    parser.add_argument('--save_to', '-o', type=str, default=None, help='把扫描结果保存为 CSV 文件')
+    args = parser.parse_args()
+
+    try:
+        df = run_download(symbol=args.symbol, interval=args.interval, start=args.start, end=args.end,
+                          days=args.days, return_df=True)
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+
+    result = sweep_grid_strategy(
+        df,
+        threshold_factor=args.threshold_factor,
+        atr_std_multiplier=args.atr_std_multiplier,
+        grid_step_percentage=args.grid_step_percentage,
+        atr_period=args.atr_period,
+        macd_fast=args.macd_fast,
+        macd_slow=args.macd_slow,
+        macd_signal=args.macd_signal,
+        max_grids=args.max_grids
+    )
+    print(f"共 {len(result)} 个参数组合，其中 {int(result['suitable'].sum())} 个适合使用网格策略。")
+    with pd.option_context('display.max_rows', 50, 'display.width', 200):
+        print(result)
+    if args.save_to:
+        result.to_csv(args.save_to, index=False)
+        print(f"扫描结果已保存至: {args.save_to}")
+
+
+if __name__ == '__main__':
+    main()
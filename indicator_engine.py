@@ -0,0 +1,305 @@
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from grid_strategy import recommend_grid
+
+
+def to_epoch_ms(open_time):
+    """把 open_time 列（毫秒时间戳、datetime 或日期字符串）转换为 int64 毫秒时间戳数组"""
+    if pd.api.types.is_integer_dtype(open_time):
+        return np.asarray(open_time, dtype=np.int64)
+    return pd.to_datetime(open_time).to_numpy().astype("datetime64[ms]").astype(np.int64)
+
+
+class RunningStats:
+    """Welford 在线均值/样本标准差（ddof=1，与 pandas 的 mean/std 一致）"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls()
+        mean = float(values.mean())
+        return cls(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """合并另一段数据的统计量（Chan 等人的并行算法），用于按块计算"""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['count'], data['mean'], data['m2'])
+
+
+class IndicatorEngine:
+    """
+    增量指标引擎：每追加一根已收盘的K线只做常数时间的更新，
+    结果与 analyze_grid_strategy 中 pandas 的 rolling / ewm(adjust=False) 公式一致。
+
+    状态可以通过 to_dict / save 序列化，重启后用 from_dict / load 恢复，无需重新计算整个历史。
+    """
+
+    def __init__(self, atr_period=14, macd_fast=12, macd_slow=26, macd_signal=9):
+        self.atr_period = atr_period
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+        self.bars = 0
+        self.last_open_time = None
+        self.last_close = None
+        self.tr_window = deque(maxlen=atr_period)
+        self.latest_atr = float('nan')
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal_value = None
+        self.price_change_stats = RunningStats()
+        self.atr_stats = RunningStats()
+
+    @staticmethod
+    def _alpha(span):
+        return 2.0 / (span + 1.0)
+
+    def update(self, open_time, high, low, close):
+        """
+        追加一根已收盘的K线。open_time 为毫秒时间戳，不晚于已处理K线的数据会被忽略。
+        返回是否更新了状态。
+        """
+        if self.last_open_time is not None and open_time <= self.last_open_time:
+            return False
+
+        price_change = high - low
+        self.price_change_stats.update(price_change)
+
+        # TR: 第一根K线没有前收盘价，与 pandas max(axis=1) 跳过 NaN 的行为一致
+        if self.last_close is None:
+            tr = price_change
+        else:
+            tr = max(price_change, abs(high - self.last_close), abs(low - self.last_close))
+        self.tr_window.append(tr)
+        if len(self.tr_window) == self.atr_period:
+            self.latest_atr = math.fsum(self.tr_window) / self.atr_period
+            self.atr_stats.update(self.latest_atr)
+
+        if self.ema_fast is None:
+            self.ema_fast = self.ema_slow = close
+            self.macd_signal_value = 0.0
+        else:
+            a_fast = self._alpha(self.macd_fast)
+            a_slow = self._alpha(self.macd_slow)
+            a_signal = self._alpha(self.macd_signal)
+            self.ema_fast = (1 - a_fast) * self.ema_fast + a_fast * close
+            self.ema_slow = (1 - a_slow) * self.ema_slow + a_slow * close
+            self.macd_signal_value = (1 - a_signal) * self.macd_signal_value + a_signal * self.macd
+
+        self.last_close = close
+        self.last_open_time = open_time
+        self.bars += 1
+        return True
+
+    @staticmethod
+    def _ewm(values, span, initial=None):
+        # 把上一块最后的 EMA 值放在最前面，ewm(adjust=False) 的递推就能从该状态无缝继续
+        if initial is None:
+            return pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()
+        values = np.concatenate([[initial], values])
+        return pd.Series(values, copy=False).ewm(span=span, adjust=False).mean().to_numpy()[1:]
+
+    def update_chunk(self, open_time, high, low, close):
+        """
+        向量化地追加一段按时间排序的已收盘K线（NumPy 数组），不晚于已处理K线的数据会被忽略。
+        ATR 窗口、EMA、价格波动和 ATR 的统计量跨块延续，计算方式与 grid_strategy.analyze_grid 相同，
+        因此按块处理整段历史与一次性在内存中分析的结果一致。返回追加的K线数量。
+        """
+        open_time = np.asarray(open_time, dtype=np.int64)
+        high = np.asarray(high, dtype=np.float64)
+        low = np.asarray(low, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        if self.last_open_time is not None:
+            keep = open_time > self.last_open_time
+            if not keep.all():
+                open_time, high, low, close = open_time[keep], high[keep], low[keep], close[keep]
+        if len(open_time) == 0:
+            return 0
+
+        price_change = high - low
+        self.price_change_stats.merge(RunningStats.from_values(price_change))
+
+        tr = price_change.copy()
+        prev_close = np.empty_like(close)
+        prev_close[1:] = close[:-1]
+        first = 0
+        if self.last_close is None:
+            first = 1  # 整段历史的第一根K线没有前收盘价
+        else:
+            prev_close[0] = self.last_close
+        np.maximum(tr[first:], np.abs(high[first:] - prev_close[first:]), out=tr[first:])
+        np.maximum(tr[first:], np.abs(low[first:] - prev_close[first:]), out=tr[first:])
+
+        # 把上一块末尾的 TR 接在前面，只保留以本块K线结尾的窗口
+        carried = len(self.tr_window)
+        window = np.concatenate([np.fromiter(self.tr_window, dtype=np.float64, count=carried), tr])
+        if len(window) >= self.atr_period:
+            atr = sliding_window_view(window, self.atr_period).mean(axis=1)
+            if carried == self.atr_period:
+                atr = atr[1:]
+            if len(atr):
+                self.atr_stats.merge(RunningStats.from_values(atr))
+                self.latest_atr = float(atr[-1])
+        self.tr_window.extend(tr[-self.atr_period:].tolist())
+
+        ema_fast = self._ewm(close, self.macd_fast, self.ema_fast)
+        ema_slow = self._ewm(close, self.macd_slow, self.ema_slow)
+        macd = ema_fast - ema_slow
+        signal = self._ewm(macd, self.macd_signal, self.macd_signal_value if self.ema_fast is not None else None)
+        self.ema_fast = float(ema_fast[-1])
+        self.ema_slow = float(ema_slow[-1])
+        self.macd_signal_value = float(signal[-1])
+
+        self.last_close = float(close[-1])
+        self.last_open_time = int(open_time[-1])
+        self.bars += len(open_time)
+        return len(open_time)
+
+    @property
+    def macd(self):
+        return self.ema_fast - self.ema_slow
+
+    @classmethod
+    def from_frame(cls, df, atr_period=14, macd_fast=12, macd_slow=26, macd_signal=9):
+        """用历史K线一次性向量化地初始化状态，之后再逐根调用 update"""
+        engine = cls(atr_period=atr_period, macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal)
+        if len(df) == 0:
+            return engine
+        high = df['high'].astype(float)
+        low = df['low'].astype(float)
+        close = df['close'].astype(float)
+
+        price_change = high - low
+        prev_close = close.shift(1)
+        tr = pd.concat([price_change, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+        atr = tr.rolling(window=atr_period).mean()
+        ema_fast = close.ewm(span=macd_fast, adjust=False).mean()
+        ema_slow = close.ewm(span=macd_slow, adjust=False).mean()
+        macd_signal_line = (ema_fast - ema_slow).ewm(span=macd_signal, adjust=False).mean()
+
+        engine.bars = len(df)
+        engine.last_open_time = int(to_epoch_ms(df['open_time'])[-1])
+        engine.last_close = float(close.iloc[-1])
+        engine.tr_window.extend(tr.iloc[-atr_period:].tolist())
+        engine.latest_atr = float(atr.iloc[-1])
+        engine.ema_fast = float(ema_fast.iloc[-1])
+        engine.ema_slow = float(ema_slow.iloc[-1])
+        engine.macd_signal_value = float(macd_signal_line.iloc[-1])
+        engine.price_change_stats = RunningStats.from_values(price_change.to_numpy())
+        engine.atr_stats = RunningStats.from_values(atr.to_numpy())
+        return engine
+
+    def metrics(self, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10, atr_std_multiplier=2.0):
+        """按当前状态给出与 compute_grid_metrics 相同结构的适用性结论"""
+        average_change = self.price_change_stats.mean
+        std_dev_change = self.price_change_stats.std
+        relative_std = std_dev_change / average_change if average_change != 0 else float('inf')
+        atr_mean = self.atr_stats.mean if self.atr_stats.count else float('nan')
+        atr_std = self.atr_stats.std
+        min_atr = max(0, atr_mean - atr_std_multiplier * atr_std)
+        max_atr = atr_mean + atr_std_multiplier * atr_std
+        latest_atr = self.latest_atr
+        suitable = bool((relative_std <= threshold_factor) and (latest_atr >= min_atr) and (latest_atr <= max_atr))
+
+        metrics = {
+            'open_time': self.last_open_time,
+            'suitable': suitable,
+            'average_change': average_change,
+            'std_dev_change': std_dev_change,
+            'relative_std': relative_std,
+            'latest_atr': latest_atr,
+            'min_atr': min_atr,
+            'max_atr': max_atr,
+            'latest_macd': self.macd,
+            'latest_macd_signal': self.macd_signal_value,
+            'latest_macd_hist': self.macd - self.macd_signal_value,
+        }
+        metrics.update(recommend_grid(self.last_close, self.macd > self.macd_signal_value,
+                                      grid_step_percentage, max_grids))
+        return metrics
+
+    def to_dict(self):
+        return {
+            'atr_period': self.atr_period,
+            'macd_fast': self.macd_fast,
+            'macd_slow': self.macd_slow,
+            'macd_signal': self.macd_signal,
+            'bars': self.bars,
+            'last_open_time': self.last_open_time,
+            'last_close': self.last_close,
+            'tr_window': list(self.tr_window),
+            'latest_atr': None if math.isnan(self.latest_atr) else self.latest_atr,
+            'ema_fast': self.ema_fast,
+            'ema_slow': self.ema_slow,
+            'macd_signal_value': self.macd_signal_value,
+            'price_change_stats': self.price_change_stats.to_dict(),
+            'atr_stats': self.atr_stats.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        engine = cls(atr_period=data['atr_period'], macd_fast=data['macd_fast'],
+                     macd_slow=data['macd_slow'], macd_signal=data['macd_signal'])
+        engine.bars = data['bars']
+        engine.last_open_time = data['last_open_time']
+        engine.last_close = data['last_close']
+        engine.tr_window.extend(data['tr_window'])
+        engine.latest_atr = float('nan') if data['latest_atr'] is None else data['latest_atr']
+        engine.ema_fast = data['ema_fast']
+        engine.ema_slow = data['ema_slow']
+        engine.macd_signal_value = data['macd_signal_value']
+        engine.price_change_stats = RunningStats.from_dict(data['price_change_stats'])
+        engine.atr_stats = RunningStats.from_dict(data['atr_stats'])
+        return engine
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import requests
+
+import kline_downloader
+import profiling
+from kline_resample import DAY_MS, interval_ms
+from kline_store import KlineStore, subtract_ranges
+
+DEFAULT_ARCHIVE_URL = os.getenv("BINANCE_ARCHIVE_URL") or "https://data.binance.vision"
+# 解压时每次读取的字节数，按行切开后分块解析，避免一次性持有整个 CSV
+DECOMPRESS_BLOCK = 8 * 1024 * 1024
+# 下载归档和计算校验和时每次处理的字节数，归档先流式写入临时文件，不在内存中保留整个 zip
+DOWNLOAD_BLOCK = 1024 * 1024
+# 2025 年起现货归档文件中的时间戳改为微秒，大于该值的时间戳按微秒处理
+MICROSECOND_THRESHOLD = 10 ** 14
+
+
+class ArchiveError(Exception):
+    """归档文件损坏或校验和不一致"""
+
+
+def archive_interval(interval):
+    # 归档文件中月K线写作 1mo
+    return "1mo" if interval == "1M" else interval
+
+
+def archive_relpath(symbol, interval, kind, label):
+    """
+    归档文件相对于归档根目录的路径，与 data.binance.vision 的目录结构一致，例如
+    data/spot/monthly/klines/ETHUSDT/1m/ETHUSDT-1m-2024-01.zip
+    """
+    symbol = symbol.replace("/", "").upper()
+    interval = archive_interval(interval)
+    return "data/spot/{}/klines/{}/{}/{}-{}-{}.zip".format(kind, symbol, interval, symbol, interval, label)
+
+
+def _month_start_ms(month):
+    return int(month.astype("datetime64[ms]").astype(np.int64))
+
+
+def archive_periods(interval, start_ms, end_ms, now_ms=None, monthly=True):
+    """
+    列出完整落在 [start_ms, end_ms) 内、且已经结束（归档已发布）的归档周期，
+    返回 [(kind, label, period_start_ms, period_end_ms)]。整月用月度归档（monthly=False 时全部用日度归档），
+    其余用日度归档；比 1d 更长的周期没有有意义的日度归档，不足一个月的部分留给 REST 接口。
+    """
+    now_ms = now_ms or int(datetime.now(timezone.utc).timestamp() * 1000)
+    today_ms = now_ms // DAY_MS * DAY_MS
+    current_month_ms = _month_start_ms(np.datetime64(now_ms, "ms").astype("datetime64[M]"))
+    step = interval_ms(interval)
+    daily = step is not None and step <= DAY_MS
+    periods = []
+    month = np.datetime64(start_ms, "ms").astype("datetime64[M]")
+    while _month_start_ms(month) < end_ms:
+        m_start, m_end = _month_start_ms(month), _month_start_ms(month + 1)
+        if monthly and m_start >= start_ms and m_end <= min(end_ms, current_month_ms):
+            periods.append(("monthly", str(month), m_start, m_end))
+        elif daily:
+            day = max(m_start, -(-start_ms // DAY_MS) * DAY_MS)
+            while day + DAY_MS <= min(m_end, end_ms, today_ms):
+                label = str(np.datetime64(day, "ms").astype("datetime64[D]"))
+                periods.append(("daily", label, day, day + DAY_MS))
+                day += DAY_MS
+        month += 1
+    return periods
+
+
+class ArchiveSource:
+    """
+    归档文件来源：本地目录或镜像 URL。本地目录既可以保持 data.binance.vision 的目录结构，
+    也可以把 .zip 和 .zip.CHECKSUM 文件直接放在同一个目录下。文件不存在时返回 None。
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_URL, session=None):
+        self.root = root
+        self.remote = root.startswith(("http://", "https://"))
+        self.session = session
+
+    def _local_path(self, relpath):
+        for path in (os.path.join(self.root, relpath), os.path.join(self.root, os.path.basename(relpath))):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def fetch(self, relpath):
+        """读取小文件（CHECKSUM）的全部内容"""
+        if self.remote:
+            http = self.session if self.session is not None else requests
+            resp = http.get("{}/{}".format(self.root.rstrip("/"), relpath))
+            if resp.status_code == 404:
+                return None
+            resp.raise_for_status()
+            return resp.content
+        path = self._local_path(relpath)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    @contextmanager
+    def open(self, relpath):
+        """
+        返回归档文件的本地路径，文件不存在时为 None。远程归档流式下载到临时文件，with 块结束后删除；
+        本地归档直接返回原路径。
+        """
+        if not self.remote:
+            yield self._local_path(relpath)
+            return
+        http = self.session if self.session is not None else requests
+        with http.get("{}/{}".format(self.root.rstrip("/"), relpath), stream=True) as resp:
+            if resp.status_code == 404:
+                yield None
+                return
+            resp.raise_for_status()
+            with tempfile.TemporaryDirectory(prefix="kline-archive-") as tmp_dir:
+                path = os.path.join(tmp_dir, os.path.basename(relpath))
+                with open(path, "wb") as f:
+                    for block in resp.iter_content(chunk_size=DOWNLOAD_BLOCK):
+                        f.write(block)
+                resp.close()
+                yield path
+
+
+def verify_checksum(path, checksum_text, name):
+    """CHECKSUM 文件的内容为 "<sha256>  <文件名>"，与 sha256sum 的输出格式相同；按块计算 path 的 SHA-256"""
+    expected = checksum_text.decode("ascii", "replace").split()[0].lower()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_BLOCK), b""):
+            digest.update(block)
+    actual = digest.hexdigest()
+    if actual != expected:
+        raise ArchiveError("{} 校验和不一致: 期望 {}，实际 {}".format(name, expected, actual))
+
+
+def _decode_csv_block(block, first):
+    # 归档 CSV 与 /api/v3/klines 的字段顺序相同，把换行换成逗号后交给同一个解析函数
+    if first and block[:1] not in b"0123456789":
+        # 部分归档文件带有表头
+        block = block[block.find(b"\n") + 1:]
+    block = block.strip()
+    if not block:
+        return np.empty((0, kline_downloader.KLINE_FIELDS))
+    return kline_downloader.decode_klines([block.replace(b"\n", b",")])
+
+
+def decode_archive(path):
+    """流式解压归档 zip（文件路径）中的 CSV 并解析为与 klines_to_frame 相同的 DataFrame（open_time 为毫秒时间戳）"""
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError("无法解压归档文件: {}".format(e))
+    matrices = []
+    with zf:
+        with zf.open(zf.namelist()[0]) as f:
+            rest = b""
+            while True:
+                block = f.read(DECOMPRESS_BLOCK)
+                if not block:
+                    break
+                block = rest + block
+                cut = block.rfind(b"\n") + 1
+                rest = block[cut:]
+                matrices.append(_decode_csv_block(block[:cut], first=not matrices))
+            if rest.strip():
+                matrices.append(_decode_csv_block(rest, first=not matrices))
+    matrix = np.concatenate(matrices) if len(matrices) > 1 else matrices[0]
+    df = kline_downloader.matrix_to_frame(matrix)
+    micro = df["open_time"].to_numpy() > MICROSECOND_THRESHOLD
+    if micro.any():
+        df.loc[micro, "open_time"] = df["open_time"].to_numpy()[micro] // 1000
+    return df
+
+
+def load_archive(source, symbol, interval, kind, label, verify=True):
+    """下载（或读取）并校验一个归档文件，返回解析后的 DataFrame；归档不存在时返回 None"""
+    relpath = archive_relpath(symbol, interval, kind, label)
+    with source.open(relpath) as path:
+        if path is None:
+            return None
+        if verify:
+            checksum = source.fetch(relpath + ".CHECKSUM")
+            if checksum is None:
+                raise ArchiveError("缺少校验和文件 {}.CHECKSUM，可使用 --no_verify 跳过校验".format(
+                    os.path.basename(relpath)))
+            verify_checksum(path, checksum, os.path.basename(relpath))
+        return decode_archive(path)
+
+
+def ingest_archives(symbol, interval, start_ms, end_ms, source=None, store=None, verify=True, concurrency=4,
+                    now_ms=None):
+    """
+    把 [start_ms, end_ms) 内已发布的归档批量写入本地存储，只处理存储中尚未覆盖的归档周期。
+    月度归档缺失时改用该月的日度归档，仍缺失的部分留给 REST 接口补齐。返回写入的K线行数。
+    """
+    store = store or KlineStore()
+    source = source if isinstance(source, ArchiveSource) else ArchiveSource(source or DEFAULT_ARCHIVE_URL)
+    coverage = store.coverage(symbol, interval)
+
+    def uncovered(period):
+        return bool(subtract_ranges(period[2], period[3], coverage))
+
+    periods = [p for p in archive_periods(interval, start_ms, end_ms, now_ms) if uncovered(p)]
+    if not periods:
+        return 0
+
+    def load(period):
+        kind, label, p_start, p_end = period
+        df = load_archive(source, symbol, interval, kind, label, verify=verify)
+        if df is None and kind == "monthly":
+            # 当月归档还没发布时，用已发布的日度归档
+            parts = [(p, load_archive(source, symbol, interval, p[0], p[1], verify=verify))
+                     for p in archive_periods(interval, p_start, p_end, now_ms, monthly=False) if uncovered(p)]
+            return [(p, part) for p, part in parts if part is not None]
+        return [(period, df)] if df is not None else []
+
+    rows = 0
+    batch, batch_start, batch_end, batch_month = [], None, None, None
+    with profiling.stage("archive"), ThreadPoolExecutor(max_workers=concurrency or 1) as executor:
+        # 每次只并行加载少量归档，写入存储后再继续，内存占用与总时间跨度无关
+        window = max(concurrency or 1, 1) * 2
+        for offset in range(0, len(periods), window):
+            futures = [profiling.submit(executor, load, period) for period in periods[offset:offset + window]]
+            for loaded in (future.result() for future in futures):
+                for (kind, label, p_start, p_end), df in loaded:
+                    # 月度归档单独写入；同一个月内连续的日度归档合并后一次写入，减少分区重写
+                    if batch and (kind == "monthly" or p_start != batch_end or label[:7] != batch_month):
+                        rows += _write_batch(store, symbol, interval, batch, batch_start, batch_end)
+                        batch = []
+                    if not batch:
+                        batch_start, batch_month = p_start, label[:7]
+                    batch.append(df)
+                    batch_end = p_end
+        if batch:
+            rows += _write_batch(store, symbol, interval, batch, batch_start, batch_end)
+    profiling.set_rows("archive", rows)
+    return rows
+
+
+def _write_batch(store, symbol, interval, frames, start_ms, end_ms):
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    store.write(symbol, interval, df, start_ms, end_ms)
+    return len(df)
@@ -1,28 +1,116 @@
 
 import time
+import random
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import argparse
-import os  # 添加导入
+import os
+from kline_store import KlineStore, empty_kline_frame, STORE_COLUMNS
+from kline_resample import align_open_time, load_resampled
+import profiling
+import exchange_info
+import download_journal
+import kline_archive
 
-BASE_URL = "https://api.binance.com" if os.getenv("RUN_ENV") == "local" else "https://api.binance.us"
+BASE_URL = os.getenv("BINANCE_BASE_URL") or ("https://api.binance.com" if os.getenv("RUN_ENV") == "local" else "https://api.binance.us")
 REQ_LIMIT = 1000
 SUPPORT_INTERVAL = {"1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w", "1M"}
 
-def get_support_symbols():
-    res = []
-    end_point = "/api/v3/exchangeInfo"
-    resp = requests.get(BASE_URL + end_point)
-    for symbol_info in resp.json()["symbols"]:
-        if symbol_info["status"] == "TRADING":
-            symbol = "{}/{}".format(symbol_info["baseAsset"].upper(), symbol_info["quoteAsset"].upper())
-            res.append(symbol)
-    return res
+# /api/v3/klines 每行 12 个字段，最后一个字段无意义
+KLINE_COLUMNS = ["open_time", "open", "high", "low", "close", "volume",
+                 "close_time", "value", "trade_cnt",
+                 "active_buy_volume", "active_buy_value", "ignore"]
+KLINE_FIELDS = len(KLINE_COLUMNS)
+KLINE_DTYPES = {"open_time": np.int64, "close_time": np.int64, "trade_cnt": np.int64}
+
+# 币安按 IP 统计每分钟请求权重，limit=1000 的 klines 请求权重为 2
+WEIGHT_LIMIT_1M = 1200
+KLINES_REQ_WEIGHT = 2
+MAX_RETRIES = 5
+
+
+class RateLimiter:
+    """
+    根据交易所返回的 X-MBX-USED-WEIGHT-1M 响应头和 429/418 响应动态调整请求节奏，
+    取代固定的 req_interval 休眠。多个线程共享同一个实例。
+    """
+
+    def __init__(self, weight_limit=WEIGHT_LIMIT_1M, request_weight=KLINES_REQ_WEIGHT, safety_ratio=0.9):
+        self.weight_limit = weight_limit
+        self.request_weight = request_weight
+        self.budget = int(weight_limit * safety_ratio)
+        self.used_weight = 0
+        self.in_flight = 0
+        self.window = self._current_window()
+        self.backoff_until = 0.0
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def _current_window():
+        return int(time.time() // 60)
+
+    def _wait_time(self):
+        now = time.time()
+        if now < self.backoff_until:
+            return self.backoff_until - now
+        if self._current_window() != self.window:
+            # 进入新的一分钟窗口，交易所侧权重清零
+            self.window = self._current_window()
+            self.used_weight = 0
+        if self.used_weight + (self.in_flight + 1) * self.request_weight > self.budget:
+            return (self.window + 1) * 60 - now
+        return 0
+
+    def acquire(self):
+        begin = time.perf_counter()
+        with self._cond:
+            while True:
+                wait = self._wait_time()
+                if wait <= 0:
+                    self.in_flight += 1
+                    break
+                self._cond.wait(timeout=min(wait, 1.0))
+        waited = time.perf_counter() - begin
+        if waited > 0.001:
+            profiling.record_rate_limit_wait(waited)
+
+    def release(self, resp=None):
+        with self._cond:
+            self.in_flight -= 1
+            if resp is not None:
+                used = resp.headers.get("X-MBX-USED-WEIGHT-1M")
+                if used is not None:
+                    if self._current_window() != self.window:
+                        self.window = self._current_window()
+                        self.used_weight = 0
+                    # 并发响应可能乱序到达，取当前窗口内的最大值
+                    self.used_weight = max(self.used_weight, int(used))
+                if resp.status_code in (418, 429):
+                    retry_after = resp.headers.get("Retry-After")
+                    delay = float(retry_after) if retry_after else 60.0
+                    self.backoff_until = max(self.backoff_until, time.time() + delay)
+            self._cond.notify_all()
+
+
+def create_session(pool_size=10):
+    """创建带连接池的 requests.Session，复用 TCP/TLS 连接"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_support_symbols(quote=None):
+    """返回正在交易的 BASE/QUOTE 交易对列表，交易所信息带缓存，不会每次都重新下载"""
+    return exchange_info.get_exchange_info().symbols(quote=quote)
 
-def get_klines(symbol, interval='1h', since=None, limit=1000, to=None):
+def _klines_request(symbol, interval, since=None, limit=1000, to=None, session=None, base_url=None):
     end_point = "/api/v3/klines"
     params = {
         'symbol': symbol,
@@ -31,63 +119,275 @@ def get_klines(symbol, interval='1h', since=None, limit=1000, to=None):
         'limit': limit,
         'endTime': to * 1000 if to else None
     }
-    resp = requests.get(BASE_URL + end_point, params=params)
+    http = session if session is not None else requests
+    begin = time.perf_counter()
+    resp = http.get((base_url or BASE_URL) + end_point, params=params)
+    profiling.record_request(time.perf_counter() - begin, resp)
+    return resp
+
+def get_klines(symbol, interval='1h', since=None, limit=1000, to=None, session=None, base_url=None):
+    resp = _klines_request(symbol, interval, since=since, limit=limit, to=to, session=session, base_url=base_url)
     return resp.json()
 
-def download_full_klines(symbol, interval, start, end=None, save_to=None, req_interval=None, dimension="ohlcv", return_df=False):
-    if interval not in SUPPORT_INTERVAL:
-        raise Exception("interval {} is not support!!!".format(interval))
-    start_end_pairs = get_start_end_pairs(start, end, interval)
+def fetch_chunk(symbol, interval, start_ts, end_ts, session, limiter, base_url=None, max_retries=MAX_RETRIES):
+    """
+    在限速器控制下下载单个时间段的K线，遇到 429/418、网络错误、5xx 或不完整的响应体时按指数退避重试。
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        resp = None
+        try:
+            resp = _klines_request(symbol, interval, since=start_ts, limit=REQ_LIMIT, to=end_ts,
+                                   session=session, base_url=base_url)
+        except requests.RequestException:
+            if attempt == max_retries:
+                raise
+            profiling.record_retry()
+            time.sleep(min(2 ** attempt, 30) + random.random())
+            continue
+        finally:
+            limiter.release(resp)
+
+        if resp.status_code in (418, 429):
+            # 限速器已根据 Retry-After 设置了全局退避，这里直接重试
+            profiling.record_retry()
+            continue
+        if resp.status_code >= 500 and attempt < max_retries:
+            profiling.record_retry()
+            time.sleep(min(2 ** attempt, 30) + random.random())
+            continue
+        resp.raise_for_status()
+        body = resp.content.strip()
+        if not (body == b"[]" or (body.startswith(b"[[") and body.endswith(b"]]"))):
+            # 状态码 200 但内容是错误信息（例如 {"code":-1001,...}）或在某一行末尾被截断，不能当作K线使用
+            if attempt == max_retries:
+                raise Exception("获取K线失败: {}".format(body[:200].decode("utf-8", "replace")))
+            profiling.record_retry()
+            time.sleep(min(2 ** attempt, 30) + random.random())
+            continue
+        return resp.content
+    raise Exception("请求 {} {} - {} 重试 {} 次后仍被限速".format(symbol, start_ts, end_ts, max_retries))
+
+def fetch_chunks_concurrent(symbol, start_end_pairs, interval, concurrency=4, session=None, limiter=None,
+                            base_url=None, progress=True):
+    """
+    并发下载多个时间段的K线，并按 start_end_pairs 的顺序返回各段的原始响应体。
+    """
+    own_session = session is None
+    if own_session:
+        session = create_session(pool_size=concurrency)
+    if limiter is None:
+        limiter = RateLimiter()
+
+    results = [None] * len(start_end_pairs)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                profiling.submit(executor, fetch_chunk, symbol, interval, start_ts, end_ts, session, limiter, base_url): idx
+                for idx, (start_ts, end_ts) in enumerate(start_end_pairs)
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), disable=not progress):
+                results[futures[future]] = future.result()
+    finally:
+        if own_session:
+            session.close()
+    return results
+
+def fetch_kline_batches(symbol, interval, start_end_pairs, req_interval=None, concurrency=None, base_url=None,
+                        limiter=None, progress=True):
+    """
+    按 start_end_pairs 的顺序下载各时间段的K线，返回各段的原始响应体（bytes）。
+    传入 limiter 时多次下载共享同一个请求权重预算（仅并发模式）；progress=False 时不显示命令行进度条。
+    """
+    if concurrency:
+        # 并发模式: 由 RateLimiter 根据响应头控制节奏，忽略 req_interval
+        return fetch_chunks_concurrent(symbol.replace("/", ""), start_end_pairs, interval,
+                                       concurrency=concurrency, limiter=limiter, base_url=base_url,
+                                       progress=progress)
     klines = []
-    for (start_ts, end_ts) in tqdm(start_end_pairs):
-        tmp_kline = get_klines(symbol.replace("/", ""), interval, since=start_ts, limit=REQ_LIMIT, to=end_ts)
-        if len(tmp_kline) > 0:
-            klines.append(tmp_kline)
+    for (start_ts, end_ts) in tqdm(start_end_pairs, disable=not progress):
+        resp = _klines_request(symbol.replace("/", ""), interval, since=start_ts, limit=REQ_LIMIT, to=end_ts,
+                               base_url=base_url)
+        klines.append(resp.content)
         if req_interval:
             time.sleep(req_interval)
+            profiling.record_sleep(req_interval)
+    return klines
+
+def decode_klines(payloads):
+    """
+    把 /api/v3/klines 的响应直接解析为 (n, 12) 的 float64 矩阵。
+
+    原始响应体只需删除引号和方括号就是一串逗号分隔的数字，交给 np.fromstring 在 C 层一次解析，
+    不会为每一行、每个字段创建 Python 对象。也接受已经 json 解析过的列表。
+    """
+    matrices = []
+    for payload in payloads:
+        if isinstance(payload, (bytes, bytearray)):
+            body = bytes(payload).strip()
+            if body.startswith(b"{"):
+                # 交易所返回了错误信息，例如 {"code":-1121,"msg":"Invalid symbol."}
+                raise Exception("获取K线失败: {}".format(body.decode("utf-8", "replace")))
+            values = np.fromstring(body.translate(None, b'"[] \t\r\n'), dtype=np.float64, sep=",")
+        elif isinstance(payload, dict):
+            raise Exception("获取K线失败: {}".format(payload))
+        else:
+            values = np.asarray(payload, dtype=np.float64).ravel()
+        if values.size % KLINE_FIELDS != 0:
+            raise Exception("K线数据格式错误: 共 {} 个字段，不是 {} 的整数倍".format(values.size, KLINE_FIELDS))
+        if values.size:
+            matrices.append(values.reshape(-1, KLINE_FIELDS))
+    if not matrices:
+        return np.empty((0, KLINE_FIELDS), dtype=np.float64)
+    return matrices[0] if len(matrices) == 1 else np.concatenate(matrices)
+
+def matrix_to_frame(matrix):
+    """把 (n, 12) 的K线矩阵转换为带类型的 DataFrame（STORE_COLUMNS），open_time 为毫秒时间戳"""
+    if len(matrix) == 0:
+        return empty_kline_frame()
+    return pd.DataFrame({
+        col: matrix[:, idx].astype(KLINE_DTYPES.get(col, np.float64))
+        for idx, col in enumerate(KLINE_COLUMNS) if col in STORE_COLUMNS
+    })
+
+def klines_to_frame(klines):
+    """把接口返回的多批K线转换为带类型的 DataFrame，open_time 保留为毫秒时间戳"""
+    with profiling.stage("decode"):
+        df = matrix_to_frame(decode_klines(klines))
+    profiling.set_rows("decode", len(df))
+    return df
+
+def closed_end_ms(end_ts, interval):
+    """把闭区间的结束时间（秒）转换为半开区间的毫秒上界，并截止到当前未收盘K线的开盘时间"""
+    # 只缓存已收盘的K线，尚未收盘的那一根留待下次补齐
+    return min(end_ts * 1000 + 1, int(align_open_time(int(time.time() * 1000), interval)))
+
+def fetch_klines(symbol, interval, start_end_pairs, req_interval=None, concurrency=None, base_url=None, limiter=None,
+                 progress=True, journal=None):
+    """下载各请求区间的原始响应体；传入 ChunkJournal 时逐块写入下载日志，可从中断处继续"""
+    if journal is not None:
+        return download_journal.fetch_journaled(symbol, interval, start_end_pairs, journal, concurrency=concurrency,
+                                                base_url=base_url, limiter=limiter, progress=progress)
+    return fetch_kline_batches(symbol, interval, start_end_pairs, req_interval=req_interval, concurrency=concurrency,
+                               base_url=base_url, limiter=limiter, progress=progress)
+
+def make_gap_fetcher(symbol, interval, store, req_interval=None, concurrency=None, base_url=None, resample=True,
+                     limiter=None, progress=True, journal=None):
+    """返回供 KlineStore.load 使用的 fetcher(gap_start_ms, gap_end_ms)，优先用本地较细周期重采样，其余从交易所下载"""
+    def fetch_gap(gap_start_ms, gap_end_ms):
+        frames = []
+        remote = [(gap_start_ms, gap_end_ms)]
+        if resample:
+            # 本地已有覆盖该时间段的较细周期K线时直接聚合，只有剩余部分才请求交易所
+            with profiling.stage("resample"):
+                local, remote = load_resampled(store, symbol, interval, gap_start_ms, gap_end_ms)
+            if local is not None:
+                profiling.set_rows("resample", len(local))
+                frames.append(local)
+        for remote_start, remote_end in remote:
+            pairs = split_time_range(remote_start // 1000, (remote_end - 1) // 1000, interval)
+            with profiling.stage("fetch"):
+                payloads = fetch_klines(symbol, interval, pairs, req_interval=req_interval, concurrency=concurrency,
+                                        base_url=base_url, limiter=limiter, progress=progress, journal=journal)
+            frames.append(klines_to_frame(payloads))
+        if len(frames) == 1:
+            return frames[0]
+        return pd.concat(frames, ignore_index=True).sort_values("open_time", ignore_index=True)
 
-    klines = np.concatenate(klines)
-    data = []
-    cols = ["open_time", "open", "high", "low", "close", "volume",
-            "close_time", "value", "trade_cnt",
-            "active_buy_volume", "active_buy_value"]
-
-    for i in range(len(klines)):
-        tmp_kline = klines[i]
-        data.append(tmp_kline[:-1])
-
-    df = pd.DataFrame(np.array(data), columns=cols, dtype=float)
-    df.drop("close_time", axis=1, inplace=True)
-    for col in cols:
-        if col in ["open_time", "trade_cnt"]:
-            df[col] = df[col].astype(int)
+    return fetch_gap
+
+def download_full_klines(symbol, interval, start, end=None, save_to=None, req_interval=None, dimension="ohlcv",
+                         return_df=False, concurrency=None, base_url=None, use_store=True, store=None,
+                         resample=True, limiter=None, journal=False, archive=None, archive_verify=True,
+                         progress=True):
+    """
+    journal=True 时启用下载日志：每个请求区间下载成功后立即保存，失败的区间按指数退避重试，
+    仍失败时抛出 ChunkDownloadError，重新运行只下载缺失的区间；最后校验缺口和重复的K线。
+    archive 为归档根目录或 URL（或 ArchiveSource）时，先把已发布的完整月/日归档写入本地存储，
+    只用 REST 接口补齐最近的部分；仅在使用本地存储时生效。progress=False 时不显示下载进度条。
+    """
+    if interval not in SUPPORT_INTERVAL:
+        raise Exception("interval {} is not support!!!".format(interval))
+    journal = download_journal.ChunkJournal(symbol, interval) if journal is True else (journal or None)
+
+    if use_store:
+        # 通过本地列式存储读取，只从交易所下载尚未缓存的时间段
+        store = store or KlineStore()
+        start_ts, end_ts = get_start_end_ts(start, end)
+        end_ms = closed_end_ms(end_ts, interval)
+        if archive:
+            kline_archive.ingest_archives(symbol, interval, start_ts * 1000, end_ms, source=archive, store=store,
+                                          verify=archive_verify, concurrency=concurrency or 4)
+        fetch_gap = make_gap_fetcher(symbol, interval, store, req_interval=req_interval, concurrency=concurrency,
+                                     base_url=base_url, resample=resample, limiter=limiter, progress=progress,
+                                     journal=journal)
+        with profiling.stage("store"):
+            df = store.load(symbol, interval, start_ts * 1000, end_ms, fetch_gap)
+    else:
+        start_end_pairs = get_start_end_pairs(start, end, interval)
+        with profiling.stage("fetch"):
+            payloads = fetch_klines(symbol, interval, start_end_pairs, req_interval=req_interval,
+                                    concurrency=concurrency, base_url=base_url, limiter=limiter, progress=progress,
+                                    journal=journal)
+        df = klines_to_frame(payloads)
+        del payloads
+
+    if journal is not None:
+        with profiling.stage("verify"):
+            report = download_journal.verify_klines(df, interval)
+        for line in download_journal.format_verify_report(report):
+            print(line)
+        if report["duplicates"]:
+            df = df.sort_values("open_time", kind="stable").drop_duplicates("open_time", ignore_index=True)
+
+    if len(df) == 0:
+        raise Exception("{} {} 在 {} - {} 期间没有K线数据".format(symbol, interval, start, end))
+
+    cols = ["open_time", "open", "high", "low", "close", "volume"]
     df["open_time"] = pd.to_datetime(df["open_time"], unit="ms")
 
     if dimension == "ohlcv":
-        df = df[cols[:6]]
+        df = df[cols]
 
     real_start = df["open_time"].iloc[0].strftime("%Y-%m-%d")
     real_end = df["open_time"].iloc[-1].strftime("%Y-%m-%d")
 
+    if journal is not None:
+        # 数据已经写入本地存储或即将返回/保存，下载日志不再需要
+        journal.discard()
+
     if return_df:
         return df
 
-    if save_to:
-        df.to_csv(save_to, index=False)
-    else:
+    if not save_to:
         save_to = "{}_{}_{}_{}.csv".format(symbol.replace("/", "-"), interval, real_start, real_end)
+    with profiling.stage("csv_write", rows=len(df)):
         df.to_csv(save_to, index=False)
     
     return save_to  # 返回保存的文件路径
 
-def get_start_end_pairs(start, end, interval):
+def get_start_end_ts(start, end):
+    """把 "YYYY-MM-DD" 格式的开始/结束日期转换为秒级时间戳，end 为空时取当前时间"""
     start_dt = datetime.strptime(start, "%Y-%m-%d")
     if end is None:
         end_dt = datetime.now()
     else:
         end_dt = datetime.strptime(end, "%Y-%m-%d")
-    start_dt_ts = int(time.mktime(start_dt.timetuple()))
-    end_dt_ts = int(time.mktime(end_dt.timetuple()))
+    return int(time.mktime(start_dt.timetuple())), int(time.mktime(end_dt.timetuple()))
+
+def split_time_range(start_ts, end_ts, interval):
+    """把闭区间 [start_ts, end_ts] 切分为每段最多 REQ_LIMIT 根K线的请求区间"""
+    ts_interval = interval_to_seconds(interval)
+    res = []
+    cur_start = start_ts
+    while cur_start <= end_ts:
+        cur_end = min(end_ts, cur_start + (REQ_LIMIT - 1) * ts_interval)
+        res.append((cur_start, cur_end))
+        cur_start = cur_end + ts_interval
+    return res
+
+def get_start_end_pairs(start, end, interval):
+    start_dt_ts, end_dt_ts = get_start_end_ts(start, end)
 
     ts_interval = interval_to_seconds(interval)
 
@@ -100,32 +400,45 @@ def get_start_end_pairs(start, end, interval):
     return res
 
 def interval_to_seconds(interval):
-    seconds_per_unit = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+    # 月K线长度不固定，按 31 天估算，只用于切分请求区间；K线边界对齐见 kline_resample.align_open_time
+    seconds_per_unit = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60, "M": 31 * 24 * 60 * 60}
     return int(interval[:-1]) * seconds_per_unit[interval[-1]]
 
-def run_download(symbol, interval='15m', start=None, end=None, days=None, save_to=None, return_df=False):
-    # 将 symbol 转换为大写
+def normalize_symbol(symbol):
+    """转换为大写的 BASE/QUOTE 形式，只给出基础币种时默认计价币种为 USDT"""
     symbol = symbol.upper()
     if '/' not in symbol:
         symbol = f"{symbol}/USDT"
+    return symbol
 
-    # 处理日期参数
+def resolve_date_range(start=None, end=None, days=None):
+    """把 --days 或 --start/--end 转换为 "YYYY-MM-DD" 格式的 (start, end)"""
     if days:
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
-        start = start_date.strftime("%Y-%m-%d")
-        end = end_date.strftime("%Y-%m-%d")
-    else:
-        if not start or not end:
-            raise ValueError("当不使用 --days 时，必须提供 --start 和 --end")
-    
+        return start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+    if not start or not end:
+        raise ValueError("当不使用 --days 时，必须提供 --start 和 --end")
+    return start, end
+
+def run_download(symbol, interval='15m', start=None, end=None, days=None, save_to=None, return_df=False,
+                 concurrency=None, use_store=True, resample=True, validate=True, journal=False, archive=None,
+                 archive_verify=True):
+    # 按交易所信息校验交易对，不存在时抛出 ValueError，而不是下载到空数据
+    symbol = exchange_info.resolve_symbol(symbol) if validate else normalize_symbol(symbol)
+
+    # 处理日期参数
+    start, end = resolve_date_range(start, end, days)
+
     # 设置保存路径，包含 interval、start 和 end
     if not save_to and not return_df:
         save_to = f'{symbol.replace("/", "_")}_{interval}_{start}_{end}.csv'
 
     if return_df:
         # 直接返回 DataFrame 而不保存文件
-        df = download_full_klines(symbol=symbol, interval=interval, start=start, end=end, save_to=save_to, return_df=True)
+        df = download_full_klines(symbol=symbol, interval=interval, start=start, end=end, save_to=save_to, return_df=True,
+                                  concurrency=concurrency, use_store=use_store, resample=resample, journal=journal,
+                                  archive=archive, archive_verify=archive_verify)
         return df
 
     # 检查文件是否已存在
@@ -134,7 +447,9 @@ def run_download(symbol, interval='15m', start=None, end=None, days=None, save_t
         return save_to
 
     # 调用下载函数
-    download_full_klines(symbol=symbol, interval=interval, start=start, end=end, save_to=save_to)
+    download_full_klines(symbol=symbol, interval=interval, start=start, end=end, save_to=save_to,
+                         concurrency=concurrency, use_store=use_store, resample=resample, journal=journal,
+                         archive=archive, archive_verify=archive_verify)
 
     return save_to  # 返回保存的文件路径
 
@@ -146,6 +461,14 @@ if __name__ == '__main__':
     parser.add_argument('--end', type=str, help='结束日期，格式 "YYYY-MM-DD"')
     parser.add_argument('--days', type=int, help='爬取最近多少天的数据')
     parser.add_argument('--save_to', type=str, default=None, help='保存的文件路径')
+    parser.add_argument('--concurrency', type=int, default=None, help='并发请求数，不指定时逐个顺序下载')
+    parser.add_argument('--no_store', action='store_true', help='不使用本地K线存储，直接从交易所下载全部数据')
+    parser.add_argument('--journal', action='store_true',
+                        help='记录下载日志：逐块保存已下载的数据，中断或失败后重新运行只下载缺失的部分，最后校验缺口和重复')
+    parser.add_argument('--archive', nargs='?', const=kline_archive.DEFAULT_ARCHIVE_URL, default=None,
+                        help='先从 Binance 公开归档文件批量导入历史K线，可指定本地归档目录或镜像 URL，'
+                             '不指定时使用 data.binance.vision；只有最近的部分通过 REST 接口下载')
+    parser.add_argument('--no_verify', action='store_true', help='导入归档文件时不校验 CHECKSUM')
     args = parser.parse_args()
 
     save_to = run_download(
@@ -154,7 +477,12 @@ if __name__ == '__main__':
         start=args.start,
         end=args.end,
         days=args.days,
-        save_to=args.save_to
+        save_to=args.save_to,
+        concurrency=args.concurrency,
+        use_store=not args.no_store,
+        journal=args.journal,
+        archive=args.archive,
+        archive_verify=not args.no_verify
     )
     
     # symbols = get_support_symbols()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from kline_store import STORE_COLUMNS, empty_kline_frame, subtract_ranges
+
+MINUTE_MS = 60 * 1000
+DAY_MS = 24 * 60 * MINUTE_MS
+WEEK_MS = 7 * DAY_MS
+# 1970-01-01 是周四，币安周K线从周一 00:00 UTC 开始，比纪元偏移 4 天
+WEEK_OFFSET_MS = 4 * DAY_MS
+UNIT_MS = {"m": MINUTE_MS, "h": 60 * MINUTE_MS, "d": DAY_MS, "w": WEEK_MS}
+
+# 可作为重采样来源的周期，从细到粗
+RESAMPLE_BASES = ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w"]
+
+SUM_COLUMNS = ["volume", "value", "trade_cnt", "active_buy_volume", "active_buy_value"]
+
+
+def interval_ms(interval):
+    """固定长度周期的毫秒数；月K线长度不固定，返回 None"""
+    if interval[-1] == "M":
+        return None
+    return int(interval[:-1]) * UNIT_MS[interval[-1]]
+
+
+def align_open_time(open_time, interval):
+    """
+    把毫秒时间戳向下对齐到所在K线的开盘时间，与币安的K线边界一致：
+    分钟/小时/日线按 UTC 纪元对齐，周线从周一 00:00 UTC 开始，月线从每月 1 日 00:00 UTC 开始。
+    """
+    open_time = np.asarray(open_time, dtype=np.int64)
+    if interval == "1M":
+        months = open_time.astype("datetime64[ms]").astype("datetime64[M]")
+        return months.astype("datetime64[ms]").astype(np.int64)
+    step = interval_ms(interval)
+    offset = WEEK_OFFSET_MS if interval[-1] == "w" else 0
+    return (open_time - offset) // step * step + offset
+
+
+def next_open_time(open_time, interval):
+    """返回所在K线的下一根K线的开盘时间，即本根K线的结束时间（不含）"""
+    aligned = align_open_time(open_time, interval)
+    if interval == "1M":
+        months = aligned.astype("datetime64[ms]").astype("datetime64[M]") + 1
+        return months.astype("datetime64[ms]").astype(np.int64)
+    return aligned + interval_ms(interval)
+
+
+def ceil_open_time(open_time, interval):
+    """向上对齐到K线边界，已经在边界上的时间保持不变"""
+    open_time = np.asarray(open_time, dtype=np.int64)
+    aligned = align_open_time(open_time, interval)
+    return np.where(aligned == open_time, aligned, next_open_time(open_time, interval))
+
+
+def can_resample(base, target):
+    """base 周期的K线边界是否都落在 target 的边界上，即 target 的每根K线恰好由若干根 base K线组成"""
+    if base == target or base not in RESAMPLE_BASES:
+        return False
+    base_ms = interval_ms(base)
+    if target == "1M":
+        return DAY_MS % base_ms == 0
+    target_ms = interval_ms(target)
+    if target_ms <= base_ms or target_ms % base_ms:
+        return False
+    if target[-1] == "w":
+        # 周线边界相对纪元偏移 4 天，base 的边界必须同样落在这些时刻上
+        return WEEK_OFFSET_MS % base_ms == 0
+    return True
+
+
+def resample_sources(target):
+    """能够重采样得到 target 的较细周期，按从粗到细排列，优先读取行数最少的来源"""
+    return [base for base in reversed(RESAMPLE_BASES) if can_resample(base, target)]
+
+
+def resample_klines(df, interval):
+    """
+    把较细周期的K线聚合为 interval 周期：开盘取第一根，收盘取最后一根，最高/最低取极值，
+    成交量、成交额、成交笔数和主动买入量/额求和。完全向量化，输入至少需包含 OHLC 列，
+    只聚合输入中存在的 STORE_COLUMNS（例如只有 OHLCV 的下载结果），open_time 可以是毫秒时间戳或 datetime，
+    输出保持同样的类型。
+    调用方需保证每根目标K线对应的较细K线是完整的，否则首尾的K线只是部分聚合。
+    """
+    if len(df) == 0:
+        return empty_kline_frame()
+    is_datetime = pd.api.types.is_datetime64_any_dtype(df["open_time"])
+    if is_datetime:
+        open_time = df["open_time"].to_numpy(dtype="datetime64[ms]").astype(np.int64)
+    else:
+        open_time = df["open_time"].to_numpy(dtype=np.int64)
+    order = None
+    if np.any(open_time[1:] < open_time[:-1]):
+        order = np.argsort(open_time, kind="stable")
+        open_time = open_time[order]
+
+    def column(name):
+        values = df[name].to_numpy()
+        return values[order] if order is not None else values
+
+    keys = align_open_time(open_time, interval)
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    ends = np.append(starts[1:], len(keys)) - 1
+    result = {
+        "open_time": keys[starts],
+        "open": column("open")[starts],
+        "high": np.maximum.reduceat(column("high"), starts),
+        "low": np.minimum.reduceat(column("low"), starts),
+        "close": column("close")[ends],
+    }
+    for name in SUM_COLUMNS:
+        if name in df.columns:
+            result[name] = np.add.reduceat(column(name), starts)
+    out = pd.DataFrame({col: result[col] for col in STORE_COLUMNS if col in result})
+    if is_datetime:
+        out["open_time"] = pd.to_datetime(out["open_time"], unit="ms")
+    return out
+
+
+def load_resampled(store, symbol, interval, start_ms, end_ms):
+    """
+    用本地存储中已有的较细周期K线，重采样出开盘时间落在 [start_ms, end_ms) 内的 interval K线。
+    只有对应时间段被某个较细周期完整覆盖的K线才会被重采样，优先使用最粗的来源。
+    返回 (重采样得到的 DataFrame 或 None, 仍需从交易所获取的区间列表)。
+    """
+    first = int(ceil_open_time(start_ms, interval))
+    stop = int(ceil_open_time(end_ms, interval))
+    pending = [(first, stop)] if first < stop else []
+    frames = []
+    for base in resample_sources(interval):
+        if not pending:
+            break
+        done = []
+        for cov_start, cov_end in store.coverage(symbol, base):
+            for gap_start, gap_end in pending:
+                # 完整落在覆盖区间内的K线为 [ceil(覆盖起点), floor(覆盖终点))
+                lo = int(ceil_open_time(max(cov_start, gap_start), interval))
+                hi = int(align_open_time(min(cov_end, gap_end), interval))
+                if lo < hi:
+                    frames.append(resample_klines(store.read(symbol, base, lo, hi), interval))
+                    done.append([lo, hi])
+        remaining = []
+        for gap_start, gap_end in pending:
+            remaining.extend(subtract_ranges(gap_start, gap_end, sorted(done)))
+        pending = remaining
+    if not frames:
+        return None, [(start_ms, end_ms)]
+    df = pd.concat(frames, ignore_index=True).sort_values("open_time", ignore_index=True)
+    return df, pending
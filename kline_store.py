@@ -0,0 +1,225 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只在进程内加锁
+    fcntl = None
+
+DEFAULT_STORE_DIR = os.getenv("KLINE_STORE_DIR", os.path.join("data", "klines"))
+STORE_COLUMNS = ["open_time", "open", "high", "low", "close", "volume",
+                 "value", "trade_cnt", "active_buy_volume", "active_buy_value"]
+STORE_DTYPES = {col: np.float64 for col in STORE_COLUMNS}
+STORE_DTYPES["open_time"] = np.int64
+STORE_DTYPES["trade_cnt"] = np.int64
+# 分钟级K线按月分区，其余按年分区，使每个分区的大小保持在几 MB 以内
+MONTHLY_INTERVALS = {"1m", "3m", "5m", "15m", "30m"}
+COVERAGE_FILE = "coverage.json"
+LOCK_FILE = ".lock"
+
+
+def empty_kline_frame():
+    return pd.DataFrame({col: np.empty(0, dtype=STORE_DTYPES[col]) for col in STORE_COLUMNS})
+
+
+def merge_ranges(ranges):
+    """合并重叠或相邻的半开区间 [start, end)"""
+    merged = []
+    for start, end in sorted(ranges):
+        if start >= end:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def subtract_ranges(start, end, covered):
+    """返回 [start, end) 中未被 covered 覆盖的区间"""
+    gaps = []
+    cur = start
+    for c_start, c_end in covered:
+        if c_end <= cur:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cur:
+            gaps.append((cur, min(c_start, end)))
+        cur = max(cur, c_end)
+        if cur >= end:
+            break
+    if cur < end:
+        gaps.append((cur, end))
+    return gaps
+
+
+class KlineStore:
+    """
+    本地列式K线存储。
+
+    目录结构为 {root}/{SYMBOL}/{interval}/{分区}/{列名}.npy，每列一个 NumPy 二进制文件，
+    读取时可以按需 mmap。coverage.json 记录已经从交易所获取过的 open_time 区间（毫秒，半开区间），
+    因此重叠的时间范围只需补齐缺口，无需整段重新下载。
+    """
+
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_STORE_DIR
+        self._lock = threading.RLock()
+        self._fetch_locks = {}
+        self._series_locks = {}
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, symbol.replace("/", "").upper(), interval)
+
+    def _fetch_lock(self, symbol, interval):
+        # 同一个 交易对/周期 的缺口同时只由一个线程下载，不同的序列可以并行下载
+        with self._lock:
+            return self._fetch_locks.setdefault(self._series_dir(symbol, interval), threading.Lock())
+
+    @contextmanager
+    def _series_lock(self, symbol, interval, shared=False):
+        """
+        读取和写入同一个序列的分区及 coverage.json 时加锁：进程内用线程锁，进程间（预取调度器、命令行、Streamlit）
+        用序列目录下的文件锁，读取加共享锁，写入加排他锁。
+        """
+        series_dir = self._series_dir(symbol, interval)
+        with self._lock:
+            lock = self._series_locks.setdefault(series_dir, threading.Lock())
+        with lock:
+            if fcntl is None or (shared and not os.path.isdir(series_dir)):
+                yield
+                return
+            os.makedirs(series_dir, exist_ok=True)
+            with open(os.path.join(series_dir, LOCK_FILE), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _partition_keys(open_time, interval):
+        unit = "M" if interval in MONTHLY_INTERVALS else "Y"
+        periods = open_time.astype("datetime64[ms]").astype("datetime64[{}]".format(unit))
+        return periods.astype(str)
+
+    @staticmethod
+    def _partition_bounds(key):
+        start = np.datetime64(key)
+        end = start + 1
+        return int(start.astype("datetime64[ms]").astype(np.int64)), int(end.astype("datetime64[ms]").astype(np.int64))
+
+    def coverage(self, symbol, interval):
+        path = os.path.join(self._series_dir(symbol, interval), COVERAGE_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return merge_ranges(json.load(f)["ranges"])
+
+    def _write_coverage(self, symbol, interval, ranges):
+        series_dir = self._series_dir(symbol, interval)
+        os.makedirs(series_dir, exist_ok=True)
+        tmp_path = os.path.join(series_dir, "{}.{}.tmp".format(COVERAGE_FILE, uuid.uuid4().hex))
+        with open(tmp_path, "w") as f:
+            json.dump({"ranges": merge_ranges(ranges)}, f)
+        os.replace(tmp_path, os.path.join(series_dir, COVERAGE_FILE))
+
+    def missing_ranges(self, symbol, interval, start_ms, end_ms):
+        return subtract_ranges(start_ms, end_ms, self.coverage(symbol, interval))
+
+    def _read_partition(self, partition_dir, mmap=False):
+        mode = "r" if mmap else None
+        return {col: np.load(os.path.join(partition_dir, col + ".npy"), mmap_mode=mode) for col in STORE_COLUMNS}
+
+    def _write_partition(self, partition_dir, columns):
+        tmp_dir = "{}.{}.tmp".format(partition_dir, uuid.uuid4().hex)
+        os.makedirs(tmp_dir)
+        for col in STORE_COLUMNS:
+            np.save(os.path.join(tmp_dir, col + ".npy"), np.ascontiguousarray(columns[col], dtype=STORE_DTYPES[col]))
+        old_dir = None
+        if os.path.exists(partition_dir):
+            old_dir = "{}.{}.old".format(partition_dir, uuid.uuid4().hex)
+            os.replace(partition_dir, old_dir)
+        os.replace(tmp_dir, partition_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def write(self, symbol, interval, df, start_ms, end_ms):
+        """
+        写入 [start_ms, end_ms) 区间内获取到的K线，并把该区间记为已覆盖。
+        df 需包含 STORE_COLUMNS，open_time 为毫秒时间戳。
+        """
+        with self._series_lock(symbol, interval):
+            series_dir = self._series_dir(symbol, interval)
+            open_time = df["open_time"].to_numpy(dtype=np.int64)
+            mask = (open_time >= start_ms) & (open_time < end_ms)
+            if mask.any():
+                rows = {col: df[col].to_numpy()[mask] for col in STORE_COLUMNS}
+                keys = self._partition_keys(rows["open_time"], interval)
+                for key in np.unique(keys):
+                    part_mask = keys == key
+                    new_cols = {col: rows[col][part_mask] for col in STORE_COLUMNS}
+                    partition_dir = os.path.join(series_dir, key)
+                    if os.path.exists(partition_dir):
+                        old_cols = self._read_partition(partition_dir)
+                        new_cols = {col: np.concatenate([old_cols[col], new_cols[col]]) for col in STORE_COLUMNS}
+                    # 按 open_time 排序并去重，重复时保留新数据
+                    times = new_cols["open_time"]
+                    order = np.argsort(times, kind="stable")
+                    times = times[order]
+                    keep = np.ones(len(times), dtype=bool)
+                    keep[:-1] = times[1:] != times[:-1]
+                    index = order[keep]
+                    self._write_partition(partition_dir, {col: new_cols[col][index] for col in STORE_COLUMNS})
+            self._write_coverage(symbol, interval, self.coverage(symbol, interval) + [[start_ms, end_ms]])
+
+    def read(self, symbol, interval, start_ms, end_ms, columns=None, mmap=False):
+        """读取 [start_ms, end_ms) 区间内已存储的K线，返回 open_time 为毫秒时间戳的 DataFrame"""
+        columns = columns or STORE_COLUMNS
+        try:
+            with self._series_lock(symbol, interval, shared=True):
+                return self._read(symbol, interval, start_ms, end_ms, columns, mmap)
+        except FileNotFoundError:
+            # 分区目录在列出和打开之间被替换时重试一次
+            with self._series_lock(symbol, interval, shared=True):
+                return self._read(symbol, interval, start_ms, end_ms, columns, mmap)
+
+    def _read(self, symbol, interval, start_ms, end_ms, columns, mmap):
+        series_dir = self._series_dir(symbol, interval)
+        if not os.path.isdir(series_dir):
+            return empty_kline_frame()[columns]
+        parts = []
+        for key in sorted(os.listdir(series_dir)):
+            partition_dir = os.path.join(series_dir, key)
+            if not os.path.isdir(partition_dir) or key.endswith((".tmp", ".old")):
+                continue
+            p_start, p_end = self._partition_bounds(key)
+            if p_end <= start_ms or p_start >= end_ms:
+                continue
+            cols = self._read_partition(partition_dir, mmap=mmap)
+            times = cols["open_time"]
+            lo, hi = np.searchsorted(times, [start_ms, end_ms])
+            if hi > lo:
+                parts.append({col: cols[col][lo:hi] for col in columns})
+        if not parts:
+            return empty_kline_frame()[columns]
+        return pd.DataFrame({col: np.concatenate([p[col] for p in parts]) for col in columns})
+
+    def load(self, symbol, interval, start_ms, end_ms, fetcher):
+        """
+        读取 [start_ms, end_ms) 区间的K线，缺失部分通过 fetcher(gap_start_ms, gap_end_ms) 从交易所补齐。
+        fetcher 返回包含 STORE_COLUMNS 的 DataFrame。下载期间不持有存储的全局锁。
+        """
+        with self._fetch_lock(symbol, interval):
+            for gap_start, gap_end in self.missing_ranges(symbol, interval, start_ms, end_ms):
+                df = fetcher(gap_start, gap_end)
+                self.write(symbol, interval, df, gap_start, gap_end)
+        return self.read(symbol, interval, start_ms, end_ms)
@@ -0,0 +1,209 @@
+import argparse
+import base64
+import json
+import os
+import socket
+import ssl
+import struct
+import time
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from indicator_engine import IndicatorEngine, to_epoch_ms
+from kline_downloader import run_download
+
+
+def parse_kline_event(message):
+    """解析币安K线推送，只返回已收盘K线的 (open_time, high, low, close)，否则返回 None"""
+    if isinstance(message, (str, bytes)):
+        message = json.loads(message)
+    message = message.get("data", message)  # 组合流会包一层 {"stream": ..., "data": ...}
+    kline = message.get("k")
+    if not kline or not kline.get("x"):
+        return None
+    return int(kline["t"]), float(kline["h"]), float(kline["l"]), float(kline["c"])
+
+
+def replay_klines(path):
+    """
+    从本地文件回放已收盘的K线：支持下载生成的 CSV（open_time, high, low, close 列），
+    或每行一条币安K线推送事件的 JSON Lines 文件。
+    """
+    if path.endswith((".jsonl", ".json")):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    bar = parse_kline_event(line)
+                    if bar is not None:
+                        yield bar
+        return
+    df = pd.read_csv(path)
+    open_time = to_epoch_ms(df["open_time"])
+    for ts, high, low, close in zip(open_time.tolist(), df["high"].tolist(), df["low"].tolist(),
+                                    df["close"].tolist()):
+        yield ts, high, low, close
+
+
+def _recv_exact(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("WebSocket 连接已断开")
+        buf += chunk
+    return buf
+
+
+def _send_frame(sock, payload, opcode):
+    # 客户端发出的帧必须带掩码
+    mask = os.urandom(4)
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([0x80 | length])
+    elif length < 65536:
+        header += bytes([0x80 | 126]) + struct.pack(">H", length)
+    else:
+        header += bytes([0x80 | 127]) + struct.pack(">Q", length)
+    sock.sendall(header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+
+def websocket_messages(url, timeout=30):
+    """极简的 WebSocket 客户端（ws:// 或 wss://），逐条返回文本消息，避免引入额外依赖"""
+    parsed = urlparse(url)
+    secure = parsed.scheme == "wss"
+    port = parsed.port or (443 if secure else 80)
+    sock = socket.create_connection((parsed.hostname, port), timeout=timeout)
+    if secure:
+        sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        sock.sendall((
+            "GET {} HTTP/1.1\r\nHost: {}:{}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            "Sec-WebSocket-Key: {}\r\nSec-WebSocket-Version: 13\r\n\r\n".format(path, parsed.hostname, port, key)
+        ).encode())
+        response = b""
+        while b"\r\n\r\n" not in response:
+            response += _recv_exact(sock, 1)
+        if b" 101 " not in response.split(b"\r\n", 1)[0]:
+            raise ConnectionError("WebSocket 握手失败: {}".format(response.split(b"\r\n", 1)[0].decode()))
+
+        fragments = b""
+        while True:
+            b1, b2 = _recv_exact(sock, 2)
+            fin, opcode = b1 & 0x80, b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", _recv_exact(sock, 2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", _recv_exact(sock, 8))[0]
+            mask = _recv_exact(sock, 4) if b2 & 0x80 else None
+            payload = _recv_exact(sock, length) if length else b""
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            if opcode == 0x8:  # close
+                return
+            if opcode == 0x9:  # ping
+                _send_frame(sock, payload, 0xA)
+                continue
+            if opcode in (0x0, 0x1, 0x2):
+                fragments += payload
+                if fin:
+                    yield fragments.decode()
+                    fragments = b""
+    finally:
+        sock.close()
+
+
+def stream_klines(url):
+    """从WebSocket K线推送中筛选出已收盘的K线"""
+    for message in websocket_messages(url):
+        bar = parse_kline_event(message)
+        if bar is not None:
+            yield bar
+
+
+def run_live(bars, engine, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10, atr_std_multiplier=2.0,
+             state_path=None, save_every=100, on_verdict=None):
+    """
+    逐根消费已收盘K线，增量更新指标并给出每根K线的适用性结论。
+    on_verdict(metrics, latency_us) 在每根新K线处理完后调用；state_path 不为空时定期保存引擎状态。
+    返回处理的K线数量。
+    """
+    processed = 0
+    try:
+        for open_time, high, low, close in bars:
+            begin = time.perf_counter()
+            if not engine.update(open_time, high, low, close):
+                continue
+            metrics = engine.metrics(threshold_factor=threshold_factor, grid_step_percentage=grid_step_percentage,
+                                     max_grids=max_grids, atr_std_multiplier=atr_std_multiplier)
+            latency_us = (time.perf_counter() - begin) * 1e6
+            processed += 1
+            if on_verdict:
+                on_verdict(metrics, latency_us)
+            if state_path and processed % save_every == 0:
+                engine.save(state_path)
+    finally:
+        if state_path:
+            engine.save(state_path)
+    return processed
+
+
+def print_verdict(metrics, latency_us):
+    bar_time = pd.to_datetime(metrics['open_time'], unit='ms')
+    verdict = "适合" if metrics['suitable'] else "不适合"
+    trend = "上升" if metrics['trend'] == 'up' else "下降"
+    print(f"{bar_time} 收盘价: {metrics['current_price']:.4f} ATR: {metrics['latest_atr']:.4f} "
+          f"相对标准差: {metrics['relative_std']:.4f} 趋势: {trend} 网格策略: {verdict} "
+          f"推荐范围: {metrics['min_price']:.2f} - {metrics['max_price']:.2f} 耗时: {latency_us:.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='实时消费已收盘K线并逐根输出网格策略适用性')
+    parser.add_argument('--symbol', '-s', type=str, default='ETH/USDT', help='交易对符号，例如 "ETH" 或 "ETH/USDT"')
+    parser.add_argument('--interval', '-i', type=str, default='1m', help='K线时间间隔，例如 "1m"')
+    parser.add_argument('--replay', type=str, default=None, help='从本地 CSV 或 JSON Lines 文件回放K线')
+    parser.add_argument('--ws_url', type=str, default=None,
+                        help='WebSocket 地址，默认 wss://stream.binance.com:9443/ws/<symbol>@kline_<interval>')
+    parser.add_argument('--state', type=str, default=None, help='指标状态文件，存在时从中恢复，退出时写回')
+    parser.add_argument('--warmup_days', type=int, default=None, help='没有状态文件时，先用最近多少天的历史数据初始化指标')
+    parser.add_argument('--threshold_factor', '-t', type=float, default=1.0, help='判断网格策略适用性的阈值因子（相对标准差比例）。默认值为1.0')
+    parser.add_argument('--grid_step_percentage', '-g', type=float, default=1.0, help='推荐的网格步长百分比。默认值为1.0%')
+    parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
+    parser.add_argument('--atr_std_multiplier', '-a', type=float, default=1.0, help='ATR 阈值设定的标准差倍数。默认值为1.0')
+    args = parser.parse_args()
+
+    if args.state and os.path.exists(args.state):
+        engine = IndicatorEngine.load(args.state)
+        print(f"已从 {args.state} 恢复指标状态，共 {engine.bars} 根K线。")
+    elif args.warmup_days:
+        df = run_download(symbol=args.symbol, interval=args.interval, days=args.warmup_days, return_df=True)
+        engine = IndicatorEngine.from_frame(df)
+        print(f"已用最近 {args.warmup_days} 天的 {engine.bars} 根K线初始化指标。")
+    else:
+        engine = IndicatorEngine()
+
+    if args.replay:
+        bars = replay_klines(args.replay)
+    else:
+        symbol = args.symbol.upper()
+        symbol = symbol.replace("/", "") if "/" in symbol else f"{symbol}USDT"
+        url = args.ws_url or f"wss://stream.binance.com:9443/ws/{symbol.lower()}@kline_{args.interval}"
+        bars = stream_klines(url)
+
+    try:
+        run_live(bars, engine, threshold_factor=args.threshold_factor, grid_step_percentage=args.grid_step_percentage,
+                 max_grids=args.max_grids, atr_std_multiplier=args.atr_std_multiplier, state_path=args.state,
+                 on_verdict=print_verdict)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
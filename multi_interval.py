@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from grid_strategy import analyze_grid
+from indicator_engine import to_epoch_ms
+from kline_downloader import SUPPORT_INTERVAL, run_download
+from kline_resample import (DAY_MS, RESAMPLE_BASES, align_open_time, can_resample, ceil_open_time, interval_ms,
+                            next_open_time, resample_klines)
+
+DEFAULT_INTERVALS = ["15m", "1h", "4h"]
+COMPARE_COLUMNS = ['bars', 'suitable', 'relative_std', 'latest_atr', 'atr_pct', 'min_atr', 'max_atr', 'trend',
+                   'current_price', 'min_price', 'max_price', 'recommended_grids', 'grid_interval']
+
+
+def interval_sort_key(interval):
+    # 月K线长度不固定，排在最后
+    step = interval_ms(interval)
+    return step if step is not None else 31 * DAY_MS
+
+
+def common_base(intervals):
+    """
+    返回能够重采样出所有 intervals 的周期：最细的周期能聚合出其余周期时直接使用它，
+    否则使用能聚合出全部周期的最粗周期（例如 8h 和 12h 使用 4h）。
+    """
+    unknown = [i for i in intervals if i not in SUPPORT_INTERVAL]
+    if unknown:
+        raise ValueError("不支持的K线周期: {}".format("、".join(unknown)))
+    ordered = sorted(set(intervals), key=interval_sort_key)
+    finest = ordered[0]
+    if all(can_resample(finest, i) for i in ordered[1:]):
+        return finest
+    for base in reversed(RESAMPLE_BASES):
+        if all(can_resample(base, i) for i in ordered):
+            return base
+    raise ValueError("无法由同一个周期聚合出 {}".format("、".join(ordered)))
+
+
+def resample_complete(df, source, target, now_ms=None):
+    """
+    把 source 周期的K线聚合为 target 周期，丢弃开头不完整的K线；末尾不完整的K线如果是正在形成的K线则保留，
+    与交易所接口返回的结果一致，否则（结束日期在该K线中间）丢弃。
+    """
+    if len(df) == 0:
+        return df
+    now_ms = now_ms or int(time.time() * 1000)
+    open_time = to_epoch_ms(df['open_time'])
+    first = int(ceil_open_time(open_time[0], target))
+    df = df.iloc[int(np.searchsorted(open_time, first)):]
+    if len(df) == 0:
+        return df
+    out = resample_klines(df, target)
+    last_end = int(next_open_time(align_open_time(open_time[-1], target), target))
+    if int(next_open_time(open_time[-1], source)) < last_end <= now_ms:
+        out = out.iloc[:-1]
+    return out.reset_index(drop=True)
+
+
+def derive_intervals(df, base_interval, intervals, now_ms=None):
+    """
+    由 base_interval 的K线依次聚合出 intervals 中的各个周期，每个周期从已经得到的最粗的可用周期聚合，
+    例如 4h 由 1h 而不是 15m 聚合。返回 {周期: DataFrame}。
+    """
+    frames = {base_interval: df}
+    for target in sorted(set(intervals) - {base_interval}, key=interval_sort_key):
+        sources = sorted((s for s in frames if can_resample(s, target)), key=interval_sort_key)
+        if not sources:
+            raise ValueError("无法由 {} 聚合出 {}".format(base_interval, target))
+        frames[target] = resample_complete(frames[sources[-1]], sources[-1], target, now_ms)
+    return {interval: frames[interval] for interval in intervals}
+
+
+def analyze_intervals(df, base_interval, intervals, now_ms=None, **analysis_params):
+    """
+    用同一份 base_interval K线分析多个周期：先聚合出各周期，再依次用 analyze_grid 计算。
+    analysis_params 与 analyze_grid 相同。返回 {周期: (K线根数, GridAnalysisResult 或 None)}，没有完整K线的周期为 None。
+    """
+    with profiling.stage("resample", rows=len(df)):
+        frames = derive_intervals(df, base_interval, intervals, now_ms)
+    analyses = {}
+    with profiling.stage("analysis", rows=sum(len(frame) for frame in frames.values())):
+        for interval, frame in frames.items():
+            analyses[interval] = (len(frame), analyze_grid(frame, **analysis_params) if len(frame) else None)
+    return analyses
+
+
+def comparison_table(analyses):
+    """把 analyze_intervals 的结果汇总为按周期排列的对比表，atr_pct 为最新 ATR 占当前价格的百分比"""
+    rows = {}
+    for interval, (bars, result) in analyses.items():
+        row = {'bars': bars}
+        if result is not None:
+            row.update(result.to_dict())
+            row['atr_pct'] = result.latest_atr / result.current_price * 100 if result.current_price else float('nan')
+        rows[interval] = row
+    table = pd.DataFrame.from_dict(rows, orient='index').reindex(columns=COMPARE_COLUMNS)
+    table.index.name = 'interval'
+    return table
+
+
+def compare_intervals(symbol, intervals=DEFAULT_INTERVALS, start=None, end=None, days=None, concurrency=None,
+                      use_store=True, journal=False, archive=None, archive_verify=True, **analysis_params):
+    """
+    一次调用对比一个交易对在多个周期上的网格策略适用性：只下载（或从本地存储读取）一次最细的公共周期，
+    其余周期由它聚合得到。返回 (公共周期, 对比表)。
+    """
+    base = common_base(intervals)
+    df = run_download(symbol=symbol, interval=base, start=start, end=end, days=days, return_df=True,
+                      concurrency=concurrency, use_store=use_store, journal=journal, archive=archive,
+                      archive_verify=archive_verify)
+    return base, comparison_table(analyze_intervals(df, base, intervals, **analysis_params))
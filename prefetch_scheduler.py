@@ -0,0 +1,228 @@
+import argparse
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from grid_strategy import analyze_grid
+from kline_downloader import download_full_klines, normalize_symbol, RateLimiter, SUPPORT_INTERVAL
+from kline_resample import next_open_time
+from kline_store import KlineStore, DEFAULT_STORE_DIR
+from exchange_info import resolve_symbol
+
+DEFAULT_METRICS_PATH = os.path.join(os.path.dirname(DEFAULT_STORE_DIR) or ".", "warm_metrics.json")
+# K线收盘后稍等片刻再请求，交易所才会返回刚收盘的那一根
+SETTLE_SECONDS = 2.0
+# 判断预计算指标是否过期时，为调度抖动和更新耗时留出的余量
+STALE_GRACE_MS = 60 * 1000
+
+
+def watch_key(symbol, interval):
+    return "{}/{}".format(normalize_symbol(symbol).replace("/", ""), interval)
+
+
+class MetricsCache:
+    """预计算的适用性指标，保存在一个 JSON 文件中，键为 "ETHUSDT/1m"，写入时先写临时文件再替换"""
+
+    def __init__(self, path=DEFAULT_METRICS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def get(self, symbol, interval):
+        return self.load().get(watch_key(symbol, interval))
+
+    def put(self, symbol, interval, entry):
+        with self._lock:
+            data = self.load()
+            data[watch_key(symbol, interval)] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+def fresh_metrics(symbol, interval, days=None, params=None, path=DEFAULT_METRICS_PATH, now=None):
+    """
+    返回后台预取得到的指标：要求最后一根K线之后最多只有一根新收盘的K线，
+    且回溯天数和分析参数与请求一致（为 None 时不检查），否则返回 None。
+    """
+    entry = MetricsCache(path).get(symbol, interval)
+    if entry is None:
+        return None
+    if days is not None and entry["days"] != days:
+        return None
+    if params is not None and any(entry["params"].get(k) != v for k, v in params.items()):
+        return None
+    # 最后一根已收盘K线之后的那一根也收盘后，缓存就落后了
+    expires_ms = int(next_open_time(next_open_time(entry["last_open_time"], interval), interval)) + STALE_GRACE_MS
+    if int((now or time.time()) * 1000) > expires_ms:
+        return None
+    return entry
+
+
+class PrefetchScheduler:
+    """
+    让关注列表中的每个 交易对/周期 保持最新：每根K线收盘后（加上随机抖动）把新收盘的K线追加到本地存储，
+    并用最近 days 天的数据预先计算适用性指标。所有请求共享同一个 RateLimiter，只占用交易所每分钟
+    权重上限的 weight_ratio，给交互式使用留出余量；失败时按指数退避重试。
+    """
+
+    def __init__(self, watchlist, days=30, store=None, metrics=None, weight_ratio=0.5, jitter=5.0, workers=2,
+                 concurrency=2, backoff_base=5.0, backoff_max=300.0, base_url=None, analysis_params=None):
+        # 启动前按交易所信息校验交易对，拼写错误的关注项不会在后台反复失败重试
+        self.watchlist = [(resolve_symbol(symbol, base_url=base_url), interval) for symbol, interval in watchlist]
+        for _, interval in self.watchlist:
+            if interval not in SUPPORT_INTERVAL:
+                raise ValueError("interval {} is not support!!!".format(interval))
+        self.days = days
+        self.store = store or KlineStore()
+        self.metrics = metrics or MetricsCache()
+        self.limiter = RateLimiter(safety_ratio=weight_ratio)
+        self.jitter = jitter
+        self.workers = workers
+        self.concurrency = concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.base_url = base_url
+        self.analysis_params = analysis_params or {}
+        self.failures = {}
+        self.stats = {"updates": 0, "errors": 0}
+        self._stop = threading.Event()
+
+    def next_due(self, interval, now=None):
+        """下一根K线收盘的时间（秒），加上等待交易所落盘的时间和随机抖动，避免所有交易对同时请求"""
+        now_ms = int((now or time.time()) * 1000)
+        return int(next_open_time(now_ms, interval)) / 1000 + SETTLE_SECONDS + random.uniform(0, self.jitter)
+
+    def backoff_delay(self, failures):
+        delay = min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1.5)
+
+    def update(self, symbol, interval):
+        """追加新收盘的K线并重新计算指标，返回写入指标缓存的条目"""
+        start = (datetime.now() - timedelta(days=self.days)).strftime("%Y-%m-%d")
+        df = download_full_klines(symbol, interval, start, return_df=True, concurrency=self.concurrency,
+                                  base_url=self.base_url, store=self.store, limiter=self.limiter)
+        result = analyze_grid(df, **self.analysis_params)
+        entry = {
+            "symbol": symbol,
+            "interval": interval,
+            "days": self.days,
+            "rows": len(df),
+            "last_open_time": int(df["open_time"].iloc[-1].value // 10 ** 6),
+            "updated_at": time.time(),
+            "params": result.params,
+            "grid_prices": [float(p) for p in result.grid_prices],
+            "metrics": result.to_dict(),
+        }
+        self.metrics.put(symbol, interval, entry)
+        return entry
+
+    def _run_task(self, symbol, interval):
+        key = (symbol, interval)
+        try:
+            entry = self.update(symbol, interval)
+        except Exception as e:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            self.stats["errors"] += 1
+            delay = self.backoff_delay(self.failures[key])
+            print(f"[{datetime.now():%H:%M:%S}] {symbol} {interval} 更新失败（第 {self.failures[key]} 次）: {e}，"
+                  f"{delay:.1f} 秒后重试")
+            return time.time() + delay
+        self.failures.pop(key, None)
+        self.stats["updates"] += 1
+        verdict = "适合" if entry["metrics"]["suitable"] else "不适合"
+        print(f"[{datetime.now():%H:%M:%S}] {symbol} {interval} 已更新 {entry['rows']} 根K线，网格策略: {verdict}")
+        return self.next_due(interval)
+
+    def run(self, duration=None):
+        """
+        运行调度循环，直到调用 stop() 或经过 duration 秒。启动时立即预热所有关注项，
+        之后每个关注项在各自周期的K线收盘后更新。
+        """
+        deadline = time.time() + duration if duration else None
+        queue = [(time.time() + random.uniform(0, min(self.jitter, 1.0)), symbol, interval)
+                 for symbol, interval in self.watchlist]
+        heapq.heapify(queue)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while not self._stop.is_set():
+                now = time.time()
+                if deadline and now >= deadline:
+                    break
+                while queue and queue[0][0] <= now:
+                    _, symbol, interval = heapq.heappop(queue)
+                    running[executor.submit(self._run_task, symbol, interval)] = (symbol, interval)
+                for future in [f for f in running if f.done()]:
+                    symbol, interval = running.pop(future)
+                    heapq.heappush(queue, (future.result(), symbol, interval))
+                # 有任务在运行时频繁检查完成情况，否则睡到下一个任务到期（最多 1 秒，以便及时响应 stop）
+                wait = 0.05 if running else (queue[0][0] - now if queue else 1.0)
+                if deadline:
+                    wait = min(wait, deadline - now)
+                self._stop.wait(min(max(wait, 0.0), 1.0))
+            for future in running:
+                future.cancel()
+
+    def stop(self):
+        self._stop.set()
+
+
+def parse_watch(items):
+    """把 "ETH:1m"、"BTC/USDT:15m" 形式的字符串解析为 (交易对, 周期) 列表"""
+    watchlist = []
+    for item in items:
+        symbol, _, interval = item.rpartition(":")
+        if not symbol:
+            raise ValueError("关注项格式应为 交易对:周期，例如 ETH:1m，实际为 {}".format(item))
+        watchlist.append((symbol, interval))
+    return watchlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后台预取关注列表中的K线并预先计算网格策略指标')
+    parser.add_argument('--watch', type=str, nargs='+', required=True, help='关注的 交易对:周期，例如 ETH:1m BTC/USDT:15m')
+    parser.add_argument('--days', '-d', type=int, default=30, help='保持最近多少天的数据并用于计算指标')
+    parser.add_argument('--workers', type=int, default=2, help='同时更新的关注项数量')
+    parser.add_argument('--concurrency', '-c', type=int, default=2, help='每个关注项的并发请求数')
+    parser.add_argument('--weight_ratio', type=float, default=0.5, help='最多使用每分钟请求权重上限的比例。默认值为0.5')
+    parser.add_argument('--jitter', type=float, default=5.0, help='每次调度的随机延迟上限（秒）')
+    parser.add_argument('--metrics', type=str, default=DEFAULT_METRICS_PATH, help='预计算指标的保存路径')
+    parser.add_argument('--threshold_factor', '-t', type=float, default=1.0, help='判断网格策略适用性的阈值因子（相对标准差比例）。默认值为1.0')
+    parser.add_argument('--grid_step_percentage', '-g', type=float, default=1.0, help='推荐的网格步长百分比。默认值为1.0%')
+    parser.add_argument('--max_grids', '-x', type=int, default=99, help='推荐的最大网格数量。默认值为99格')
+    parser.add_argument('--atr_std_multiplier', '-a', type=float, default=1.0, help='ATR 阈值设定的标准差倍数。默认值为1.0')
+    args = parser.parse_args()
+
+    try:
+        scheduler = PrefetchScheduler(
+            parse_watch(args.watch), days=args.days, metrics=MetricsCache(args.metrics),
+            weight_ratio=args.weight_ratio, jitter=args.jitter, workers=args.workers, concurrency=args.concurrency,
+            analysis_params={
+                'threshold_factor': args.threshold_factor,
+                'grid_step_percentage': args.grid_step_percentage,
+                'max_grids': args.max_grids,
+                'atr_std_multiplier': args.atr_std_multiplier,
+            })
+    except ValueError as ve:
+        print(f"参数错误: {ve}")
+        return
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    main()
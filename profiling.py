@@ -0,0 +1,203 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# 当前上下文生效的 RunProfile，为 None 时所有记录函数都直接返回，几乎没有开销。
+# 每个线程（Streamlit 会话、后台下载线程）有各自的上下文，互不干扰；提交到线程池的任务用 submit() 继承提交时的上下文
+_active = contextvars.ContextVar("run_profile", default=None)
+
+
+class RunProfile:
+    """
+    记录一次下载+分析运行中各阶段的耗时，以及 HTTP 请求数、接收字节数、单次请求延迟、
+    重试次数、限速权重和等待时间。每个线程有各自的阶段栈，阶段和请求统计都可由多个线程同时写入。
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._local = threading.local()
+        self.latencies = []
+        self.bytes_received = 0
+        self.status_counts = {}
+        self.retries = 0
+        self.max_used_weight = 0
+        self.sleep_seconds = 0.0
+        self.rate_limit_wait_seconds = 0.0
+        self.started_at = time.time()
+        self._begin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """记录一个阶段；阶段可以嵌套，self_seconds 为扣除内层阶段后的耗时"""
+        stack = self._stack()
+        begin = time.perf_counter()
+        stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            child = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'rows': None})
+                entry['calls'] += 1
+                entry['seconds'] += elapsed
+                entry['self_seconds'] += elapsed - child
+                if rows is not None:
+                    entry['rows'] = (entry['rows'] or 0) + rows
+
+    def _stack(self):
+        # 嵌套关系只在同一个线程内有意义，各线程的阶段栈分开保存
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def set_rows(self, name, rows):
+        """阶段开始时还不知道行数（例如解析）时，在结束后补记"""
+        with self._lock:
+            if name in self.stages:
+                self.stages[name]['rows'] = (self.stages[name]['rows'] or 0) + rows
+
+    def record_request(self, latency, nbytes, status, used_weight=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.bytes_received += nbytes
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if used_weight is not None:
+                self.max_used_weight = max(self.max_used_weight, used_weight)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_sleep(self, seconds):
+        with self._lock:
+            self.sleep_seconds += seconds
+
+    def record_rate_limit_wait(self, seconds):
+        with self._lock:
+            self.rate_limit_wait_seconds += seconds
+
+    def summary(self):
+        """返回可直接 json 序列化的统计结果"""
+        with self._lock:
+            latencies = np.asarray(self.latencies) * 1000
+            entries = {name: dict(entry) for name, entry in self.stages.items()}
+        percentiles = {}
+        if len(latencies):
+            for p in (50, 90, 99):
+                percentiles[f'p{p}'] = float(np.percentile(latencies, p))
+            percentiles['max'] = float(latencies.max())
+        stages = {}
+        for name, stage in entries.items():
+            if stage['rows'] and stage['seconds'] > 0:
+                stage['rows_per_sec'] = stage['rows'] / stage['seconds']
+            stages[name] = stage
+        return {
+            'started_at': self.started_at,
+            'total_seconds': time.perf_counter() - self._begin,
+            'stages': stages,
+            'requests': {
+                'count': len(self.latencies),
+                'bytes_received': self.bytes_received,
+                'status_counts': {str(k): v for k, v in sorted(self.status_counts.items())},
+                'retries': self.retries,
+                'latency_ms': percentiles,
+                'max_used_weight_1m': self.max_used_weight,
+                'sleep_seconds': self.sleep_seconds,
+                'rate_limit_wait_seconds': self.rate_limit_wait_seconds,
+            },
+        }
+
+    def report_lines(self):
+        """生成中文的文字报告，CLI 和 Streamlit 共用"""
+        summary = self.summary()
+        lines = [f"总耗时: {summary['total_seconds']:.3f} 秒"]
+        for name, stage in summary['stages'].items():
+            line = f"  {name:<12} {stage['seconds']:>8.3f} 秒 (自身 {stage['self_seconds']:.3f} 秒, {stage['calls']} 次)"
+            if 'rows_per_sec' in stage:
+                line += f" {stage['rows']:,} 行, {stage['rows_per_sec']:,.0f} 行/秒"
+            lines.append(line)
+        req = summary['requests']
+        if req['count']:
+            lat = req['latency_ms']
+            lines.append(f"HTTP 请求: {req['count']} 次, 接收 {req['bytes_received'] / 1024 / 1024:.2f} MB, "
+                         f"状态码 {req['status_counts']}, 重试 {req['retries']} 次")
+            lines.append(f"请求延迟: p50 {lat['p50']:.1f} ms, p90 {lat['p90']:.1f} ms, p99 {lat['p99']:.1f} ms, "
+                         f"最大 {lat['max']:.1f} ms")
+            lines.append(f"限速权重峰值: {req['max_used_weight_1m']}, 限速等待 {req['rate_limit_wait_seconds']:.3f} 秒, "
+                         f"请求间隔休眠 {req['sleep_seconds']:.3f} 秒")
+        return lines
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+
+
+def get_profile():
+    return _active.get()
+
+
+@contextmanager
+def profiling(profile=None):
+    """在当前上下文的 with 块内启用性能记录，返回 RunProfile；嵌套使用时恢复外层的记录器"""
+    profile = profile or RunProfile()
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """把任务提交到线程池，任务在提交时上下文的副本中运行，工作线程的请求统计记入同一个 RunProfile"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextmanager
+def stage(name, rows=None):
+    """未启用性能记录时为空操作的阶段计时"""
+    profile = _active.get()
+    if profile is None:
+        yield
+        return
+    with profile.stage(name, rows):
+        yield
+
+
+def record_request(latency, resp):
+    profile = _active.get()
+    if profile is not None:
+        used = resp.headers.get("X-MBX-USED-WEIGHT-1M")
+        profile.record_request(latency, len(resp.content), resp.status_code, int(used) if used else None)
+
+
+def record_retry():
+    profile = _active.get()
+    if profile is not None:
+        profile.record_retry()
+
+
+def record_sleep(seconds):
+    profile = _active.get()
+    if profile is not None:
+        profile.record_sleep(seconds)
+
+
+def record_rate_limit_wait(seconds):
+    profile = _active.get()
+    if profile is not None:
+        profile.record_rate_limit_wait(seconds)
+
+
+def set_rows(name, rows):
+    profile = _active.get()
+    if profile is not None:
+        profile.set_rows(name, rows)
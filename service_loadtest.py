@@ -0,0 +1,137 @@
+import argparse
+import json
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from analysis_service import AnalysisService, ServiceServer
+from kline_store import KlineStore
+from shared_klines import SharedKlineCache
+from stub_exchange import StubExchange
+
+DEFAULT_SYMBOLS = ["ETH", "BTC", "SOL", "BNB"]
+DEFAULT_INTERVALS = ["15m", "1h"]
+
+
+def build_requests(total, distinct, symbols=DEFAULT_SYMBOLS, intervals=DEFAULT_INTERVALS, days=30, compare_ratio=0.0,
+                   seed=0):
+    """
+    生成 total 个请求（(接口, 参数) 列表），其中只有 distinct 种不同的请求，
+    重复的请求用来检验请求合并和结果缓存；compare_ratio 为多周期对比请求的比例。
+    """
+    rng = random.Random(seed)
+    variants = []
+    for i in range(distinct):
+        params = {'symbol': symbols[i % len(symbols)], 'days': days,
+                  'threshold_factor': round(1.0 + 0.1 * (i // (len(symbols) * len(intervals))), 2)}
+        if rng.random() < compare_ratio:
+            variants.append(("/compare", dict(params, intervals=",".join(intervals))))
+        else:
+            variants.append(("/analyze", dict(params, interval=intervals[(i // len(symbols)) % len(intervals)])))
+    return [variants[rng.randrange(len(variants))] for _ in range(total)]
+
+
+def run_load_test(url, request_list, concurrency=16):
+    """以 concurrency 个并发客户端发送请求，返回吞吐量、延迟分位数、状态码、来源统计和服务端的 /metrics"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def send(item):
+        endpoint, params = item
+        begin = time.perf_counter()
+        try:
+            resp = session.get(url + endpoint, params=params, timeout=300)
+            source = resp.json().get('source') if resp.ok else None
+            status = resp.status_code
+        except requests.RequestException:
+            status, source = None, None
+        return time.perf_counter() - begin, status, source
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, request_list))
+    elapsed = time.perf_counter() - begin
+    session.close()
+
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses, sources = {}, {}
+    for _, status, source in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if source:
+            sources[source] = sources.get(source, 0) + 1
+    return {
+        'requests': len(results),
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'throughput_rps': len(results) / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {f'p{p}': float(np.percentile(latencies, p)) for p in (50, 90, 99)} | {'max': float(latencies.max())},
+        'status_counts': statuses,
+        'sources': sources,
+        'server': requests.get(url + "/metrics").json(),
+    }
+
+
+def report_lines(summary):
+    lat = summary['latency_ms']
+    server = summary['server']
+    return [
+        f"请求 {summary['requests']} 个，并发 {summary['concurrency']}，耗时 {summary['seconds']:.2f} 秒，"
+        f"吞吐量 {summary['throughput_rps']:.1f} 请求/秒",
+        f"延迟: p50 {lat['p50']:.1f} ms, p90 {lat['p90']:.1f} ms, p99 {lat['p99']:.1f} ms, 最大 {lat['max']:.1f} ms",
+        f"状态码 {summary['status_counts']}，结果来源 {summary['sources']}",
+        f"服务端: 实际计算 {server['computations']} 次，合并 {server['coalesced']} 次，结果缓存命中 "
+        f"{server['result_cache_hits']} 次，下载数据 {server['data_loads']} 次，数据缓存命中 {server['data_cache_hits']} 次",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对网格策略分析服务做压力测试')
+    parser.add_argument('--url', type=str, default=None,
+                        help='已启动的分析服务地址；不指定时在本进程内启动模拟交易所和分析服务')
+    parser.add_argument('--requests', '-n', type=int, default=500, help='请求总数')
+    parser.add_argument('--distinct', type=int, default=16, help='不同请求的种数，其余为重复请求')
+    parser.add_argument('--concurrency', '-c', type=int, default=32, help='并发客户端数')
+    parser.add_argument('--days', '-d', type=int, default=30, help='每个请求分析最近多少天的数据')
+    parser.add_argument('--compare_ratio', type=float, default=0.0, help='多周期对比请求的比例')
+    parser.add_argument('--workers', '-w', type=int, default=4, help='本进程内启动服务时的分析线程数')
+    parser.add_argument('--latency', type=float, default=0.05, help='本进程内模拟交易所每个请求的延迟（秒）')
+    parser.add_argument('--rounds', type=int, default=2,
+                        help='重复压测的轮数，第一轮包含下载，之后的轮次反映缓存命中时的吞吐量')
+    parser.add_argument('--save_to', '-o', type=str, default=None, help='把各轮结果保存为 JSON 文件')
+    args = parser.parse_args()
+
+    request_list = build_requests(args.requests, args.distinct, days=args.days, compare_ratio=args.compare_ratio)
+    summaries = []
+
+    def run_rounds(url):
+        for i in range(args.rounds):
+            summary = run_load_test(url, request_list, concurrency=args.concurrency)
+            summaries.append(summary)
+            print(f"\n第 {i + 1} 轮:")
+            for line in report_lines(summary):
+                print(line)
+
+    if args.url:
+        run_rounds(args.url.rstrip("/"))
+    else:
+        # 模拟交易所的合成数据只写入临时目录，不会被真实的服务挂载
+        with tempfile.TemporaryDirectory() as store_dir, tempfile.TemporaryDirectory() as shared_dir, \
+                StubExchange(latency=args.latency) as exchange:
+            service = AnalysisService(workers=args.workers, base_url=exchange.base_url, store=KlineStore(store_dir),
+                                      shared=SharedKlineCache(shared_dir))
+            with ServiceServer(service) as server:
+                run_rounds(server.url)
+
+    if args.save_to:
+        with open(args.save_to, 'w') as f:
+            json.dump(summaries, f, indent=2, ensure_ascii=False)
+        print(f"结果已保存至 {args.save_to}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from indicator_engine import to_epoch_ms
+from kline_store import DEFAULT_STORE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只在进程内加锁
+    fcntl = None
+
+SHARED_COLUMNS = ["open_time", "open", "high", "low", "close", "volume"]
+# 优先放在内存文件系统中，映射后的页面由所有进程共享；没有 /dev/shm 时放在数据目录下，由页缓存共享
+DEFAULT_SHARED_DIR = os.getenv("SHARED_KLINES_DIR") or (
+    "/dev/shm/strategy_streamlit" if os.path.isdir("/dev/shm")
+    else os.path.join(os.path.dirname(DEFAULT_STORE_DIR) or ".", "shared"))
+DEFAULT_MEMORY_CAP_MB = int(os.getenv("SHARED_KLINES_CAP_MB") or 2048)
+# 结束日期为今天的数据集在发布该秒数后不再被新的会话使用，改为重新下载
+DEFAULT_FRESH_SECONDS = 300
+META_FILE = "meta.json"
+LEASE_DIR = "leases"
+LOCK_FILE = ".lock"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 没有权限发送信号说明进程存在；Windows 上无法判断时按存活处理
+        return True
+    return True
+
+
+def _remove_lease(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def dataset_name(key):
+    """(symbol, interval, start, end) 对应的目录名前缀"""
+    symbol, interval, start, end = key
+    return "{}_{}_{}_{}".format(symbol.replace("/", "-"), interval, start, end)
+
+
+class SharedDataset:
+    """
+    已发布数据集的只读句柄：各列是 np.load(mmap_mode='r') 得到的内存映射数组，多个会话和进程映射同一个文件，
+    不复制数据。持有句柄期间数据集不会被淘汰；release() 或句柄被回收时释放引用。
+    """
+
+    def __init__(self, key, path, meta, lease_path):
+        self.key = key
+        self.path = path
+        self.meta = meta
+        self.arrays = {col: np.load(os.path.join(path, col + ".npy"), mmap_mode="r") for col in meta["columns"]}
+        self._lease_path = lease_path
+        self._finalizer = weakref.finalize(self, _remove_lease, lease_path)
+
+    @property
+    def rows(self):
+        return self.meta["rows"]
+
+    @property
+    def nbytes(self):
+        return self.meta["nbytes"]
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def frame(self):
+        """返回不复制数据的 DataFrame，open_time 为 datetime64[ms]，与下载结果的列一致"""
+        columns = {}
+        for col, values in self.arrays.items():
+            columns[col] = values.view("datetime64[ms]") if col == "open_time" else values
+        return pd.DataFrame(columns, copy=False)
+
+    def release(self):
+        self._finalizer()
+
+
+class SharedKlineCache:
+    """
+    跨 Streamlit 会话和工作进程共享的K线数据层。解码后的各列只发布一次（每列一个 .npy 文件），
+    之后按 (symbol, interval, start, end) 以内存映射方式只读挂载，不复制数据。
+    每个挂载在数据集目录的 leases/ 下留一个租约文件，进程退出后残留的租约按进程号清理；
+    总大小超过 memory_cap_mb 时按最近使用时间淘汰没有租约的数据集。
+    """
+
+    def __init__(self, root=DEFAULT_SHARED_DIR, memory_cap_mb=DEFAULT_MEMORY_CAP_MB,
+                 fresh_seconds=DEFAULT_FRESH_SECONDS):
+        self.root = root
+        self.memory_cap_bytes = int(memory_cap_mb * 1024 * 1024)
+        self.fresh_seconds = fresh_seconds
+        self._thread_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _lock(self):
+        # 进程内用线程锁，进程间用文件锁
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.root, LOCK_FILE), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _datasets(self):
+        """所有已发布数据集的 (目录, meta)，包括同一个键的旧版本"""
+        result = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            meta_path = os.path.join(path, META_FILE)
+            if "@" not in name or not os.path.exists(meta_path):
+                continue
+            with open(meta_path) as f:
+                result.append((path, json.load(f)))
+        return result
+
+    def _is_fresh(self, meta):
+        # 历史区间不会变化；结束日期为今天的数据集只在发布后的一段时间内使用
+        if meta["end"] < datetime.now().strftime("%Y-%m-%d"):
+            return True
+        return time.time() - meta["created_at"] <= self.fresh_seconds
+
+    def _leases(self, path):
+        """数据集当前有效的租约数，顺便删除已退出进程留下的租约"""
+        lease_dir = os.path.join(path, LEASE_DIR)
+        count = 0
+        for name in os.listdir(lease_dir) if os.path.isdir(lease_dir) else []:
+            pid = int(name.split("-", 1)[0])
+            if _pid_alive(pid):
+                count += 1
+            else:
+                _remove_lease(os.path.join(lease_dir, name))
+        return count
+
+    def _find(self, key):
+        prefix = dataset_name(key) + "@"
+        candidates = [(meta["created_at"], path, meta) for path, meta in self._datasets()
+                      if os.path.basename(path).startswith(prefix) and self._is_fresh(meta)]
+        if not candidates:
+            return None
+        _, path, meta = max(candidates, key=lambda item: item[0])
+        return path, meta
+
+    def _attach(self, key, path, meta):
+        lease_dir = os.path.join(path, LEASE_DIR)
+        os.makedirs(lease_dir, exist_ok=True)
+        lease_path = os.path.join(lease_dir, "{}-{}".format(os.getpid(), uuid.uuid4().hex))
+        open(lease_path, "w").close()
+        # 以 meta.json 的修改时间记录最近使用时间，供 LRU 淘汰使用
+        os.utime(os.path.join(path, META_FILE))
+        return SharedDataset(key, path, meta, lease_path)
+
+    def attach(self, key):
+        """挂载已发布的数据集，不存在或已过期时返回 None"""
+        with self._lock():
+            found = self._find(tuple(key))
+            if found is None:
+                return None
+            return self._attach(tuple(key), *found)
+
+    def publish(self, key, df):
+        """
+        发布 DataFrame 的 OHLCV 列并返回挂载的句柄。先写入临时目录再整体改名，其他进程不会看到写了一半的数据集；
+        其他会话已经发布了同一个键时直接挂载已有的数据集。
+        """
+        key = tuple(key)
+        existing = self.attach(key)
+        if existing is not None:
+            return existing
+        created_at = time.time()
+        tmp_path = os.path.join(self.root, ".tmp-{}-{}".format(os.getpid(), uuid.uuid4().hex))
+        os.makedirs(tmp_path)
+        try:
+            nbytes = 0
+            for col in SHARED_COLUMNS:
+                values = to_epoch_ms(df[col]) if col == "open_time" else df[col].to_numpy(dtype=np.float64)
+                np.save(os.path.join(tmp_path, col + ".npy"), np.ascontiguousarray(values))
+                nbytes += values.nbytes
+            symbol, interval, start, end = key
+            meta = {"symbol": symbol, "interval": interval, "start": start, "end": end, "rows": len(df),
+                    "columns": SHARED_COLUMNS, "nbytes": nbytes, "created_at": created_at}
+            with open(os.path.join(tmp_path, META_FILE), "w") as f:
+                json.dump(meta, f)
+            with self._lock():
+                found = self._find(key)
+                if found is not None:
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    return self._attach(key, *found)
+                path = os.path.join(self.root, "{}@{}".format(dataset_name(key), int(created_at * 1000)))
+                os.rename(tmp_path, path)
+                handle = self._attach(key, path, meta)
+                self._evict()
+                return handle
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+    def _evict(self):
+        """删除没有租约的过期版本，再按最近使用时间淘汰没有租约的数据集，直到总大小不超过上限"""
+        for name in os.listdir(self.root):
+            # 写入过程中退出的进程留下的临时目录
+            if name.startswith(".tmp-") and not _pid_alive(int(name.split("-")[1])):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        entries = []
+        total = 0
+        for path, meta in self._datasets():
+            last_used = os.path.getmtime(os.path.join(path, META_FILE))
+            leases = self._leases(path)
+            if not leases and not self._is_fresh(meta):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((last_used, path, meta, leases))
+            total += meta["nbytes"]
+        for last_used, path, meta, leases in sorted(entries, key=lambda item: item[0]):
+            if total <= self.memory_cap_bytes:
+                break
+            if leases:
+                # 仍在使用的数据集不淘汰，总大小可能暂时超过上限
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= meta["nbytes"]
+
+    def evict(self):
+        with self._lock():
+            self._evict()
+
+    def stats(self):
+        """各数据集的行数、大小、租约数和最近使用时间，按最近使用排列"""
+        with self._lock():
+            rows = []
+            for path, meta in self._datasets():
+                rows.append({
+                    "symbol": meta["symbol"], "interval": meta["interval"], "start": meta["start"], "end": meta["end"],
+                    "rows": meta["rows"], "mb": meta["nbytes"] / 1024 / 1024, "leases": self._leases(path),
+                    "fresh": self._is_fresh(meta),
+                    "last_used": pd.to_datetime(os.path.getmtime(os.path.join(path, META_FILE)), unit="s"),
+                })
+        if not rows:
+            return pd.DataFrame(rows)
+        return pd.DataFrame(rows).sort_values("last_used", ascending=False, ignore_index=True)
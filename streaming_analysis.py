@@ -0,0 +1,109 @@
+import numpy as np
+
+import profiling
+from grid_strategy import GridAnalysisResult
+from indicator_engine import IndicatorEngine
+from kline_downloader import (fetch_kline_batches, klines_to_frame, get_start_end_ts, split_time_range,
+                              interval_to_seconds, closed_end_ms, make_gap_fetcher, REQ_LIMIT,
+                              SUPPORT_INTERVAL)
+from kline_store import KlineStore
+from exchange_info import resolve_symbol
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+# 每根K线在流水线中同时存在的各种形式的估算字节数：原始响应约 150 字节，解析矩阵 96 字节，
+# DataFrame 80 字节，TR/ATR/EMA 等分析中间数组约 120 字节，再留出一倍余量
+BYTES_PER_ROW = 900
+
+
+def chunk_rows_for_budget(memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """按内存预算计算每块K线的行数，取 REQ_LIMIT 的整数倍，使每块恰好由若干个完整请求组成"""
+    rows = int(memory_budget_mb * 1024 * 1024 // BYTES_PER_ROW)
+    return max(REQ_LIMIT, rows // REQ_LIMIT * REQ_LIMIT)
+
+
+def iter_kline_chunks(symbol, interval, start, end=None, chunk_rows=None, use_store=True, store=None,
+                      concurrency=None, base_url=None, limiter=None, progress=True):
+    """
+    按时间顺序逐块返回 [start, end] 内的K线（open_time 为毫秒时间戳的 DataFrame），每块最多 chunk_rows 行。
+    每块单独下载（或从本地存储读取、补齐缺口）、解析后交给调用方，之前的块不再被引用，
+    因此峰值内存只与块大小有关，与总时间跨度无关。
+    """
+    if interval not in SUPPORT_INTERVAL:
+        raise Exception("interval {} is not support!!!".format(interval))
+    chunk_rows = chunk_rows or chunk_rows_for_budget()
+    start_ts, end_ts = get_start_end_ts(start, end)
+    window = chunk_rows * interval_to_seconds(interval)
+    if use_store:
+        store = store or KlineStore()
+        fetch_gap = make_gap_fetcher(symbol, interval, store, concurrency=concurrency, base_url=base_url,
+                                     limiter=limiter, progress=progress)
+        end_ms = closed_end_ms(end_ts, interval)
+
+    window_start = start_ts
+    while window_start <= end_ts:
+        window_end = min(window_start + window - 1, end_ts)
+        if use_store:
+            lo, hi = window_start * 1000, min((window_end + 1) * 1000, end_ms)
+            if lo >= hi:
+                break
+            with profiling.stage("store"):
+                df = store.load(symbol, interval, lo, hi, fetch_gap)
+        else:
+            pairs = split_time_range(window_start, window_end, interval)
+            with profiling.stage("fetch"):
+                payloads = fetch_kline_batches(symbol, interval, pairs, concurrency=concurrency, base_url=base_url,
+                                               limiter=limiter, progress=progress)
+            df = klines_to_frame(payloads)
+            del payloads
+        if len(df):
+            yield df
+        window_start = window_end + 1
+
+
+def analyze_chunks(chunks, threshold_factor=1.0, grid_step_percentage=1.0, max_grids=10, atr_period=14,
+                   atr_std_multiplier=2.0, macd_fast=12, macd_slow=26, macd_signal=9):
+    """
+    依次消费按时间排序的K线块（包含 open_time、high、low、close 列的 DataFrame），
+    用 IndicatorEngine.update_chunk 跨块延续指标状态，返回与 analyze_grid 相同的 GridAnalysisResult。
+    """
+    engine = IndicatorEngine(atr_period=atr_period, macd_fast=macd_fast, macd_slow=macd_slow,
+                             macd_signal=macd_signal)
+    for df in chunks:
+        with profiling.stage("analysis", rows=len(df)):
+            open_time = df["open_time"]
+            if not np.issubdtype(open_time.dtype, np.integer):
+                open_time = open_time.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+            engine.update_chunk(open_time, df["high"].to_numpy(), df["low"].to_numpy(), df["close"].to_numpy())
+    if engine.bars == 0:
+        raise ValueError("没有K线数据")
+
+    metrics = engine.metrics(threshold_factor=threshold_factor, grid_step_percentage=grid_step_percentage,
+                             max_grids=max_grids, atr_std_multiplier=atr_std_multiplier)
+    metrics.pop("open_time")
+    grid_prices = metrics["min_price"] + np.arange(metrics["recommended_grids"] + 1) * metrics["grid_interval"]
+    return GridAnalysisResult(
+        grid_prices=grid_prices,
+        params={
+            'threshold_factor': threshold_factor,
+            'grid_step_percentage': grid_step_percentage,
+            'max_grids': max_grids,
+            'atr_period': atr_period,
+            'atr_std_multiplier': atr_std_multiplier,
+            'macd_fast': macd_fast,
+            'macd_slow': macd_slow,
+            'macd_signal': macd_signal,
+        },
+        **metrics
+    )
+
+
+def analyze_grid_streaming(symbol, interval, start, end=None, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                           use_store=True, store=None, concurrency=None, base_url=None, **analysis_params):
+    """
+    以有界内存分析多年的K线：按内存预算切块，下载、解析、存储和分析在块之间流水进行，
+    结果与先下载全部数据再调用 analyze_grid 一致。
+    """
+    chunks = iter_kline_chunks(resolve_symbol(symbol, base_url=base_url), interval, start, end,
+                               chunk_rows=chunk_rows_for_budget(memory_budget_mb), use_store=use_store, store=store,
+                               concurrency=concurrency, base_url=base_url)
+    return analyze_chunks(chunks, **analysis_params)
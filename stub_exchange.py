@@ -0,0 +1,462 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import socket
+import socketserver
+import struct
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from kline_downloader import interval_to_seconds, REQ_LIMIT, KLINES_REQ_WEIGHT, WEIGHT_LIMIT_1M
+from kline_resample import ceil_open_time, next_open_time
+
+
+def synthetic_kline_columns(start_ms, count, interval_ms, open_time=None, close_time=None):
+    """
+    生成确定性的合成K线（币安格式的各列），同一 open_time 总是得到同样的价格，
+    以便分段下载后拼接的结果可以和一次性生成的结果比对。
+    周线、月线等边界不在 interval_ms 整数倍上的K线可直接传入 open_time 和 close_time。
+    """
+    if open_time is None:
+        open_time = start_ms + np.arange(count, dtype=np.int64) * interval_ms
+    if close_time is None:
+        close_time = open_time + interval_ms - 1
+    step = (open_time // interval_ms).astype(np.float64)
+    close = 100.0 + 10.0 * np.sin(step / 500.0) + 2.0 * np.sin(step / 37.0) + 0.5 * np.sin(step * 1.7)
+    open_ = 100.0 + 10.0 * np.sin((step - 1) / 500.0) + 2.0 * np.sin((step - 1) / 37.0) + 0.5 * np.sin((step - 1) * 1.7)
+    spread = 0.2 + 0.1 * np.abs(np.sin(step * 0.31))
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = 10.0 + 5.0 * np.abs(np.sin(step * 0.13))
+    trade_cnt = (50 + 40 * np.abs(np.sin(step * 0.07))).astype(np.int64)
+    return {
+        "open_time": open_time,
+        "open": np.round(open_, 8),
+        "high": np.round(high, 8),
+        "low": np.round(low, 8),
+        "close": np.round(close, 8),
+        "volume": np.round(volume, 8),
+        "close_time": close_time,
+        "value": np.round(volume * close, 8),
+        "trade_cnt": trade_cnt,
+        "active_buy_volume": np.round(volume * 0.5, 8),
+        "active_buy_value": np.round(volume * close * 0.5, 8),
+    }
+
+
+def synthetic_klines(start_ms, end_ms, interval_ms, limit=REQ_LIMIT, interval=None):
+    """
+    按 /api/v3/klines 的响应格式返回 [start_ms, end_ms] 内最多 limit 根合成K线。
+    传入 interval 时按币安的规则对齐周线（周一开始）和月线（每月 1 日开始）的边界。
+    """
+    if interval is not None and interval[-1] in "wM":
+        open_time = []
+        cur = int(ceil_open_time(start_ms, interval))
+        while cur <= end_ms and len(open_time) < limit:
+            open_time.append(cur)
+            cur = int(next_open_time(cur, interval))
+        if not open_time:
+            return []
+        open_time = np.array(open_time, dtype=np.int64)
+        close_time = next_open_time(open_time, interval) - 1
+        cols = synthetic_kline_columns(0, len(open_time), interval_ms, open_time=open_time, close_time=close_time)
+        count = len(open_time)
+    else:
+        # 与币安一致：open_time 对齐到周期边界
+        first = -(-start_ms // interval_ms) * interval_ms
+        if end_ms < first:
+            return []
+        count = min(limit, (end_ms - first) // interval_ms + 1)
+        cols = synthetic_kline_columns(first, count, interval_ms)
+    rows = []
+    for i in range(count):
+        rows.append([
+            int(cols["open_time"][i]), "%.8f" % cols["open"][i], "%.8f" % cols["high"][i],
+            "%.8f" % cols["low"][i], "%.8f" % cols["close"][i], "%.8f" % cols["volume"][i],
+            int(cols["close_time"][i]), "%.8f" % cols["value"][i], int(cols["trade_cnt"][i]),
+            "%.8f" % cols["active_buy_volume"][i], "%.8f" % cols["active_buy_value"][i], "0",
+        ])
+    return rows
+
+
+# 模拟的交易对：(基础币种, 计价币种, 状态, 价格精度)
+STUB_SYMBOLS = [
+    ("BTC", "USDT", "TRADING", "0.01"), ("ETH", "USDT", "TRADING", "0.01"), ("BNB", "USDT", "TRADING", "0.01"),
+    ("SOL", "USDT", "TRADING", "0.01"), ("XRP", "USDT", "TRADING", "0.0001"), ("DOGE", "USDT", "TRADING", "0.00001"),
+    ("ADA", "USDT", "TRADING", "0.0001"), ("ETH", "BTC", "TRADING", "0.00001"), ("BNB", "BTC", "TRADING", "0.000001"),
+    ("LUNA", "USDT", "BREAK", "0.0001"),
+]
+# 真实的 exchangeInfo 请求权重为 20
+EXCHANGE_INFO_WEIGHT = 20
+# 可注入的K线请求故障：5xx、状态码 200 的错误信息、被截断的响应体、直接断开连接
+FAILURE_MODES = ("server_error", "error_body", "truncated", "disconnect")
+# 与 data.binance.vision 相同的归档文件路径，归档下载不计请求权重
+ARCHIVE_PATH_RE = re.compile(
+    r"^/data/spot/(monthly|daily)/klines/([A-Z0-9]+)/(\w+)/\2-\3-([0-9-]+)\.zip(\.CHECKSUM)?$")
+# 2025 年起的现货归档文件使用微秒时间戳
+MICROSECOND_ARCHIVE_MS = 1735689600000
+
+
+def synthetic_archive(interval, kind, label):
+    """
+    按 data.binance.vision 的格式生成一个归档 zip（无表头的 CSV），内容与同一时间段的 /api/v3/klines 响应一致。
+    返回 (zip 内容, 归档周期结束时间)。
+    """
+    unit = "M" if kind == "monthly" else "D"
+    period_start = int(np.datetime64(label, unit).astype("datetime64[ms]").astype(np.int64))
+    period_end = int((np.datetime64(label, unit) + 1).astype("datetime64[ms]").astype(np.int64))
+    interval = "1M" if interval == "1mo" else interval
+    interval_ms = interval_to_seconds(interval) * 1000
+    rows = synthetic_klines(period_start, period_end - 1, interval_ms, limit=period_end - period_start,
+                            interval=interval)
+    scale = 1000 if period_start >= MICROSECOND_ARCHIVE_MS else 1
+    lines = []
+    for row in rows:
+        row = list(row)
+        row[0] = row[0] * scale
+        row[6] = row[6] * scale + scale - 1
+        lines.append(",".join(str(v) for v in row))
+    buf = io.BytesIO()
+    name = "{}.csv".format(label)
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(name, "\n".join(lines) + "\n")
+    return buf.getvalue(), period_end
+
+
+def exchange_info_payload(symbols=STUB_SYMBOLS):
+    """按 /api/v3/exchangeInfo 的格式生成交易对信息，也可以保存下来作为测试数据"""
+    items = []
+    for base, quote, status, tick_size in symbols:
+        items.append({
+            "symbol": base + quote,
+            "status": status,
+            "baseAsset": base,
+            "baseAssetPrecision": 8,
+            "quoteAsset": quote,
+            "quotePrecision": 8,
+            "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS_LIMIT", "TAKE_PROFIT_LIMIT"],
+            "isSpotTradingAllowed": True,
+            "filters": [
+                {"filterType": "PRICE_FILTER", "minPrice": tick_size, "maxPrice": "1000000.00000000",
+                 "tickSize": tick_size},
+                {"filterType": "LOT_SIZE", "minQty": "0.00010000", "maxQty": "9000.00000000",
+                 "stepSize": "0.00010000"},
+                {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True,
+                 "maxNotional": "9000000.00000000", "applyMaxToMarket": False, "avgPriceMins": 5},
+            ],
+        })
+    return {"timezone": "UTC", "serverTime": int(time.time() * 1000), "rateLimits": [], "exchangeFilters": [],
+            "symbols": items}
+
+
+class StubExchange:
+    """
+    本地模拟的币安 REST 接口，用于在无网络环境下测试和压测下载逻辑。
+    支持配置响应延迟，并和真实交易所一样返回 X-MBX-USED-WEIGHT-1M 响应头，
+    超出每分钟权重时返回 429 和 Retry-After。exchange_info 为 /api/v3/exchangeInfo 返回的内容，
+    默认由 exchange_info_payload() 生成，也可以传入保存的真实响应。
+    failure_rate > 0 时按该概率让K线请求随机失败（方式从 failure_modes 中随机选择），用于测试重试和断点续传；
+    force_rate_limit() 让接下来的若干个K线请求直接返回 429，不依赖真实的一分钟权重窗口。
+    同一个地址还按 data.binance.vision 的路径提供合成的归档文件和 .CHECKSUM，尚未结束的周期返回 404。
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, weight_limit=WEIGHT_LIMIT_1M, retry_after=1,
+                 exchange_info=None, failure_rate=0.0, failure_modes=FAILURE_MODES, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_modes = failure_modes
+        self.failed_count = 0
+        self._random = random.Random(seed)
+        self.exchange_info = exchange_info or exchange_info_payload()
+        self.weight_limit = weight_limit
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.rejected_count = 0
+        self.path_counts = {}
+        self._archives = {}
+        self._forced_429 = 0
+        self._forced_retry_after = None
+        self._weight = 0
+        self._window = int(time.time() // 60)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def _charge(self, path, weight):
+        with self._lock:
+            self.request_count += 1
+            self.path_counts[path] = self.path_counts.get(path, 0) + 1
+            window = int(time.time() // 60)
+            if window != self._window:
+                self._window = window
+                self._weight = 0
+            if weight and self._weight + weight > self.weight_limit:
+                self.rejected_count += 1
+                return self._weight, False
+            self._weight += weight
+            return self._weight, True
+
+    def force_rate_limit(self, count=1, retry_after=None):
+        """接下来的 count 个K线请求返回 429，Retry-After 为 retry_after（默认使用构造时的 retry_after）"""
+        with self._lock:
+            self._forced_429 = count
+            self._forced_retry_after = retry_after
+
+    def _take_forced_429(self, path):
+        # 返回本次请求应使用的 Retry-After，不需要强制限速时返回 None
+        if path != "/api/v3/klines":
+            return None
+        with self._lock:
+            if not self._forced_429:
+                return None
+            self._forced_429 -= 1
+            self.rejected_count += 1
+            return self.retry_after if self._forced_retry_after is None else self._forced_retry_after
+
+    def handle_klines(self, params):
+        interval = params["interval"]
+        interval_ms = interval_to_seconds(interval) * 1000
+        limit = int(params.get("limit", 500))
+        start_ms = int(params["startTime"])
+        end_ms = int(params.get("endTime", start_ms + limit * interval_ms))
+        return 200, synthetic_klines(start_ms, end_ms, interval_ms, limit, interval=interval)
+
+    def handle_archive(self, match):
+        kind, symbol, interval, label, checksum = match.groups()
+        key = (kind, symbol, interval, label)
+        with self._lock:
+            cached = self._archives.get(key)
+        if cached is None:
+            try:
+                cached = synthetic_archive(interval, kind, label)
+            except (ValueError, KeyError):
+                return 404, {"code": -1, "msg": "Unknown archive {}".format(label)}
+            with self._lock:
+                self._archives[key] = cached
+        data, period_end = cached
+        if period_end > time.time() * 1000:
+            # 归档在周期结束后才发布
+            return 404, {"code": -1, "msg": "Archive {} is not published yet".format(label)}
+        if checksum:
+            name = "{}-{}-{}.zip".format(symbol, interval, label)
+            return 200, "{}  {}\n".format(hashlib.sha256(data).hexdigest(), name).encode()
+        return 200, data
+
+    def _pick_failure(self, path):
+        """按 failure_rate 决定本次K线请求是否失败，返回故障方式或 None"""
+        if path != "/api/v3/klines" or not self.failure_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.failure_rate:
+                return None
+            self.failed_count += 1
+            return self._random.choice(self.failure_modes)
+
+    def route(self, path, params):
+        if path == "/api/v3/klines":
+            return self.handle_klines(params)
+        if path == "/api/v3/exchangeInfo":
+            return 200, self.exchange_info
+        match = ARCHIVE_PATH_RE.match(path)
+        if match:
+            return self.handle_archive(match)
+        return 404, {"code": -1, "msg": "Unknown path {}".format(path)}
+
+    def _make_handler(self):
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                if parsed.path.startswith("/data/"):
+                    weight = 0
+                elif parsed.path == "/api/v3/exchangeInfo":
+                    weight = EXCHANGE_INFO_WEIGHT
+                else:
+                    weight = KLINES_REQ_WEIGHT
+                used, accepted = exchange._charge(parsed.path, weight)
+                retry_after = exchange.retry_after
+                forced = exchange._take_forced_429(parsed.path) if accepted else None
+                if forced is not None:
+                    accepted, retry_after = False, forced
+                if exchange.latency:
+                    time.sleep(exchange.latency)
+                failure = exchange._pick_failure(parsed.path) if accepted else None
+                if failure == "disconnect":
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if failure == "server_error":
+                    status, payload = 500, {"code": -1001, "msg": "Internal error; unable to process your request."}
+                elif failure == "error_body":
+                    status, payload = 200, {"code": -1001, "msg": "Internal error; unable to process your request."}
+                elif accepted:
+                    status, payload = exchange.route(parsed.path, params)
+                else:
+                    status, payload = 429, {"code": -1003, "msg": "Too many requests."}
+                raw = isinstance(payload, bytes)
+                body = payload if raw else json.dumps(payload, separators=(",", ":")).encode()
+                if failure == "truncated":
+                    body = body[:len(body) // 2]
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-MBX-USED-WEIGHT-1M", str(used))
+                if status == 429:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+
+
+def ws_frame(payload, opcode=0x1):
+    """构造服务端发往客户端的（不带掩码的）WebSocket 帧"""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack(">H", length)
+    else:
+        header += bytes([127]) + struct.pack(">Q", length)
+    return header + payload
+
+
+def kline_event(symbol, interval, row, closed=True):
+    """按币安 <symbol>@kline_<interval> 推送格式构造一条K线事件"""
+    return {
+        "e": "kline", "E": int(row[6]) + 1, "s": symbol,
+        "k": {
+            "t": int(row[0]), "T": int(row[6]), "s": symbol, "i": interval,
+            "o": row[1], "h": row[2], "l": row[3], "c": row[4], "v": row[5],
+            "n": int(row[8]), "x": closed, "q": row[7], "V": row[9], "Q": row[10], "B": "0",
+        },
+    }
+
+
+class StubKlineStream:
+    """
+    本地模拟的币安K线 WebSocket 推送。每根合成K线先推送一条未收盘的更新，再推送一条已收盘的事件，
+    推送间隔由 delay 控制，推送完 count 根K线后关闭连接。
+    """
+
+    def __init__(self, symbol="ETHUSDT", interval="1m", start_ms=1704067200000, count=1000, delay=0.0,
+                 host="127.0.0.1", port=0):
+        interval_ms = interval_to_seconds(interval) * 1000
+        self.events = []
+        for offset in range(0, count, REQ_LIMIT):
+            first = start_ms + offset * interval_ms
+            batch = min(REQ_LIMIT, count - offset)
+            for row in synthetic_klines(first, first + (batch - 1) * interval_ms, interval_ms, batch):
+                self.events.append(kline_event(symbol, interval, row, closed=False))
+                self.events.append(kline_event(symbol, interval, row, closed=True))
+        self.delay = delay
+        self.server = socketserver.ThreadingTCPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "ws://{}:{}/ws".format(host, port)
+
+    def _make_handler(self):
+        stream = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                key = None
+                while True:
+                    line = self.rfile.readline().decode("latin-1").strip()
+                    if not line:
+                        break
+                    if line.lower().startswith("sec-websocket-key:"):
+                        key = line.split(":", 1)[1].strip()
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.wfile.write((
+                    "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                    "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept)
+                ).encode())
+                try:
+                    for event in stream.events:
+                        self.wfile.write(ws_frame(json.dumps(event, separators=(",", ":")).encode()))
+                        self.wfile.flush()
+                        if stream.delay and event["k"]["x"]:
+                            time.sleep(stream.delay)
+                    self.wfile.write(ws_frame(struct.pack(">H", 1000), opcode=0x8))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='启动本地模拟的币安K线接口')
+    parser.add_argument('--port', type=int, default=8900, help='监听端口')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的模拟延迟（秒）')
+    parser.add_argument('--weight_limit', type=int, default=WEIGHT_LIMIT_1M, help='每分钟权重上限')
+    parser.add_argument('--failure_rate', type=float, default=0.0, help='K线请求随机失败的概率，用于测试重试和断点续传')
+    parser.add_argument('--exchange_info', type=str, default=None, help='用保存的 exchangeInfo 响应（JSON 文件）代替内置的交易对列表')
+    args = parser.parse_args()
+
+    exchange_info = None
+    if args.exchange_info:
+        with open(args.exchange_info) as f:
+            exchange_info = json.load(f)
+    exchange = StubExchange(port=args.port, latency=args.latency, weight_limit=args.weight_limit,
+                            exchange_info=exchange_info, failure_rate=args.failure_rate)
+    print(f"模拟交易所已启动: {exchange.base_url}")
+    exchange.server.serve_forever()
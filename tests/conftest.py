@@ -0,0 +1,62 @@
+import os
+import shutil
+import sys
+import tempfile
+
+# 测试期间的本地K线存储、共享数据层、下载日志和交易所信息缓存都放在临时目录中，需在导入项目模块之前设置
+_DATA_DIR = tempfile.mkdtemp(prefix="strategy-streamlit-tests-")
+os.environ["KLINE_STORE_DIR"] = os.path.join(_DATA_DIR, "klines")
+os.environ["SHARED_KLINES_DIR"] = os.path.join(_DATA_DIR, "shared")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import kline_downloader
+from kline_store import KlineStore
+from stub_exchange import StubExchange
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    """启动本地模拟交易所，并让下载模块默认请求它"""
+    with StubExchange() as stub:
+        monkeypatch.setattr(kline_downloader, "BASE_URL", stub.base_url)
+        yield stub
+
+
+@pytest.fixture
+def store(tmp_path):
+    return KlineStore(str(tmp_path / "klines"))
+
+
+def kline_requests(exchange):
+    return exchange.path_counts.get("/api/v3/klines", 0)
+
+
+def synthetic_ohlc(rows, seed=0, start_ms=1704067200000, interval_ms=3600 * 1000, gaps=()):
+    """
+    随机游走的 OHLC K线，open_time 为毫秒时间戳；gaps 为 (位置, 缺失根数) 列表，
+    在对应位置之前跳过若干根K线，模拟交易所停机造成的缺口。
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    wick = np.abs(rng.normal(0, 0.4, (2, rows)))
+    steps = np.ones(rows, dtype=np.int64)
+    for position, missing in gaps:
+        steps[position] += missing
+    steps[0] = 0
+    return pd.DataFrame({
+        "open_time": start_ms + np.cumsum(steps) * interval_ms,
+        "open": open_,
+        "high": np.maximum(open_, close) + wick[0],
+        "low": np.minimum(open_, close) - wick[1],
+        "close": close,
+        "volume": rng.uniform(1, 100, rows),
+    })
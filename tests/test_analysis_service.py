@@ -0,0 +1,52 @@
+from analysis_service import AnalysisService
+from kline_store import KlineStore
+from shared_klines import SharedKlineCache
+from stub_exchange import StubExchange
+
+
+def test_identical_requests_are_computed_once(tmp_path):
+    with StubExchange(latency=0.2) as exchange:
+        service = AnalysisService(workers=4, base_url=exchange.base_url, store=KlineStore(str(tmp_path / 'klines')),
+                                  shared=SharedKlineCache(str(tmp_path / 'shared')))
+        try:
+            params = {'symbol': 'ETH', 'interval': '1h', 'start': '2024-01-01', 'end': '2024-03-31'}
+            submitted = [service.analyze(params) for _ in range(20)]
+            results = [future.result(timeout=60) for future, _ in submitted]
+            sources = [source for _, source in submitted]
+            assert sources[0] == "computed"
+            assert set(sources[1:]) <= {"coalesced", "cache"}
+            assert all(result == results[0] for result in results)
+            future, source = service.analyze(params)
+            assert source == "cache" and future.result() == results[0]
+
+            other = service.analyze(dict(params, threshold_factor='2.0'))[0].result(timeout=60)
+            assert other['params']['threshold_factor'] == 2.0
+            summary = service.summary()
+            assert summary['computations'] == 2
+            # 两个分析请求共用同一份数据，只下载一次
+            assert summary['data_loads'] == 1
+        finally:
+            service.close()
+
+
+def test_services_share_published_klines(tmp_path):
+    shared = SharedKlineCache(str(tmp_path / 'shared'))
+    params = {'symbol': 'ETH', 'interval': '1h', 'start': '2024-01-01', 'end': '2024-01-31'}
+    with StubExchange() as exchange:
+        first = AnalysisService(workers=2, base_url=exchange.base_url, store=KlineStore(str(tmp_path / 'a')),
+                                shared=shared)
+        second = AnalysisService(workers=2, base_url=exchange.base_url, store=KlineStore(str(tmp_path / 'b')),
+                                 shared=SharedKlineCache(shared.root))
+        try:
+            expected = first.analyze(params)[0].result(timeout=60)
+            requests = exchange.path_counts['/api/v3/klines']
+            # 另一个服务（各自的本地存储为空）直接挂载已发布的数据，不再请求交易所
+            assert second.analyze(params)[0].result(timeout=60) == expected
+            assert exchange.path_counts['/api/v3/klines'] == requests
+            assert first.summary()['data_loads'] == 1
+            assert second.summary()['data_loads'] == 0 and second.summary()['shared_attaches'] == 1
+            # 两个服务的内存缓存各持有一个租约
+            assert shared.stats()['leases'].tolist() == [2]
+        finally:
+            first.close()
+            second.close()
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+import download_journal
+import kline_downloader
+from conftest import kline_requests
+from download_journal import ChunkDownloadError, ChunkJournal, fetch_journaled
+from stub_exchange import StubExchange
+
+
+def test_resume_only_downloads_failed_chunks(tmp_path, monkeypatch):
+    pairs = kline_downloader.get_start_end_pairs("2024-01-01", "2024-06-30", "1h")
+    journal = ChunkJournal("ETH/USDT", "1h", root=str(tmp_path))
+    with StubExchange(failure_rate=0.5, failure_modes=("server_error",), seed=7) as exchange:
+        monkeypatch.setattr(kline_downloader, "BASE_URL", exchange.base_url)
+        with pytest.raises(ChunkDownloadError) as info:
+            fetch_journaled("ETH/USDT", "1h", pairs, journal, base_url=exchange.base_url, max_retries=0,
+                            progress=False)
+        failed = [pair for pair, _ in info.value.failed]
+        assert 0 < len(failed) < len(pairs)
+        assert journal.completed() == set(pairs) - set(failed)
+
+        exchange.failure_rate = 0.0
+        before = kline_requests(exchange)
+        payloads = fetch_journaled("ETH/USDT", "1h", pairs, journal, base_url=exchange.base_url, progress=False)
+        assert kline_requests(exchange) - before == len(failed)
+        expected = kline_downloader.fetch_kline_batches("ETH/USDT", "1h", pairs, base_url=exchange.base_url,
+                                                        progress=False)
+    pd.testing.assert_frame_equal(kline_downloader.klines_to_frame(payloads),
+                                  kline_downloader.klines_to_frame(expected))
+    report = download_journal.verify_klines(kline_downloader.klines_to_frame(payloads), "1h")
+    assert report["duplicates"] == 0 and report["gaps"] == []
+
+
+def test_chunks_ending_in_an_open_candle_are_not_journaled(exchange, tmp_path):
+    # 截止到昨天：区间结束时间已经过去，但包含它的周线要到下一个周一才收盘（今天是周一时已经收盘）
+    today = datetime.now(timezone.utc)
+    end = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+    weekly = ChunkJournal("ETH/USDT", "1w", root=str(tmp_path))
+    pairs = kline_downloader.get_start_end_pairs("2024-01-01", end, "1w")
+    fetch_journaled("ETH/USDT", "1w", pairs, weekly, base_url=exchange.base_url, progress=False)
+    assert weekly.completed() == (set(pairs) if today.weekday() == 0 else set())
+
+    hourly = ChunkJournal("ETH/USDT", "1h", root=str(tmp_path))
+    pairs = kline_downloader.get_start_end_pairs("2024-01-01", "2024-03-31", "1h")
+    fetch_journaled("ETH/USDT", "1h", pairs, hourly, base_url=exchange.base_url, progress=False)
+    assert hourly.completed() == set(pairs)
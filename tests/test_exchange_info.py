@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+import exchange_info
+from exchange_info import ExchangeInfo, get_exchange_info
+from stub_exchange import StubExchange, exchange_info_payload
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "exchange_info.json")
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_cache(monkeypatch):
+    monkeypatch.setattr(exchange_info, "_cache", {})
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    # 保存的原始 exchangeInfo 响应也可以直接作为磁盘缓存使用，修改时间即获取时间
+    path = str(tmp_path / "exchange_info.json")
+    shutil.copy(FIXTURE, path)
+    return path
+
+
+def exchange_info_requests(exchange):
+    return exchange.path_counts.get(exchange_info.EXCHANGE_INFO_ENDPOINT, 0)
+
+
+def test_symbol_and_filter_lookup():
+    index = ExchangeInfo.from_file(FIXTURE)
+    assert len(index) == 4
+    for query in ("ETH", "eth/usdt", "ETHUSDT"):
+        assert index.get(query).pair == "ETH/USDT"
+    eth = index.resolve("ETH")
+    assert (eth.tick_size, eth.step_size, eth.min_qty, eth.min_notional) == (0.01, 0.0001, 0.0001, 5.0)
+    # 旧版响应的 MIN_NOTIONAL 过滤器
+    assert index.get("ETH/BTC").min_notional == 0.0001
+    assert index.symbols(quote="USDT") == ["BTC/USDT", "ETH/USDT"]
+    assert index.symbols(quote="USDT", trading_only=False) == ["BTC/USDT", "ETH/USDT", "LUNA/USDT"]
+    assert index.symbols(base="ETH") == ["ETH/USDT", "ETH/BTC"]
+    assert "LUNA" in index and not index.get("LUNA").trading
+    with pytest.raises(ValueError, match="ETH/USDT"):
+        index.resolve("ETHH")
+
+
+def test_fresh_cache_is_used_without_a_request(cache_path):
+    with StubExchange() as exchange:
+        info = get_exchange_info(path=cache_path, base_url=exchange.base_url)
+        assert exchange_info_requests(exchange) == 0
+    assert info.get("BTC").pair == "BTC/USDT"
+
+
+def test_expired_cache_is_refreshed_and_saved(cache_path):
+    expired = time.time() - exchange_info.DEFAULT_TTL - 60
+    os.utime(cache_path, (expired, expired))
+    payload = exchange_info_payload([("BTC", "USDT", "TRADING", "0.01"), ("SOL", "USDT", "TRADING", "0.01")])
+    with StubExchange(exchange_info=payload) as exchange:
+        info = get_exchange_info(path=cache_path, base_url=exchange.base_url)
+        assert exchange_info_requests(exchange) == 1
+        assert info.symbols() == ["BTC/USDT", "SOL/USDT"]
+        # 之后在有效期内使用进程内缓存
+        assert get_exchange_info(path=cache_path, base_url=exchange.base_url) is info
+        assert exchange_info_requests(exchange) == 1
+        # 刷新后写回的精简缓存记录了来源，其他进程读取后无需再下载
+        exchange_info._cache.clear()
+        assert get_exchange_info(path=cache_path, base_url=exchange.base_url).symbols() == ["BTC/USDT", "SOL/USDT"]
+        assert exchange_info_requests(exchange) == 1
+        with open(cache_path) as f:
+            assert json.load(f)["source"] == exchange.base_url
+        # ttl=0 时立即过期
+        get_exchange_info(ttl=0, path=cache_path, base_url=exchange.base_url)
+        assert exchange_info_requests(exchange) == 2
+
+
+def test_stale_cache_is_used_when_the_exchange_fails(cache_path, capsys):
+    expired = time.time() - exchange_info.DEFAULT_TTL - 60
+    os.utime(cache_path, (expired, expired))
+    exchange = StubExchange().start()
+    base_url = exchange.base_url
+    exchange.stop()
+    info = get_exchange_info(path=cache_path, base_url=base_url)
+    assert info.get("ETH").pair == "ETH/USDT"
+    assert info.age() > exchange_info.DEFAULT_TTL
+    assert "继续使用" in capsys.readouterr().out
+
+
+def test_missing_cache_and_failing_exchange_raises(tmp_path):
+    exchange = StubExchange().start()
+    base_url = exchange.base_url
+    exchange.stop()
+    with pytest.raises(Exception):
+        get_exchange_info(path=str(tmp_path / "missing.json"), base_url=base_url)
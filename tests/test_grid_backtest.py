@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_ohlc
+from grid_backtest import _simulate, backtest_grid, backtest_grids, build_price_path, make_grid_prices
+
+
+def reference_simulate(path, close, levels, fee_rate, investment):
+    """
+    逐个价格点、逐格模拟的参考实现：持仓的格子在价格不低于上沿时卖出，空仓的格子在价格不高于下沿时买入；
+    初始价格以上（下沿不低于初始价格）的格子按初始价格买入。
+    """
+    n_cells = len(levels) - 1
+    start_price = path[0]
+    held = [levels[k] >= start_price for k in range(n_cells)]
+    capital = sum(levels[k] for k in range(n_cells) if not held[k]) + held.count(True) * start_price
+    quantity = investment / capital
+    basis = [quantity * start_price * (1 + fee_rate) if h else 0.0 for h in held]
+    cash = investment - sum(basis)
+    fees = fee_rate * quantity * start_price * held.count(True)
+    realized = 0.0
+    buys = sells = 0
+    equity, inventory = [], []
+    for i, price in enumerate(path):
+        for k in range(n_cells):
+            if held[k] and levels[k + 1] <= price:
+                proceeds = quantity * levels[k + 1] * (1 - fee_rate)
+                cash += proceeds
+                realized += proceeds - basis[k]
+                fees += fee_rate * quantity * levels[k + 1]
+                held[k], basis[k] = False, 0.0
+                sells += 1
+        for k in range(n_cells):
+            if not held[k] and levels[k] >= price:
+                basis[k] = quantity * levels[k] * (1 + fee_rate)
+                cash -= basis[k]
+                fees += fee_rate * quantity * levels[k]
+                held[k] = True
+                buys += 1
+        if i % 4 == 3:
+            inventory.append(quantity * held.count(True))
+            equity.append(cash + inventory[-1] * close[i // 4])
+    unrealized = sum(quantity * close[-1] - basis[k] for k in range(n_cells) if held[k])
+    peak = np.maximum.accumulate(np.maximum(equity, investment))
+    return {
+        'grid_lower': levels[0],
+        'grid_upper': levels[-1],
+        'grids': n_cells,
+        'quantity_per_grid': quantity,
+        'buy_fills': buys,
+        'sell_fills': sells,
+        'realized_pnl': realized,
+        'unrealized_pnl': unrealized,
+        'total_pnl': realized + unrealized,
+        'return_pct': (realized + unrealized) / investment * 100,
+        'fees': fees,
+        'final_inventory': quantity * held.count(True),
+        'max_inventory': max(inventory),
+        'max_drawdown_pct': float(((peak - np.asarray(equity)) / peak).max()) * 100,
+        'equity': np.asarray(equity),
+    }
+
+
+def assert_matches_reference(df, levels, fee_rate=0.001, investment=10000.0):
+    levels = np.asarray(levels, dtype=np.float64)
+    path = build_price_path(df)
+    close = df['close'].to_numpy(dtype=np.float64)
+    result = _simulate(path, close, levels, fee_rate, investment, True)
+    expected = reference_simulate(path, close, levels, fee_rate, investment)
+    np.testing.assert_allclose(result.pop('equity'), expected.pop('equity'), rtol=1e-9)
+    for name, value in expected.items():
+        assert result[name] == pytest.approx(value, rel=1e-9, abs=1e-7), name
+    return result
+
+
+def candles(*rows):
+    return pd.DataFrame(rows, columns=['open', 'high', 'low', 'close'])
+
+
+def test_round_trip_with_fills_exactly_at_grid_prices():
+    # 从网格价格 100 开始：先涨到 110 卖出，再跌到 90 买回两格，收盘回到 100 再卖出一格
+    df = candles((100, 110, 100, 110), (110, 110, 90, 90), (90, 100, 90, 100))
+    result = assert_matches_reference(df, [90, 100, 110], fee_rate=0.0)
+    quantity = 10000 / (90 + 100)
+    assert result['quantity_per_grid'] == pytest.approx(quantity)
+    assert (result['buy_fills'], result['sell_fills']) == (2, 2)
+    assert result['realized_pnl'] == pytest.approx(quantity * (10 + 10))
+    assert result['final_inventory'] == pytest.approx(quantity)
+
+
+def test_prices_just_short_of_a_grid_price_do_not_fill():
+    df = candles((100, 109.99, 90.01, 105), (105, 109.999, 95, 96))
+    result = assert_matches_reference(df, [90, 100, 110])
+    # 最高价差一点到 110、最低价差一点到 90，都不成交
+    assert (result['buy_fills'], result['sell_fills']) == (0, 0)
+    # 恰好触及 110 时卖出
+    assert assert_matches_reference(candles((100, 110, 95, 96)), [90, 100, 110])['sell_fills'] == 1
+
+
+def test_price_leaving_the_grid_on_both_sides():
+    levels = make_grid_prices(95, 105, 5)
+    df = candles((100, 101, 99, 100.5), (100.5, 120, 100, 118), (118, 119, 80, 82), (82, 83, 81, 82.5),
+                 (82.5, 104, 82, 103.9), (103.9, 104.1, 96, 96))
+    result = assert_matches_reference(df, levels)
+    assert result['final_inventory'] > 0 and result['max_drawdown_pct'] > 0
+    # 从网格上方开始时全部格子空仓，从下方开始时全部持仓
+    assert_matches_reference(candles((130, 131, 96, 97), (97, 104, 94, 103)), levels)
+    assert_matches_reference(candles((70, 99, 69, 98), (98, 106, 90, 91)), levels)
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("mode", ["arithmetic", "geometric"])
+def test_random_paths_match_reference(seed, mode):
+    df = synthetic_ohlc(300, seed=seed)
+    low, high = df['low'].min(), df['high'].max()
+    levels = make_grid_prices(low + (high - low) * 0.1, high - (high - low) * 0.1, 7 + seed, mode)
+    assert_matches_reference(df, levels, fee_rate=0.00075 * (seed % 3))
+
+
+def test_random_paths_snapped_to_grid_prices():
+    # 所有价格都落在网格价格上，检验在网格价格处恰好成交的边界情况
+    rng = np.random.default_rng(3)
+    levels = make_grid_prices(90, 110, 10)
+    points = levels[np.clip(np.cumsum(rng.integers(-2, 3, 400)) + 5, 0, 10)].reshape(-1, 4)
+    df = pd.DataFrame({'open': points[:, 0], 'high': points.max(axis=1), 'low': points.min(axis=1),
+                       'close': points[:, 3]})
+    assert_matches_reference(df, levels)
+
+
+def test_backtest_helpers_use_the_same_simulation():
+    df = synthetic_ohlc(200, seed=9)
+    levels = make_grid_prices(df['close'].min(), df['close'].max(), 12)
+    single = backtest_grid(df, levels[::-1])
+    table = backtest_grids(df, [{'grid_prices': levels},
+                                {'min_price': levels[0], 'max_price': levels[-1], 'grids': 12}])
+    for row in table.to_dict(orient='records'):
+        assert row['total_pnl'] == pytest.approx(single['total_pnl'], rel=1e-12)
+        assert row['buy_fills'] == single['buy_fills']
@@ -0,0 +1,39 @@
+import pandas as pd
+
+import grid_screener
+from conftest import kline_requests
+from shared_klines import SharedKlineCache
+
+
+def test_screen_downloads_in_parent_and_analyzes_in_processes(exchange, tmp_path):
+    exchange.force_rate_limit(count=2, retry_after=0)
+    symbols = ['BTC/USDT', 'ETH/USDT', 'SOL/USDT']
+    shared = SharedKlineCache(str(tmp_path / 'shared'))
+    result = grid_screener.screen_symbols(symbols, interval='1d', start='2023-01-01', end='2023-06-30',
+                                          workers=2, download_threads=2, shared=shared)
+    assert sorted(result['symbol']) == sorted(symbols)
+    assert result['error'].isna().all()
+    assert result['recommended_grids'].notna().all()
+    # 被拒绝的请求由共享的限速器退避后重试，每个交易对的半年日线只需一个请求
+    assert exchange.rejected_count == 2
+    assert kline_requests(exchange) == len(symbols) + 2
+    # 工作进程通过共享数据层挂载主进程发布的数据，结束后主进程和工作进程的租约都已释放
+    stats = shared.stats()
+    assert sorted(stats['symbol']) == sorted(symbols)
+    assert (stats['rows'] == 181).all() and (stats['leases'] == 0).all()
+
+
+def test_download_errors_are_reported_per_symbol(exchange, monkeypatch):
+    def fetch(symbol, *args):
+        if symbol == 'BAD/USDT':
+            raise RuntimeError('下载失败')
+        return original(symbol, *args)
+
+    original = grid_screener.fetch_symbol
+    monkeypatch.setattr(grid_screener, 'fetch_symbol', fetch)
+    result = grid_screener.screen_symbols(['BAD/USDT', 'ETH/USDT'], interval='1d', start='2023-07-01',
+                                          end='2023-12-31', workers=1)
+    rows = result.set_index('symbol')
+    assert rows.loc['BAD/USDT', 'error'] == '下载失败'
+    assert not rows.loc['BAD/USDT', 'suitable']
+    assert pd.isna(rows.loc['ETH/USDT', 'error'])
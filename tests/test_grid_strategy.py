@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from conftest import synthetic_ohlc
+from grid_strategy import analyze_grid, analyze_grid_timeline
+
+PARAMS = {'threshold_factor': 0.7, 'grid_step_percentage': 0.5, 'max_grids': 50, 'atr_std_multiplier': 1.0}
+WINDOW = 60
+
+
+@pytest.fixture(scope="module")
+def klines():
+    # 每根K线以上一根的收盘价开盘，前收盘价总在最高/最低价之间，TR 恰好等于 H-L，
+    # 窗口第一根K线的 TR 与完整历史中的一致
+    df = synthetic_ohlc(240, seed=4, gaps=[(120, 6)])
+    prev_close = df['close'].shift(1)
+    assert ((prev_close.iloc[1:] <= df['high'].iloc[1:]) & (prev_close.iloc[1:] >= df['low'].iloc[1:])).all()
+    return df
+
+
+def test_timeline_matches_per_window_analysis(klines):
+    timeline = analyze_grid_timeline(klines, window=WINDOW, **PARAMS)
+    assert len(timeline) == len(klines)
+    assert timeline['suitable'].nunique() == 2
+
+    for i in range(WINDOW - 1, len(klines)):
+        row = timeline.iloc[i]
+        # 相对标准差和 ATR 阈值只用最近 WINDOW 根K线
+        expected = analyze_grid(klines.iloc[i - WINDOW + 1:i + 1], **PARAMS)
+        assert row['relative_std'] == pytest.approx(expected.relative_std, rel=1e-9), i
+        assert row['atr'] == pytest.approx(expected.latest_atr, rel=1e-9), i
+        assert row['min_atr'] == pytest.approx(expected.min_atr, rel=1e-7, abs=1e-12), i
+        assert row['max_atr'] == pytest.approx(expected.max_atr, rel=1e-7), i
+        assert row['suitable'] == expected.suitable, i
+
+        # MACD 在完整历史上计算，与截至该K线的全部数据上的分析一致
+        trend = analyze_grid(klines.iloc[:i + 1], **PARAMS)
+        assert row['macd'] == pytest.approx(trend.latest_macd, rel=1e-9, abs=1e-12), i
+        assert row['macd_signal'] == pytest.approx(trend.latest_macd_signal, rel=1e-9, abs=1e-12), i
+        assert row['trend'] == trend.trend, i
+        assert row['min_price'] == pytest.approx(trend.min_price, rel=1e-12), i
+        assert row['max_price'] == pytest.approx(trend.max_price, rel=1e-12), i
+        assert row['recommended_grids'] == trend.recommended_grids, i
+        assert row['grid_interval'] == pytest.approx(trend.grid_interval, rel=1e-12), i
+
+
+def test_rows_before_the_first_full_window(klines):
+    head = analyze_grid_timeline(klines, window=WINDOW, **PARAMS).iloc[:WINDOW - 1]
+    assert head[['relative_std', 'min_atr', 'max_atr']].isna().all().all()
+    assert not head['suitable'].any()
+    assert (head['open_time'].to_numpy() == klines['open_time'].iloc[:WINDOW - 1].to_numpy()).all()
+
+
+def test_relative_std_matches_on_gapped_opens():
+    # 开盘价跳空时窗口第一根K线的 TR 不同，但价格波动范围的统计与 TR 无关
+    df = synthetic_ohlc(150, seed=8)
+    df['open'] = df['open'] * np.where(np.arange(150) % 7 == 0, 1.05, 1.0)
+    df['high'] = df[['open', 'high']].max(axis=1)
+    df['low'] = df[['open', 'low']].min(axis=1)
+    timeline = analyze_grid_timeline(df, window=40, **PARAMS)
+    for i in range(39, len(df)):
+        expected = analyze_grid(df.iloc[i - 39:i + 1], **PARAMS)
+        assert timeline['relative_std'].iloc[i] == pytest.approx(expected.relative_std, rel=1e-9), i
+
+
+def test_window_must_cover_the_atr_period(klines):
+    with pytest.raises(ValueError):
+        analyze_grid_timeline(klines, window=14)
@@ -0,0 +1,50 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_ohlc
+from grid_strategy import compute_grid_metrics
+from grid_sweep import SWEEP_PARAMS, sweep_grid_strategy
+
+GRID = {
+    'threshold_factor': [0.3, 0.6, 2.0],
+    'atr_std_multiplier': [0.2, 1.0, 3.0],
+    'grid_step_percentage': [0.3, 1.0, 50.0],
+    'atr_period': [7, 14],
+    'macd_fast': [5, 12],
+    'macd_slow': [12, 26],
+    'macd_signal': [4, 9],
+}
+METRICS = ['suitable', 'relative_std', 'latest_atr', 'min_atr', 'max_atr', 'latest_macd', 'latest_macd_signal',
+           'trend', 'min_price', 'max_price', 'recommended_grids', 'grid_interval']
+
+
+def test_sweep_matches_compute_grid_metrics_for_every_combination():
+    df = synthetic_ohlc(800, seed=5)
+    result = sweep_grid_strategy(df, max_grids=40, **GRID)
+    combinations = list(itertools.product(*[GRID[name] for name in SWEEP_PARAMS]))
+    assert len(result) == len(combinations)
+    # 参数组合覆盖了适用/不适用、两种趋势以及网格数被 max_grids 截断和不足一格的情况
+    assert result['suitable'].nunique() == 2 and result['trend'].nunique() == 2
+    assert {1, 40} <= set(result['recommended_grids'])
+
+    for row, values in zip(result.itertuples(index=False), combinations):
+        params = dict(zip(SWEEP_PARAMS, values))
+        assert [getattr(row, name) for name in SWEEP_PARAMS] == pytest.approx(values)
+        expected = compute_grid_metrics(df, max_grids=40, **params)
+        for name in METRICS:
+            value = getattr(row, name)
+            if isinstance(expected[name], (str, bool, np.bool_, int, np.integer)):
+                assert value == expected[name], (params, name)
+            else:
+                assert value == pytest.approx(expected[name], rel=1e-9, abs=1e-12), (params, name)
+
+
+def test_scalar_parameters_give_a_single_row():
+    df = synthetic_ohlc(200, seed=6)
+    result = sweep_grid_strategy(df)
+    assert len(result) == 1
+    expected = compute_grid_metrics(df)
+    assert result.loc[0, 'suitable'] == expected['suitable']
+    assert result.loc[0, 'latest_atr'] == pytest.approx(expected['latest_atr'], rel=1e-12)
@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_ohlc
+from grid_strategy import compute_grid_metrics
+from indicator_engine import IndicatorEngine
+
+PARAMS = {'threshold_factor': 1.5, 'grid_step_percentage': 0.5, 'max_grids': 50, 'atr_std_multiplier': 1.0}
+
+
+def assert_same_metrics(metrics, expected):
+    for name, value in expected.items():
+        if isinstance(value, (str, bool, np.bool_, int, np.integer)):
+            assert metrics[name] == value, name
+        else:
+            assert metrics[name] == pytest.approx(value, rel=1e-9, abs=1e-12), name
+
+
+def feed(engine, df):
+    for row in df.itertuples(index=False):
+        engine.update(row.open_time, row.high, row.low, row.close)
+    return engine
+
+
+@pytest.fixture(scope="module")
+def klines():
+    return synthetic_ohlc(600, seed=21, gaps=[(300, 12)])
+
+
+def test_incremental_updates_match_batch_analysis(klines):
+    expected = compute_grid_metrics(klines, **PARAMS)
+    incremental = feed(IndicatorEngine(), klines)
+    assert incremental.bars == len(klines)
+    assert incremental.last_open_time == klines['open_time'].iloc[-1]
+    assert_same_metrics(incremental.metrics(**PARAMS), expected)
+    assert_same_metrics(IndicatorEngine.from_frame(klines).metrics(**PARAMS), expected)
+
+    # 批量初始化前一部分历史后逐根追加，或逐根和按块交替追加，结果都与一次性分析一致
+    warm = feed(IndicatorEngine.from_frame(klines.iloc[:250]), klines.iloc[250:])
+    assert_same_metrics(warm.metrics(**PARAMS), expected)
+    mixed = feed(IndicatorEngine(), klines.iloc[:5])
+    rest = klines.iloc[5:400]
+    mixed.update_chunk(rest['open_time'], rest['high'], rest['low'], rest['close'])
+    feed(mixed, klines.iloc[400:])
+    assert_same_metrics(mixed.metrics(**PARAMS), expected)
+
+
+def test_non_default_periods(klines):
+    periods = {'atr_period': 5, 'macd_fast': 3, 'macd_slow': 40, 'macd_signal': 2}
+    engine = feed(IndicatorEngine(**periods), klines)
+    assert_same_metrics(engine.metrics(**PARAMS), compute_grid_metrics(klines, **PARAMS, **periods))
+
+
+def test_stale_and_duplicate_bars_are_ignored(klines):
+    engine = feed(IndicatorEngine(), klines.iloc[:100])
+    state = engine.to_dict()
+    row = klines.iloc[99]
+    assert not engine.update(row['open_time'], row['high'] * 2, row['low'], row['close'])
+    assert engine.update_chunk(klines['open_time'].iloc[:100], klines['high'].iloc[:100],
+                               klines['low'].iloc[:100], klines['close'].iloc[:100]) == 0
+    assert engine.to_dict() == state
+
+
+def test_restored_engine_continues_where_it_stopped(klines, tmp_path):
+    expected = feed(IndicatorEngine(), klines)
+
+    engine = feed(IndicatorEngine(), klines.iloc[:333])
+    # 状态经过 JSON 往返（与 save/load 的文件格式相同）后继续追加
+    restored = IndicatorEngine.from_dict(json.loads(json.dumps(engine.to_dict())))
+    assert restored.to_dict() == engine.to_dict()
+    feed(restored, klines.iloc[333:])
+    # 恢复后继续的状态与从未中断的引擎逐位相同
+    assert restored.to_dict() == expected.to_dict()
+
+    path = str(tmp_path / 'engine.json')
+    warmup = IndicatorEngine()
+    warmup.update(*klines.iloc[0][['open_time', 'high', 'low', 'close']])
+    # ATR 窗口未满时 latest_atr 为 NaN，保存为 null
+    warmup.save(path)
+    loaded = IndicatorEngine.load(path)
+    assert np.isnan(loaded.latest_atr)
+    feed(loaded, klines.iloc[1:])
+    assert_same_metrics(loaded.metrics(**PARAMS), expected.metrics(**PARAMS))
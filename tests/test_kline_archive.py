@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import kline_archive
+from conftest import kline_requests
+from kline_downloader import download_full_klines
+from kline_store import KlineStore
+from stub_exchange import synthetic_archive
+
+JAN_2024_MS = 1704067200000
+FEB_2024_MS = 1706745600000
+
+
+def test_archive_ingest_matches_rest_download(exchange, tmp_path):
+    def download(name, **kwargs):
+        return download_full_klines("ETH/USDT", "1h", "2024-11-01", "2025-02-10", return_df=True,
+                                    store=KlineStore(str(tmp_path / name)), base_url=exchange.base_url,
+                                    progress=False, **kwargs)
+
+    rest = download("rest")
+    before = kline_requests(exchange)
+    archived = download("archive", archive=exchange.base_url)
+    # 整月由月度归档提供（2025 年起为微秒时间戳），2 月的日度归档之后只需一个 REST 请求
+    assert kline_requests(exchange) - before == 1
+    pd.testing.assert_frame_equal(archived, rest)
+
+
+def test_checksum_mismatch_raises(tmp_path):
+    data, _ = synthetic_archive("1h", "monthly", "2024-01")
+    (tmp_path / "ETHUSDT-1h-2024-01.zip").write_bytes(data)
+    (tmp_path / "ETHUSDT-1h-2024-01.zip.CHECKSUM").write_text("0" * 64 + "  ETHUSDT-1h-2024-01.zip\n")
+    store = KlineStore(str(tmp_path / "klines"))
+    with pytest.raises(kline_archive.ArchiveError):
+        kline_archive.ingest_archives("ETH/USDT", "1h", JAN_2024_MS, FEB_2024_MS, source=str(tmp_path), store=store)
+    assert store.coverage("ETH/USDT", "1h") == []
+    rows = kline_archive.ingest_archives("ETH/USDT", "1h", JAN_2024_MS, FEB_2024_MS, source=str(tmp_path),
+                                         store=store, verify=False)
+    assert rows == 31 * 24
+    assert store.coverage("ETH/USDT", "1h") == [[JAN_2024_MS, FEB_2024_MS]]
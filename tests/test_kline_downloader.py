@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import kline_downloader
+import profiling
+from conftest import kline_requests
+from kline_downloader import RateLimiter, download_full_klines
+from stub_exchange import StubExchange
+
+
+def download(exchange, start="2024-01-01", end="2024-03-31", interval="1h", **kwargs):
+    kwargs.setdefault("use_store", False)
+    return download_full_klines("ETH/USDT", interval, start, end, return_df=True, base_url=exchange.base_url,
+                                progress=False, **kwargs)
+
+
+def test_concurrent_chunks_are_reassembled_in_order(exchange):
+    sequential = download(exchange)
+    concurrent = download(exchange, concurrency=4)
+    pd.testing.assert_frame_equal(concurrent, sequential)
+    open_time = concurrent["open_time"].to_numpy()
+    assert (np.diff(open_time) == np.timedelta64(3600, "s")).all()
+    assert open_time[0] == np.datetime64("2024-01-01T00:00")
+    assert open_time[-1] == np.datetime64("2024-03-31T00:00")
+
+
+def test_rate_limited_requests_back_off_and_retry(exchange):
+    # 接下来的两个请求返回 429 和 Retry-After: 0，下载应重试这两个区间并得到完整的数据
+    exchange.force_rate_limit(count=2, retry_after=0)
+    pairs = kline_downloader.get_start_end_pairs("2024-01-01", "2024-03-31", "1h")
+    with profiling.profiling() as profile:
+        df = download(exchange, concurrency=2)
+    assert exchange.rejected_count == 2
+    assert kline_requests(exchange) == len(pairs) + 2
+    assert profile.retries == 2
+    assert profile.status_counts == {200: len(pairs), 429: 2}
+    pd.testing.assert_frame_equal(df, download(exchange))
+
+
+def test_rate_limiter_honours_retry_after():
+    class Response:
+        status_code = 429
+        headers = {"Retry-After": "0.5"}
+
+    limiter = RateLimiter()
+    limiter.acquire()
+    limiter.release(Response())
+    begin = time.perf_counter()
+    limiter.acquire()
+    limiter.release()
+    assert time.perf_counter() - begin >= 0.4
+
+
+def test_failed_requests_are_retried(exchange, monkeypatch):
+    expected = download(exchange, start="2024-01-01", end="2024-02-15")
+    with StubExchange(failure_rate=0.3, seed=3) as flaky:
+        monkeypatch.setattr(kline_downloader, "BASE_URL", flaky.base_url)
+        df = download(flaky, start="2024-01-01", end="2024-02-15", concurrency=2)
+        assert flaky.failed_count > 0
+    pd.testing.assert_frame_equal(df, expected)
+    assert kline_requests(exchange) == 2
@@ -0,0 +1,82 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import pandas as pd
+
+from conftest import kline_requests
+from kline_downloader import download_full_klines
+from kline_store import STORE_COLUMNS, KlineStore
+
+HOUR_MS = 3600 * 1000
+BASE_MS = 1704067200000  # 2024-01-01
+
+
+def synthetic_frame(start_ms, end_ms):
+    open_time = np.arange(start_ms, end_ms, HOUR_MS, dtype=np.int64)
+    df = pd.DataFrame({col: np.ones(len(open_time)) for col in STORE_COLUMNS})
+    df["open_time"] = open_time
+    df["trade_cnt"] = np.ones(len(open_time), dtype=np.int64)
+    return df
+
+
+def test_overlapping_ranges_only_fetch_the_gap(exchange, store):
+    def download(start, end, use_store=True):
+        return download_full_klines("ETH/USDT", "1h", start, end, return_df=True, use_store=use_store, store=store,
+                                    base_url=exchange.base_url, progress=False)
+
+    download("2024-01-01", "2024-02-29")
+    first = kline_requests(exchange)
+    df = download("2024-01-15", "2024-03-31")
+    # 只补齐 3 月的缺口（744 根K线，一个请求）
+    assert kline_requests(exchange) - first == 1
+    pd.testing.assert_frame_equal(df, download("2024-01-15", "2024-03-31", use_store=False))
+
+
+def test_reads_never_see_a_partition_being_replaced(store):
+    end_ms = BASE_MS + 100 * HOUR_MS
+    store.write("ETHUSDT", "1h", synthetic_frame(BASE_MS, end_ms), BASE_MS, end_ms)
+    errors = []
+    done = threading.Event()
+
+    def writer():
+        for _ in range(300):
+            store.write("ETHUSDT", "1h", synthetic_frame(BASE_MS, end_ms), BASE_MS, end_ms)
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            try:
+                assert len(store.read("ETHUSDT", "1h", BASE_MS, end_ms)) == 100
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def _write_ranges(root, worker):
+    store = KlineStore(root)
+    for i in range(25):
+        start_ms = BASE_MS + (worker * 25 + i) * 2 * HOUR_MS
+        store.write("ETHUSDT", "1h", synthetic_frame(start_ms, start_ms + 2 * HOUR_MS), start_ms,
+                    start_ms + 2 * HOUR_MS)
+
+
+def test_concurrent_processes_keep_every_coverage_update(tmp_path):
+    root = str(tmp_path / "klines")
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_write_ranges, args=(root, worker)) for worker in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+        assert p.exitcode == 0
+    store = KlineStore(root)
+    end_ms = BASE_MS + 200 * HOUR_MS
+    assert store.coverage("ETHUSDT", "1h") == [[BASE_MS, end_ms]]
+    assert len(store.read("ETHUSDT", "1h", BASE_MS, end_ms)) == 200
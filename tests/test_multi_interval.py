@@ -0,0 +1,18 @@
+import pandas as pd
+
+from kline_downloader import download_full_klines
+from multi_interval import common_base, derive_intervals, resample_complete
+
+
+def test_cascaded_resample_matches_direct_resample(exchange):
+    base = common_base(["15m", "1h", "4h", "1d"])
+    assert base == "15m"
+    # 区间的首尾都不在日线边界上，开头和结尾不完整的K线都应被丢弃
+    df = download_full_klines("ETH/USDT", base, "2024-01-01", "2024-02-10", return_df=True, use_store=False,
+                              base_url=exchange.base_url, progress=False).iloc[5:-7].reset_index(drop=True)
+    frames = derive_intervals(df, base, ["15m", "1h", "4h", "1d"])
+    for interval in ("1h", "4h", "1d"):
+        pd.testing.assert_frame_equal(frames[interval], resample_complete(df, base, interval))
+    daily = frames["1d"]
+    assert daily["open_time"].iloc[0] == pd.Timestamp("2024-01-02")
+    assert daily["open_time"].iloc[-1] == pd.Timestamp("2024-02-08")
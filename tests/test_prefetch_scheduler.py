@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+
+from conftest import kline_requests
+from kline_downloader import download_full_klines
+from prefetch_scheduler import MetricsCache, PrefetchScheduler, STALE_GRACE_MS, fresh_metrics
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def make_scheduler(exchange, store, tmp_path, **kwargs):
+    return PrefetchScheduler([('ETH', '1h')], days=3, store=store, metrics=MetricsCache(str(tmp_path / 'metrics.json')),
+                             base_url=exchange.base_url, jitter=0, **kwargs)
+
+
+def test_update_only_fetches_new_candles(exchange, store, tmp_path):
+    # 本地存储中已有截止到前天的数据，更新时只需下载之后新收盘的K线
+    start = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d')
+    end = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
+    download_full_klines('ETH/USDT', '1h', start, end, return_df=True, base_url=exchange.base_url, store=store,
+                         progress=False)
+    [(seeded_start, seeded_end)] = store.coverage('ETH/USDT', '1h')
+
+    scheduler = make_scheduler(exchange, store, tmp_path)
+    assert scheduler.watchlist == [('ETH/USDT', '1h')]
+    before = kline_requests(exchange)
+    entry = scheduler.update('ETH/USDT', '1h')
+    assert kline_requests(exchange) - before == 1
+
+    [(covered_start, covered_end)] = store.coverage('ETH/USDT', '1h')
+    assert covered_start == seeded_start and covered_end > seeded_end
+    # 只保存已收盘的K线：最后一根的开盘时间在最近一小时之内
+    now_ms = time.time() * 1000
+    assert now_ms - 2 * HOUR_MS < entry['last_open_time'] <= now_ms - HOUR_MS
+    assert entry['rows'] == (entry['last_open_time'] - seeded_start) // HOUR_MS + 1
+
+    # 同一根K线收盘之前再次更新不会请求交易所
+    before = kline_requests(exchange)
+    assert scheduler.update('ETH/USDT', '1h')['rows'] == entry['rows']
+    assert kline_requests(exchange) == before
+
+
+def test_cached_metrics_expire(exchange, store, tmp_path):
+    scheduler = make_scheduler(exchange, store, tmp_path)
+    entry = scheduler.update('ETH/USDT', '1h')
+    path = scheduler.metrics.path
+    assert fresh_metrics('ETH', '1h', days=3, params=entry['params'], path=path) == entry
+    assert fresh_metrics('ETH', '1h', days=7, path=path) is None
+    assert fresh_metrics('ETH', '1h', params={'max_grids': 99}, path=path) is None
+    assert fresh_metrics('BTC', '1h', path=path) is None
+
+    # 最后一根K线之后的那一根收盘前仍然有效，再多收盘一根（加上余量）后过期
+    next_close_s = (entry['last_open_time'] + 2 * HOUR_MS) / 1000
+    assert fresh_metrics('ETH', '1h', path=path, now=next_close_s) == entry
+    assert fresh_metrics('ETH', '1h', path=path, now=next_close_s + STALE_GRACE_MS / 1000 + 1) is None
+
+
+def test_run_warms_the_watchlist(exchange, store, tmp_path):
+    scheduler = make_scheduler(exchange, store, tmp_path)
+    scheduler.run(duration=3)
+    assert scheduler.stats == {'updates': 1, 'errors': 0}
+    entry = scheduler.metrics.get('ETH/USDT', '1h')
+    assert entry['rows'] >= 2 * 24
+    assert fresh_metrics('ETH/USDT', '1h', days=3, path=scheduler.metrics.path) == entry
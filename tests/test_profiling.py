@@ -0,0 +1,36 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+
+
+def test_concurrent_runs_keep_separate_profiles():
+    profiles = {}
+
+    def run(name):
+        with profiling.profiling() as profile:
+            with profiling.stage("analysis"):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    for _ in range(5):
+                        profiling.submit(executor, profiling.record_retry)
+            profiles[name] = profile
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for profile in profiles.values():
+        assert profile.stages["analysis"]["calls"] == 1
+        assert profile.retries == 5
+    assert profiling.get_profile() is None
+
+
+def test_nested_stages_record_self_time():
+    with profiling.profiling() as profile:
+        with profiling.stage("outer"):
+            with profiling.stage("inner", rows=10):
+                pass
+    stages = profile.summary()["stages"]
+    assert stages["inner"]["rows"] == 10
+    assert stages["outer"]["self_seconds"] <= stages["outer"]["seconds"]
@@ -0,0 +1,133 @@
+import gc
+import multiprocessing
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from shared_klines import LEASE_DIR, META_FILE, SHARED_COLUMNS, SharedKlineCache
+
+HOUR_MS = 3600 * 1000
+BASE_MS = 1704067200000  # 2024-01-01
+ROWS = 10000
+# 每个数据集 ROWS 行、6 列 float64/int64
+DATASET_BYTES = ROWS * len(SHARED_COLUMNS) * 8
+
+
+def synthetic_frame(rows=ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, rows))
+    return pd.DataFrame({
+        "open_time": pd.to_datetime(BASE_MS + np.arange(rows, dtype=np.int64) * HOUR_MS, unit="ms"),
+        "open": close, "high": close + 1, "low": close - 1, "close": close, "volume": rng.uniform(1, 10, rows),
+    })
+
+
+def key_for(symbol, end="2024-12-31"):
+    return (symbol, "1h", "2024-01-01", end)
+
+
+def dead_pid():
+    return int(subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True,
+                              text=True, check=True).stdout)
+
+
+def _attach_and_read(root, key):
+    handle = SharedKlineCache(root).attach(key)
+    df = handle.frame()
+    return len(df), float(df["close"].sum()), str(df["open_time"].iloc[-1]), len(os.listdir(
+        os.path.join(handle.path, LEASE_DIR)))
+
+
+def test_publish_and_attach_in_another_process(tmp_path):
+    cache = SharedKlineCache(str(tmp_path))
+    df = synthetic_frame()
+    handle = cache.publish(key_for("ETH/USDT"), df)
+    frame = handle.frame()
+    pd.testing.assert_frame_equal(frame, df.astype({"open_time": "datetime64[ms]"}))
+    # 各列直接映射发布的文件，不复制数据
+    assert not frame["close"].to_numpy().flags.writeable
+    assert cache.attach(key_for("BTC/USDT")) is None
+    # 再次发布同一个键时挂载已有的数据集（临时句柄随即被回收，租约释放）
+    assert cache.publish(key_for("ETH/USDT"), synthetic_frame(seed=1)).path == handle.path
+
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        rows, close_sum, last_open, leases = pool.apply(_attach_and_read, (str(tmp_path), key_for("ETH/USDT")))
+    assert (rows, last_open) == (ROWS, str(df["open_time"].iloc[-1]))
+    assert close_sum == df["close"].sum()
+    # 主进程和子进程各持有一个租约
+    assert leases == 2
+
+
+def test_leases_are_counted_per_handle(tmp_path):
+    cache = SharedKlineCache(str(tmp_path))
+    first = cache.publish(key_for("ETH/USDT"), synthetic_frame())
+    second = cache.attach(key_for("ETH/USDT"))
+    assert cache.stats()["leases"].tolist() == [2]
+    first.release()
+    first.release()
+    assert first.released and not second.released
+    assert cache.stats()["leases"].tolist() == [1]
+    # 句柄被回收时同样释放租约
+    del second
+    gc.collect()
+    assert cache.stats()["leases"].tolist() == [0]
+
+
+def test_least_recently_used_datasets_are_evicted_first(tmp_path):
+    cache = SharedKlineCache(str(tmp_path), memory_cap_mb=3.5 * DATASET_BYTES / 1024 / 1024)
+    paths = {}
+    for i, symbol in enumerate(["A/USDT", "B/USDT", "C/USDT"]):
+        handle = cache.publish(key_for(symbol), synthetic_frame(seed=i))
+        paths[symbol] = handle.path
+        handle.release()
+        # 按发布顺序设置最近使用时间，不依赖文件系统的时间精度
+        os.utime(os.path.join(handle.path, META_FILE), (1000 + i, 1000 + i))
+    # 挂载会更新最近使用时间，A 变成最近使用的数据集
+    cache.attach(key_for("A/USDT")).release()
+
+    cache.publish(key_for("D/USDT"), synthetic_frame(seed=3)).release()
+    assert not os.path.exists(paths["B/USDT"])
+    assert cache.attach(key_for("B/USDT")) is None
+    assert sorted(cache.stats()["symbol"]) == ["A/USDT", "C/USDT", "D/USDT"]
+
+    # 有租约的数据集即使最久未使用也不会被淘汰
+    held = cache.attach(key_for("C/USDT"))
+    os.utime(os.path.join(held.path, META_FILE), (1000, 1000))
+    cache.publish(key_for("E/USDT"), synthetic_frame(seed=4)).release()
+    assert sorted(cache.stats()["symbol"]) == ["C/USDT", "D/USDT", "E/USDT"]
+    held.release()
+
+
+def test_stale_datasets_leases_and_partial_writes_are_cleaned_up(tmp_path):
+    cache = SharedKlineCache(str(tmp_path), fresh_seconds=0)
+    pid = dead_pid()
+
+    # 已退出进程留下的租约不算在内，并被删除
+    handle = cache.publish(key_for("ETH/USDT"), synthetic_frame())
+    handle.release()
+    stale_lease = os.path.join(handle.path, LEASE_DIR, "{}-deadbeef".format(pid))
+    open(stale_lease, "w").close()
+    assert cache.stats()["leases"].tolist() == [0]
+    assert not os.path.exists(stale_lease)
+
+    # 结束日期为今天的数据集超过 fresh_seconds 后不再被挂载，没有租约时在淘汰时删除
+    today = datetime.now().strftime("%Y-%m-%d")
+    live = cache.publish(key_for("BTC/USDT", end=today), synthetic_frame())
+    assert cache.attach(key_for("BTC/USDT", end=today)) is None
+    cache.evict()
+    assert os.path.exists(live.path)
+    live.release()
+
+    # 写入过程中退出的进程留下的临时目录被删除，正在写入的进程的临时目录保留
+    orphan = tmp_path / ".tmp-{}-deadbeef".format(pid)
+    writing = tmp_path / ".tmp-{}-cafebabe".format(os.getpid())
+    orphan.mkdir()
+    writing.mkdir()
+    cache.evict()
+    assert not orphan.exists() and writing.exists()
+    assert not os.path.exists(live.path)
+    assert cache.stats()["symbol"].tolist() == ["ETH/USDT"]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from conftest import synthetic_ohlc
+from grid_strategy import analyze_grid
+from kline_downloader import download_full_klines
+from streaming_analysis import analyze_chunks, iter_kline_chunks
+
+PARAMS = {'threshold_factor': 1.5, 'grid_step_percentage': 0.5, 'max_grids': 50, 'atr_std_multiplier': 1.0}
+# 第 600 根之前缺失 48 根K线
+GAP_AT = 600
+
+
+def assert_same_result(streamed, expected):
+    for name, value in expected.to_dict().items():
+        if isinstance(value, (str, bool, np.bool_)):
+            assert streamed.to_dict()[name] == value, name
+        else:
+            assert streamed.to_dict()[name] == pytest.approx(value, rel=1e-9, abs=1e-12), name
+    np.testing.assert_allclose(streamed.grid_prices, expected.grid_prices, rtol=1e-12)
+    assert streamed.params == expected.params
+
+
+def split(df, size):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+@pytest.fixture(scope="module")
+def klines():
+    return synthetic_ohlc(1500, seed=11, gaps=[(GAP_AT, 48)])
+
+
+@pytest.mark.parametrize("size", [1, 5, 13, 14, 15, 26, 100, 599, 600, 1000, 1500])
+def test_chunked_analysis_matches_analyze_grid(klines, size):
+    # 小于 ATR（14）和慢速 EMA（26）预热长度的块也要跨块延续指标状态；600 使块边界正好落在缺口上
+    assert_same_result(analyze_chunks(split(klines, size), **PARAMS), analyze_grid(klines, **PARAMS))
+
+
+def test_uneven_chunks_and_redelivered_rows(klines):
+    expected = analyze_grid(klines, **PARAMS)
+    # 缺口两侧各断开一次，夹着一个不足预热长度的块
+    bounds = [0, 7, GAP_AT - 3, GAP_AT, GAP_AT + 10, len(klines)]
+    chunks = [klines.iloc[lo:hi] for lo, hi in zip(bounds, bounds[1:])]
+    assert_same_result(analyze_chunks(chunks, **PARAMS), expected)
+    # 与上一块重叠的K线（例如重新下载的最后一个请求）会被忽略
+    overlapping = [klines.iloc[max(lo - 5, 0):hi] for lo, hi in zip(bounds, bounds[1:])]
+    assert_same_result(analyze_chunks(overlapping, **PARAMS), expected)
+
+
+def test_datetime_open_time_is_accepted(klines):
+    df = klines.assign(open_time=klines['open_time'].astype('datetime64[ms]'))
+    assert_same_result(analyze_chunks(split(df, 64), **PARAMS), analyze_grid(klines, **PARAMS))
+
+
+def test_streamed_download_matches_full_download(exchange, store):
+    chunks = iter_kline_chunks('ETH/USDT', '1h', '2024-01-01', '2024-03-31', chunk_rows=300, store=store,
+                               base_url=exchange.base_url, progress=False)
+    streamed = analyze_chunks(chunks, **PARAMS)
+    df = download_full_klines('ETH/USDT', '1h', '2024-01-01', '2024-03-31', return_df=True, store=store,
+                              base_url=exchange.base_url, progress=False)
+    assert_same_result(streamed, analyze_grid(df, **PARAMS))